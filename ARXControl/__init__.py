@@ -4,7 +4,24 @@ ARXControl
 
 Package used to control the LoFASM ARX.
 """
+import sys
 
 __version__ = 0.2
 
-from .arx import ARX
+if sys.version_info >= (3, 7):
+    # Import the serial stack on first use, so that tools such as arxctl
+    # start quickly.
+    _LAZY = {'ARX': 'arx', 'State': 'state'}
+
+    def __getattr__(name):
+        if name in _LAZY:
+            import importlib
+            module = importlib.import_module('.' + _LAZY[name], __name__)
+            value = getattr(module, name)
+            globals()[name] = value
+            return value
+        raise AttributeError("module %r has no attribute %r" % (__name__,
+                                                                 name))
+else:
+    from .arx import ARX
+    from .state import State
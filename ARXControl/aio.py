@@ -0,0 +1,313 @@
+"""
+Asyncio interface to the ARX Control Unit.
+
+Requires Python 3.7+ and a POSIX event loop, since the serial port is watched
+with :meth:`asyncio.AbstractEventLoop.add_reader`.
+"""
+import asyncio
+import time
+
+from serial import Serial
+
+from . import const
+from .arx import ARX
+from .connection import Connection
+from .err import ConnError
+from .retry import Burst
+
+
+class AsyncConnection(Connection):
+    """
+    Non-blocking version of :class:`ARXControl.connection.Connection`.
+
+    The serial port is opened without a timeout and registered with the
+    event loop, so waiting for a response never blocks the loop. Framing and
+    parsing are shared with :class:`Connection`. The connection always
+    behaves as an open session: READY is checked before the first command,
+    and again after an error, a cancellation, or :attr:`idle_timeout`
+    seconds without traffic.
+    """
+
+    def __init__(self, tty, rate=None):
+        """
+        :param tty: `port` parameter for serial connection to ARX
+        """
+        Connection.__init__(self, tty, rate)
+        self._lock = None
+        self._readable = None
+        self._attached = False
+        self._loop = None
+
+    def _connect(self, tty, rate):
+        """Connect hook. Useful for testing hooks"""
+        if not rate:
+            rate = const.BAUDRATE
+
+        return Serial(tty, timeout=0, baudrate=rate)
+
+    def _attach(self):
+        """
+        Registers the serial port with the running event loop, moving it
+        from the loop it was registered with before, if any.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._detach()
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._readable = asyncio.Event()
+        if not self._attached:
+            loop.add_reader(self.serial.fileno(), self._on_readable)
+            self._attached = True
+
+    def _detach(self):
+        """
+        Unregisters the serial port from its event loop, unless that loop
+        is already closed.
+        """
+        if self._attached and not self._loop.is_closed():
+            self._loop.remove_reader(self.serial.fileno())
+        self._attached = False
+
+    def close(self):
+        """
+        Unregisters from the event loop and closes the serial port. Can be
+        called outside the loop, e.g. after :func:`asyncio.run` returned.
+        """
+        self._detach()
+        self.serial.close()
+
+    def _on_readable(self):
+        data = self.serial.read(max(1, self.reader._waiting()))
+        if data:
+            self.reader.feed(data)
+        self._readable.set()
+
+    def _write(self, data):
+        self.write(data)
+
+    async def read_response(self):
+        """
+        Waits for one complete response frame.
+
+        :rtype: A `(code, args)` tuple.
+        """
+        while True:
+            record = self.reader.next_response()
+            if record is not None:
+                return record
+            self._readable.clear()
+            await self._readable.wait()
+
+    async def _read_response(self):
+        """
+        :meth:`read_response` bounded by the timeout given by
+        :attr:`retry_policy`. None on timeout.
+        """
+        policy = self.retry_policy
+        try:
+            return await asyncio.wait_for(self.read_response(),
+                                          policy.get_timeout())
+        except asyncio.TimeoutError:
+            policy.record_timeout()
+            return None
+
+    async def _handshake(self):
+        # Responses left over from a cancelled or timed-out call are skipped
+        # until the READY response turns up.
+        self.reader.clear()
+        policy = self.retry_policy
+        timeouts = 0
+        while policy.should_retry(0, timeouts):
+            if timeouts:
+                await asyncio.sleep(policy.delay(timeouts))
+            self._write(self._make_cmd(const.ACU_READY))
+            record = await self._read_response()
+            while record is not None:
+                if record[0] == const.kREADY:
+                    self.conn_failure = 0
+                    return
+                record = await self._read_response()
+            timeouts += 1
+            self.conn_failure += 1
+
+        raise ConnError(
+            "Failure attempting to communicate with control unit.")
+
+    async def send_many(self, cmds):
+        """
+        Async version of :meth:`ARXControl.arx.ARX._send_many`.
+
+        :param cmds: Sequence of argument tuples, as taken by
+        :meth:`_make_cmd`.
+
+        :rtype: List of ACU Response Messages, in the same order as `cmds`.
+        """
+        self._attach()
+        async with self._lock:
+            try:
+                if self.ready and (time.time() - self._last_used >
+                                   self.idle_timeout):
+                    self.ready = False
+                if not self.ready:
+                    start = time.time()
+                    await self._handshake()
+                    self._metrics.handshake(time.time() - start)
+                    self.ready = True
+                burst = await self._send_many(cmds)
+            except BaseException:
+                self.ready = False
+                raise
+            self._last_used = time.time()
+
+        if burst.pending:
+            self.ready = False
+            raise burst.error(self._make_cmd)
+        return burst.out
+
+    async def _send_many(self, cmds):
+        """
+        Runs the retry loop of :class:`ARXControl.retry.Burst` on the event
+        loop.
+
+        :rtype: The finished :class:`ARXControl.retry.Burst`.
+        """
+        burst = Burst(cmds, self.retry_policy, self.metrics)
+        while burst.pending:
+            if burst.retrying:
+                await asyncio.sleep(burst.delay())
+                if burst.resync:
+                    await self._handshake()
+            self._write(b''.join([self._make_cmd(*cmd)
+                                  for cmd in burst.begin()]))
+            while burst.feed(await self._read_response()):
+                pass
+            burst.end()
+            if not burst.should_retry():
+                break
+        return burst
+
+
+class AsyncARX(object):
+    """
+    Asyncio ARX Control Object.
+
+    Mirrors :class:`ARXControl.arx.ARX`. The :attr:`power`, :attr:`atten0`,
+    :attr:`atten1`, :attr:`filter` and :attr:`eeprom_offset` properties
+    return awaitables, and each has a matching ``set_*`` coroutine::
+
+        arx = AsyncARX('/dev/ttyUSB0')
+        level = await arx.atten0
+        await arx.set_atten0(level - 1, timeout=0.5)
+
+    Every coroutine takes an optional `timeout` in seconds for the whole
+    call, raising :class:`asyncio.TimeoutError` when it expires. A call that
+    times out or is cancelled leaves the connection to re-check READY before
+    the next command. Values are validated exactly as in :class:`ARX`.
+    """
+
+    def __init__(self, tty, rate=None):
+        """
+        Creates a new instance of AsyncARX.
+
+        :param tty: `port` parameter for serial connection to ARX.
+        """
+        self.conn = self._connect(tty,rate)
+
+    def _connect(self, tty, rate):
+        """Connection hook. Useful for testing."""
+        return AsyncConnection(tty,rate)
+
+    def close(self):
+        """Closes the connection to the ACU."""
+        self.conn.close()
+
+    async def _send_many(self, cmds, timeout=None):
+        cmds = [tuple(cmd) for cmd in cmds]
+        if timeout is None:
+            return await self.conn.send_many(cmds)
+        return await asyncio.wait_for(self.conn.send_many(cmds), timeout)
+
+    async def _send(self, *args, timeout=None):
+        return (await self._send_many([args], timeout))[0]
+
+    async def _read_int(self, *args, timeout=None):
+        return int((await self._send(*args, timeout=timeout))[0])
+
+    @property
+    def power(self):
+        """Awaitable FEE power states. See :attr:`ARX.power`."""
+        return self.get_power()
+
+    async def get_power(self, timeout=None):
+        resps = await self._send_many([(const.FEE_READ,i) for i in range(4)],
+                                      timeout)
+        return [int(resp[0]) for resp in resps]
+
+    async def set_power(self, pwr, timeout=None):
+        await self._send_many(ARX._power_cmds(pwr), timeout)
+
+    @property
+    def filter(self):
+        """Awaitable filter selection. See :attr:`ARX.filter`."""
+        return self.get_filter()
+
+    async def get_filter(self, timeout=None):
+        return await self._read_int(const.FILTER_READ, timeout=timeout)
+
+    async def set_filter(self, value, timeout=None):
+        await self._send(*ARX._filter_cmd(value), timeout=timeout)
+
+    @property
+    def atten0(self):
+        """Awaitable attenuator 0 level. See :attr:`ARX.atten0`."""
+        return self.get_atten0()
+
+    async def get_atten0(self, timeout=None):
+        return await self._read_int(const.ATTEN_READ,0, timeout=timeout)
+
+    async def set_atten0(self, level, timeout=None):
+        await self._send(*ARX._atten_cmd(0,level), timeout=timeout)
+
+    @property
+    def atten1(self):
+        """Awaitable attenuator 1 level. See :attr:`ARX.atten1`."""
+        return self.get_atten1()
+
+    async def get_atten1(self, timeout=None):
+        return await self._read_int(const.ATTEN_READ,1, timeout=timeout)
+
+    async def set_atten1(self, level, timeout=None):
+        await self._send(*ARX._atten_cmd(1,level), timeout=timeout)
+
+    @property
+    def eeprom_offset(self):
+        """Awaitable EEPROM offset. See :attr:`ARX.eeprom_offset`."""
+        return self.get_eeprom_offset()
+
+    async def get_eeprom_offset(self, timeout=None):
+        return await self._read_int(const.EEPROM_READ, timeout=timeout)
+
+    async def set_eeprom_offset(self, position, timeout=None):
+        await self._send(*ARX._eeprom_cmd(position), timeout=timeout)
+
+    async def read_all(self, timeout=None):
+        """
+        Fetches the whole ACU state in one pipelined burst.
+
+        :rtype: :class:`ARXControl.state.State`
+        """
+        resps = await self._send_many(ARX._READ_ALL, timeout)
+        return ARX._make_state([resp[0] for resp in resps])
+
+    async def roach(self, state, timeout=None):
+        if 0 <= state <= 1:
+            resp = await self._send(const.ROACH_WRITE, state, timeout=timeout)
+            if resp[0] == const.ROACH_WRITTEN:
+                return state
+        else:
+            raise ValueError("Attempt to set ROACH to state out of range (0-1)")
+
+    async def write_flash(self, timeout=None):
+        await self._send(const.FLASH_WRITE, timeout=timeout)
+        return True
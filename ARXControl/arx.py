@@ -1,32 +1,21 @@
 from . import const
-from .err import CheckError, WriteError
-
-def unpack(self, inputstring):
-    """
-    Unpacks an ACU Command Structure into a tuple.
-
-    :param inputstring: ACU Command String (or Response String).
-
-    :rtype: A tuple of (CMD Code | RESP Code, ARGS | RESP String | None). 
-    """
-    inputstring = inputstring.strip(const.END_COMMAND)
-    parts = inputstring.split(const.SEPARATOR)
-
-    command = int(parts[0])
-    try:
-        args = parts[1].split(const.ARG_SEPARATOR)
-        for i in range(len(args)):
-            try:
-                args[i] = int(args[i])
-            except ValueError:
-                pass
-    except IndexError:
-        args = None
-
-    return command, args
-
+from .err import WriteError
+from .decoder import unpack
 from .connection import Connection
-
+from .cache import StateCache
+from .state import State
+from .scheduler import CommandScheduler, WRITE, priority_of
+from .telemetry import TelemetryPoller
+from .sweep import Sweep
+from .presets import PresetManager
+from .crc import CRCS
+from .retry import Burst
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
 
 class ARX(object):
@@ -38,19 +27,83 @@ class ARX(object):
     fetches the current values from the ACU. When they are assigned values, the
     values are validated, then transmitted to the ACU, when also validates and
     then applies the new setting.
+
+    When created with `cache_ttl`, values read from or successfully written to
+    the ACU are kept in :attr:`cache` and served from there until they expire.
+    See :meth:`invalidate` and :meth:`refresh`.
+
+    An ARX may be shared between threads. Transactions with the ACU never
+    interleave, and :meth:`pipeline` queues are kept per thread. When
+    created with `queue_depth`, every transaction is run by a single I/O
+    worker thread from a priority queue: writes go out before reads, and
+    reads before the telemetry polls marked with :meth:`priority`.
     """
 
     _unpack = unpack
 
-    def __init__(self, tty, rate=None):
+    #: Names of the cacheable state fields.
+    FIELDS = ('power', 'atten0', 'atten1', 'filter', 'eeprom_offset')
+
+    def __init__(self, tty, rate=None, cache_ttl=None, retry_policy=None,
+                 metrics=None, queue_depth=None, crc=None, duplex=False):
         """
         Creates a new instance of ARX.
 
         :param tty: `port` parameter for serial connection to ARX.
+        :param cache_ttl: Optional TTL in seconds for the state cache, either
+        a single number or a dict of field name to TTL. The cache is disabled
+        when None.
+        :param retry_policy: Optional :class:`ARXControl.retry.RetryPolicy`
+        for the connection. Defaults to a fixed policy of
+        :attr:`const.MAX_RETRIES` attempts and a :attr:`const.TIMEOUT`
+        second timeout.
+        :param metrics: Optional :class:`ARXControl.metrics.Metrics` to record
+        per-command latency, retries, errors and wire traffic in.
+        :param queue_depth: Optional maximum number of transactions waiting
+        for the ACU. When given, transactions are run in priority order by a
+        :class:`ARXControl.scheduler.CommandScheduler`, and callers block
+        while the queue is full.
+        :param crc: Optional CRC width (8 or 16), or
+        :class:`ARXControl.crc.CRC`, to seal and check every frame with.
+        Frames that fail the check are sent again. The ACU must be set to
+        the same CRC.
+        :param duplex: Run the connection in full-duplex mode, where a
+        reader thread collects responses as they arrive. See
+        :attr:`ARXControl.connection.Connection.duplex`.
         """
-        self.conn = self._connect(tty,rate)
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        auto = rate == const.AUTO_BAUD
+        self.conn = self._connect(tty, None if auto else rate)
+        if retry_policy is not None:
+            self.conn.retry_policy = retry_policy
+        if metrics is not None:
+            self.conn.metrics = metrics
+        if crc is not None:
+            self.conn.crc = CRCS.get(crc, crc)
+        if auto:
+            # Negotiated once the probes are framed as the ACU expects.
+            self.conn.rate = self.conn.negotiate()
+        if duplex:
+            self.conn.duplex = True
+        #: Number of attempts that ended in silence.
         self.conn_failure = 0
+        #: Number of attempts that ended in a negative response.
         self.check_error = 0
+        #: :class:`ARXControl.cache.StateCache`, or None when disabled.
+        self.cache = StateCache(cache_ttl) if cache_ttl is not None else None
+        #: :class:`ARXControl.scheduler.CommandScheduler`, or None when
+        #: transactions run on the calling thread.
+        self.scheduler = None
+        if queue_depth is not None:
+            self.scheduler = CommandScheduler(queue_depth, self.conn.metrics)
+        #: Callables called with `(field, value)` each time the ACU
+        #: acknowledges a new setting, e.g. ``('atten0', 5)``.
+        self.listeners = []
+        self._presets = None
+        #: :class:`ARXControl.telemetry.TelemetryPoller` started by
+        #: :meth:`start_poller`, or None.
+        self.poller = None
         #self._setup()
         self._initialize()
 
@@ -74,6 +127,55 @@ class ARX(object):
         """Connection hook. Useful for testing."""
         return Connection(tty,rate)
 
+    @property
+    def _queue(self):
+        """
+        Frames queued by :meth:`pipeline` on the current thread, or None when
+        not pipelining.
+        """
+        return getattr(self._local, 'queue', None)
+
+    @_queue.setter
+    def _queue(self, queue):
+        self._local.queue = queue
+
+    @property
+    def _queued_state(self):
+        try:
+            return self._local.state
+        except AttributeError:
+            state = self._local.state = {}
+            return state
+
+    @_queued_state.setter
+    def _queued_state(self, state):
+        self._local.state = state
+
+    @property
+    def _txn(self):
+        """
+        Writes buffered by :meth:`transaction` on the current thread, keyed
+        by what they set, or None outside a transaction.
+        """
+        return getattr(self._local, 'txn', None)
+
+    def _io(self, fn, *args, **kwargs):
+        """
+        Runs ``fn(*args)`` with exclusive use of the connection: on the
+        scheduler's worker thread at `priority` (keyword-only), or under a
+        lock on the calling thread. `priority` defaults to the one set by
+        :meth:`priority`, or :data:`ARXControl.scheduler.WRITE`.
+        """
+        priority = kwargs.pop('priority', None)
+        if priority is None:
+            priority = getattr(self._local, 'priority', None)
+        if priority is None:
+            priority = WRITE
+        if self.scheduler is not None:
+            return self.scheduler.call(fn, *args, priority=priority)
+        with self._lock:
+            return fn(*args)
+
     def _send(self, *args):
         """
         Wraps :attr:`ARXControl.connection.Connection._make_cmd` with retrying
@@ -84,21 +186,429 @@ class ARX(object):
 
         :rtype: String containing ACU Response Message.
         """
-        error_cnt = 0
-        with self.conn as conn:
-            rsp=''
-            while error_cnt < const.MAX_RETRIES:
-                conn.write(self.conn._make_cmd(*args))
-                code, resp = self._unpack(conn.read(const.BUFFER_SIZE))
+        return self._send_many([args])[0]
 
-                if code is not const.kACK:
-                    error_cnt += 1
-                    rsp = resp
-                else:
-                    return resp
-            cmd_str = self.conn._make_cmd(*args)
-            raise IOError("Could not execute `%s`. Recieved response `%s`"%(
-                            cmd_str,rsp))
+    def _send_many(self, cmds):
+        """
+        Pipelined version of :meth:`_send`. All frames are written
+        back-to-back, then the `;`-terminated responses are matched to them in
+        order. Commands that are not acknowledged are re-sent as allowed by
+        the connection's :class:`ARXControl.retry.RetryPolicy`.
+
+        :param cmds: Sequence of argument tuples, as taken by :meth:`_send`.
+
+        :rtype: List of ACU Response Messages, in the same order as `cmds`.
+        """
+        if self._queue:
+            # Frames queued by pipeline() go first, so reads see them.
+            self._flush()
+        cmds = [tuple(cmd) for cmd in cmds]
+        priority = getattr(self._local, 'priority', None)
+        if priority is None:
+            priority = priority_of(cmds)
+        if self.conn.duplex:
+            return self._transact_duplex(cmds, priority)
+        return self._io(self._transact, cmds, priority=priority)
+
+    def _transact(self, cmds):
+        """
+        Runs one pipelined transaction for :meth:`_send_many`. Must only be
+        called with exclusive use of the connection, see :meth:`_io`.
+        """
+        burst = Burst(cmds, self.conn.retry_policy, self.conn.metrics)
+        with self.conn:
+            while burst.pending:
+                if burst.retrying:
+                    time.sleep(burst.delay())
+                    if burst.resync:
+                        # Responses to a lost one were matched to the wrong
+                        # commands: start over from a clean line.
+                        self.conn._handshake()
+                self.conn.write(b''.join([self.conn._make_cmd(*cmd)
+                                          for cmd in burst.begin()]))
+                while burst.feed(self.conn.read_response()):
+                    pass
+                burst.end()
+                if burst.resync:
+                    self.conn_failure += 1
+                elif burst.pending:
+                    self.check_error += 1
+                if burst.pending:
+                    self.conn.ready = False
+                if not burst.should_retry():
+                    break
+
+        if burst.pending:
+            if self.cache is not None:
+                self.cache.invalidate()
+            raise burst.error(self.conn._make_cmd)
+        return burst.out
+
+    def _transact_duplex(self, cmds, priority):
+        """
+        Full-duplex version of :meth:`_transact`. Only writing the frames
+        takes exclusive use of the connection: the responses are waited for
+        without it, so that other threads can send their commands meanwhile.
+        """
+        burst = Burst(cmds, self.conn.retry_policy, self.conn.metrics)
+        while burst.pending:
+            if burst.retrying:
+                time.sleep(burst.delay())
+            futures = self._io(self._submit, burst, priority=priority)
+            for future in futures:
+                if not burst.feed(self.conn.wait(future)):
+                    break
+            burst.end()
+            if burst.resync:
+                self.conn_failure += 1
+            elif burst.pending:
+                self.check_error += 1
+            if burst.pending:
+                # The next round starts with a READY handshake, which also
+                # drops the responses still in flight.
+                self.conn.ready = False
+            if not burst.should_retry():
+                break
+
+        if burst.pending:
+            if self.cache is not None:
+                self.cache.invalidate()
+            raise burst.error(self.conn._make_cmd)
+        return burst.out
+
+    def _submit(self, burst):
+        """
+        Writes the next round of `burst` for :meth:`_transact_duplex`. Must
+        only be called with exclusive use of the connection.
+
+        :rtype: List of futures of the responses.
+        """
+        with self.conn:
+            return self.conn.submit(b''.join([self.conn._make_cmd(*cmd)
+                                              for cmd in burst.begin()]))
+
+    @contextmanager
+    def session(self):
+        """
+        Context manager that checks the ACU is READY once, then runs every
+        command inside the block without repeating the handshake::
+
+            with arx.session():
+                arx.power = 1
+                levels = arx.atten0, arx.atten1
+
+        See :meth:`ARXControl.connection.Connection.session`.
+        """
+        ctx = self.conn.session()
+        self._io(ctx.__enter__)
+        try:
+            yield self
+        except BaseException:
+            self._io(ctx.__exit__, *sys.exc_info())
+            raise
+        else:
+            self._io(ctx.__exit__, None, None, None)
+
+    @contextmanager
+    def priority(self, priority):
+        """
+        Context manager that runs the commands sent by the current thread
+        inside the block at `priority`, instead of the default of
+        :data:`ARXControl.scheduler.WRITE` for writes and
+        :data:`ARXControl.scheduler.READ` for reads::
+
+            with arx.priority(scheduler.TELEMETRY):
+                levels = arx.atten0, arx.atten1
+
+        Only takes effect when created with `queue_depth`.
+        """
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = priority
+        try:
+            yield self
+        finally:
+            self._local.priority = previous
+
+    @property
+    def presets(self):
+        """
+        :class:`ARXControl.presets.PresetManager` for named configurations
+        stored in EEPROM slots::
+
+            arx.presets.store('night', state)
+            arx.presets.recall('night')
+        """
+        if self._presets is None:
+            self._presets = PresetManager(self)
+        return self._presets
+
+    def sweep(self, axes, hook=None, settle=0.):
+        """
+        Steps through every combination of settings, changing one setting
+        per step, and calls `hook` at each settled point::
+
+            arx.sweep([('filter', range(3)), ('atten0', range(16)),
+                       ('atten1', range(16))], hook=measure, settle=0.05)
+
+        Takes the same arguments as :class:`ARXControl.sweep.Sweep`.
+
+        :rtype: List of (point, hook result) pairs.
+        """
+        return Sweep(self, axes, hook, settle).run()
+
+    def start_poller(self, interval=1., capacity=86400, callback=None):
+        """
+        Starts sampling the ACU state in the background. Takes the same
+        arguments as :class:`ARXControl.telemetry.TelemetryPoller`.
+
+        :rtype: The running :class:`ARXControl.telemetry.TelemetryPoller`,
+        also kept in :attr:`poller`.
+        """
+        if self.poller is not None:
+            self.poller.stop()
+        self.poller = TelemetryPoller(self, interval, capacity,
+                                      callback=callback).start()
+        return self.poller
+
+    def close(self):
+        """
+        Stops the telemetry poller and the I/O worker thread, once queued
+        transactions have run, and closes the connection to the ACU.
+        """
+        if self.poller is not None:
+            self.poller.stop()
+        if self.scheduler is not None:
+            self.scheduler.close()
+        self.conn.close()
+
+    @property
+    def metrics(self):
+        """
+        The connection's :class:`ARXControl.metrics.Metrics`. See
+        :attr:`ARXControl.connection.Connection.metrics`.
+        """
+        return self.conn.metrics
+
+    def _cached(self, field):
+        """
+        Looks up `field` in the state cache.
+
+        :rtype: A tuple of (hit, value).
+        """
+        if self.cache is None:
+            return False, None
+        return self.cache.lookup(field)
+
+    def _store(self, field, value):
+        """Records a value read from the ACU in the state cache."""
+        if self.cache is not None:
+            self.cache.store(field, value)
+
+    def _written(self, field, value):
+        """
+        Records a value written to the ACU in the state cache. Inside
+        :meth:`pipeline`, the value is only recorded once the queued frames
+        have been acknowledged.
+        """
+        if self._txn is not None:
+            self._local.txn_state[field] = value
+        elif self._queue is not None:
+            self._queued_state[field] = value
+        else:
+            self._acked(field, value)
+
+    def _acked(self, field, value):
+        """
+        Records a value the ACU has acknowledged writing, in the state cache
+        and with every callable in :attr:`listeners`.
+        """
+        if field == 'eeprom_offset':
+            # Moving the offset loads the settings stored in that slot.
+            self.invalidate()
+        self._store(field, value)
+        for listener in self.listeners:
+            listener(field, value)
+
+    def invalidate(self, *fields):
+        """
+        Drops `fields` from the state cache, or every field if none are
+        given, so that the next access fetches them from the ACU.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(*fields)
+
+    def refresh(self):
+        """
+        Fetches every field from the ACU, replacing the cached values.
+        """
+        self.invalidate()
+        with self.session():
+            for field in self.FIELDS:
+                getattr(self, field)
+
+    def _write(self, *args):
+        """
+        Sends a write command, queues it when inside :meth:`pipeline`, or
+        buffers it when inside :meth:`transaction`.
+
+        Takes same parameters as :meth:`_send`.
+        """
+        txn = self._txn
+        if txn is not None:
+            if args[0] == const.FLASH_WRITE:
+                self._local.txn_flash = True
+            else:
+                # FEE and attenuator writes are per channel.
+                key = args[:2] if args[0] in (const.FEE_WRITE,
+                                              const.ATTEN_WRITE) else args[:1]
+                txn.pop(key, None)
+                txn[key] = args
+            return None
+        if self._queue is not None:
+            self._queue.append(args)
+            return None
+        return self._send(*args)
+
+    def _flush(self):
+        """Sends all frames queued by :meth:`pipeline` as a single burst."""
+        cmds, self._queue[:] = list(self._queue), []
+        state, self._queued_state = self._queued_state, {}
+        if cmds:
+            self._send_many(cmds)
+        for field, value in state.items():
+            self._acked(field, value)
+
+    @contextmanager
+    def pipeline(self):
+        """
+        Context manager that queues every setter called inside the block,
+        then writes the frames back-to-back on exit instead of waiting for
+        each response in turn::
+
+            with arx.pipeline():
+                arx.power = 1
+                arx.atten0 = 5
+                arx.atten1 = 5
+                arx.filter = 2
+
+        Reading a property inside the block sends the queued frames first.
+        If the block raises, the queued frames are discarded.
+        """
+        if self._queue is not None:
+            yield self
+            return
+        self._queue = []
+        try:
+            yield self
+            self._flush()
+        finally:
+            self._queue = None
+            self._queued_state = {}
+
+    @contextmanager
+    def transaction(self, flash=False):
+        """
+        Context manager that buffers every setter called inside the block,
+        then applies the net changes on exit::
+
+            with arx.transaction():
+                arx.power = 1
+                arx.atten0 = 5
+                arx.atten0 = 7
+                arx.write_flash()
+
+        Only the last value assigned to each setting is kept, and settings
+        that already hold on the ACU are not written. The remaining writes
+        go out in one pipelined burst, followed by at most one FLASH_WRITE,
+        sent only if :meth:`write_flash` was called (or `flash` is True)
+        and something changed. If any write is not acknowledged, every
+        written setting is restored to its value from before the
+        transaction and the error is raised.
+
+        Reading a property inside the block returns the value on the ACU,
+        not the buffered one. If the block raises, nothing is written.
+        Nested transactions join the outermost one.
+
+        :param flash: Store the new settings in EEPROM on success.
+        """
+        if self._txn is not None:
+            if flash:
+                self._local.txn_flash = True
+            yield self
+            return
+        self._local.txn = OrderedDict()
+        self._local.txn_state = {}
+        self._local.txn_flash = flash
+        try:
+            yield self
+            writes, state = self._local.txn, self._local.txn_state
+            flash = self._local.txn_flash
+        finally:
+            self._local.txn = None
+            self._local.txn_state = None
+        self._commit(list(writes.values()), state, flash)
+
+    def _commit(self, writes, state, flash):
+        """Applies the writes buffered by :meth:`transaction`."""
+        with self.session():
+            current = loaded = self.read_all()
+            # The EEPROM offset goes first, as moving it may load state:
+            # the other writes are compared against what it loaded.
+            cmds = [cmd for cmd in writes if cmd[0] == const.EEPROM_WRITE and
+                    not self._holds(current, cmd)]
+            try:
+                if cmds:
+                    self._send(*cmds[0])
+                    loaded = self.read_all()
+                rest = [cmd for cmd in writes if cmd[0] != const.EEPROM_WRITE
+                        and not self._holds(loaded, cmd)]
+                cmds += rest
+                if not cmds:
+                    return
+                if rest:
+                    self._send_many(rest)
+            except IOError:
+                self._rollback(current, cmds)
+                raise
+            for field, value in state.items():
+                self._acked(field, value)
+            if flash:
+                self._send(const.FLASH_WRITE)
+
+    def _rollback(self, state, cmds):
+        """
+        Restores the settings written by `cmds` to their values in `state`.
+        Failures are ignored, leaving the cache invalidated.
+        """
+        try:
+            self._send_many([self._restore_cmd(state, cmd) for cmd in cmds])
+        except IOError:
+            pass
+
+    @staticmethod
+    def _holds(state, cmd):
+        """
+        :rtype: True if writing `cmd` would not change the settings in
+        `state`.
+        """
+        return cmd == ARX._restore_cmd(state, cmd)
+
+    @staticmethod
+    def _restore_cmd(state, cmd):
+        """
+        :rtype: Command tuple that sets what `cmd` writes back to its value
+        in `state`.
+        """
+        op = cmd[0]
+        if op == const.FEE_WRITE:
+            return (op, cmd[1], state.fee[cmd[1]])
+        if op == const.ATTEN_WRITE:
+            return (op, cmd[1], (state.atten0, state.atten1)[cmd[1]])
+        if op == const.FILTER_WRITE:
+            return (op, state.filter)
+        if op == const.EEPROM_WRITE:
+            return (op, state.eeprom_offset)
+        raise ValueError("Cannot restore command %r" % (cmd,))
 
     @property
     def power(self):
@@ -108,25 +618,41 @@ class ARX(object):
         four-element list, it assigns the ith element of the list to the ith
         channel. When accessed, it fetches the current state from the ACU.
         """
-        out = []
-        for i in range(4):
-            resp = self._send(const.FEE_READ,i)
-            out.append(int(resp[0]))
+        hit, value = self._cached('power')
+        if hit:
+            return list(value)
+        resps = self._send_many([(const.FEE_READ,i) for i in range(4)])
+        out = [int(resp[0]) for resp in resps]
+        self._store('power', tuple(out))
         return out
 
     @power.setter
     def power(self,pwr):
+        cmds = self._power_cmds(pwr)
+        if self._txn is not None or self._queue is not None:
+            for cmd in cmds:
+                self._write(*cmd)
+        else:
+            self._send_many(cmds)
+        self._written('power', tuple([cmd[2] for cmd in cmds]))
+
+    @staticmethod
+    def _power_cmds(pwr):
+        """
+        Validates a value assigned to :attr:`power`.
+
+        :rtype: List of the four FEE_WRITE command tuples for :meth:`_send`.
+        """
         if hasattr(pwr,'__iter__'):
             if len(pwr) == 4:
+                pwr = list(pwr)
                 for i in range(4):
                     try:
                         pwr[i] = int(pwr[i])
                     except ValueError:
                         raise ValueError(
                             "power can only accept 0/1 or boolean True/False")
-                    if pwr[i] == 1 or pwr[i] == 0:
-                        self._send(const.FEE_WRITE,i,pwr[i])
-                    else:
+                    if not (pwr[i] == 1 or pwr[i] == 0):
                         raise ValueError(
                             "power can only accept 0/1 or boolean True/False")
             else:
@@ -141,12 +667,13 @@ class ARX(object):
                     "power must be either an int or a four element iterable")
 
             if pwr == 1 or pwr == 0:
-                for i in range(4):
-                    self._send(const.FEE_WRITE,i,pwr)
+                pwr = [pwr] * 4
             else:
                 raise ValueError(
                     "power can only accept 0/1 or boolean True/False")
 
+        return [(const.FEE_WRITE,i,pwr[i]) for i in range(4)]
+
     @property
     def filter(self):
         """
@@ -154,14 +681,29 @@ class ARX(object):
         the ACU to the selected filter. When accessed, it fetches the current
         state from the ACU.
         """
+        hit, value = self._cached('filter')
+        if hit:
+            return value
         resp = int(self._send(const.FILTER_READ)[0])
+        self._store('filter', resp)
         return resp
             
     @filter.setter
     def filter(self,value):
+        cmd = self._filter_cmd(value)
+        self._write(*cmd)
+        self._written('filter', cmd[-1])
+
+    @staticmethod
+    def _filter_cmd(value):
+        """
+        Validates a value assigned to :attr:`filter`.
+
+        :rtype: FILTER_WRITE command tuple for :meth:`_send`.
+        """
         if 0 <= value <= 2:
             if value == int(value):
-                resp = self._send(const.FILTER_WRITE,value)
+                return (const.FILTER_WRITE,int(value))
             else:
                 raise ValueError("Filter does not accept float values")
         else:
@@ -174,18 +716,18 @@ class ARX(object):
         level (0-15), it sets the ACU to the selected level. When accessed, it
         fetches the current state from the ACU.
         """
+        hit, value = self._cached('atten0')
+        if hit:
+            return value
         resp = int(self._send(const.ATTEN_READ,0)[0])
+        self._store('atten0', resp)
         return resp
 
     @atten0.setter
     def atten0(self,level):
-        if 0 <= level <= 15:
-            if level == int(level):
-                resp = self._send(const.ATTEN_WRITE,0,level)
-            else:
-                raise ValueError("Atten0 does not accept float values")
-        else:
-            raise ValueError("Attempt to set atten0 out of range (0-15)")
+        cmd = self._atten_cmd(0,level)
+        self._write(*cmd)
+        self._written('atten0', cmd[-1])
 
     @property
     def atten1(self):
@@ -194,18 +736,34 @@ class ARX(object):
         level (0-15), it sets the ACU to the selected level. When accessed, it
         fetches the current state from the ACU.
         """
+        hit, value = self._cached('atten1')
+        if hit:
+            return value
         resp = int(self._send(const.ATTEN_READ,1)[0])
+        self._store('atten1', resp)
         return resp
 
     @atten1.setter
     def atten1(self,level):
+        cmd = self._atten_cmd(1,level)
+        self._write(*cmd)
+        self._written('atten1', cmd[-1])
+
+    @staticmethod
+    def _atten_cmd(atten,level):
+        """
+        Validates a value assigned to :attr:`atten0` or :attr:`atten1`.
+
+        :rtype: ATTEN_WRITE command tuple for :meth:`_send`.
+        """
         if 0 <= level <= 15:
             if level == int(level):
-                resp = self._send(const.ATTEN_WRITE,1,level)
+                return (const.ATTEN_WRITE,atten,int(level))
             else:
-                raise ValueError("Atten1 does not accept float values")
+                raise ValueError("Atten%d does not accept float values"%atten)
         else:
-            raise ValueError("Attempt to set atten1 out of range (0-15)")
+            raise ValueError(
+                "Attempt to set atten%d out of range (0-15)"%atten)
 
     @property
     def eeprom_offset(self):
@@ -214,18 +772,121 @@ class ARX(object):
         offset for the storage system. When accessed, it fetches the current
         state from the ACU.
         """
+        hit, value = self._cached('eeprom_offset')
+        if hit:
+            return value
         resp = int(self._send(const.EEPROM_READ)[0])
+        self._store('eeprom_offset', resp)
         return resp
 
     @eeprom_offset.setter
     def eeprom_offset(self,position):
-        if 0 <= position <= (const.EEPROM_SIZE/const.FLASH_SIZE):
+        cmd = self._eeprom_cmd(position)
+        self._write(*cmd)
+        self._written('eeprom_offset', cmd[-1])
+
+    @staticmethod
+    def _eeprom_cmd(position):
+        """
+        Validates a value assigned to :attr:`eeprom_offset`.
+
+        :rtype: EEPROM_WRITE command tuple for :meth:`_send`.
+        """
+        if 1 <= position < const.EEPROM_SLOTS:
             if position == int(position):
-                resp = self._send(const.EEPROM_WRITE,position)
+                return (const.EEPROM_WRITE,int(position))
             else:
                 raise ValueError("EEPROM_OFFSET does not accept float values")
         else:
-            raise ValueError("Attempt to set EEPROM_OFFSET out of range (0-15)")
+            raise ValueError("Attempt to set EEPROM_OFFSET out of range "
+                             "(1-%d)" % (const.EEPROM_SLOTS - 1))
+
+    #: Commands that read the whole ACU state, in :class:`State` field order.
+    _READ_ALL = tuple([(const.FEE_READ,i) for i in range(4)] +
+                      [(const.ATTEN_READ,0), (const.ATTEN_READ,1),
+                       (const.FILTER_READ,), (const.EEPROM_READ,)])
+
+    def read_all(self):
+        """
+        Fetches the whole ACU state in a single session, with one STATE_READ
+        when the firmware supports it, or else with every read command sent
+        in one pipelined burst. The state cache is bypassed and then updated.
+
+        :rtype: :class:`ARXControl.state.State`
+        """
+        with self.session():
+            values = None
+            if const.STATE_READ in (self.conn.capabilities or ()):
+                try:
+                    values = self._send(const.STATE_READ)
+                except IOError:
+                    # The capability may have been cached for other
+                    # firmware: probe again on the next handshake.
+                    self.conn.forget_capabilities()
+            if values is None:
+                values = [resp[0] for resp in
+                          self._send_many(self._READ_ALL)]
+        state = self._make_state(values)
+        self._store('power', state.fee)
+        for field in ('atten0', 'atten1', 'filter', 'eeprom_offset'):
+            self._store(field, getattr(state, field))
+        return state
+
+    @staticmethod
+    def _make_state(values):
+        """
+        Builds a :class:`ARXControl.state.State` from the values read by
+        :attr:`_READ_ALL`, or by STATE_READ, in the same order.
+        """
+        if len(values) != len(ARX._READ_ALL):
+            raise IOError("Expected %d state values, received `%s`" %
+                          (len(ARX._READ_ALL), values))
+        values = [int(value) for value in values]
+        return State(tuple(values[:4]), values[4], values[5], values[6],
+                     values[7], time.time())
+
+    def apply(self, state, current=None):
+        """
+        Writes a snapshot back to the ACU. Only the settings that differ from
+        the current state are written, and FEE channels are written
+        individually. All writes go out in one pipelined burst. A new EEPROM
+        offset is written first, and the other settings are compared against
+        those it loads.
+
+        :param state: :class:`ARXControl.state.State` to apply.
+        :param current: Optional snapshot of the current state. Fetched with
+        :meth:`read_all` when not given.
+
+        :rtype: Tuple of the names of the settings that were written.
+        """
+        with self.session():
+            if current is None:
+                current = self.read_all()
+            changed = state.diff(current)
+            moved = ()
+            if 'eeprom_offset' in changed:
+                # The EEPROM offset goes first, as moving it may load state.
+                self.eeprom_offset = state.eeprom_offset
+                moved = ('eeprom_offset',)
+                if self._txn is None and self._queue is None:
+                    current = self.read_all()
+                    changed = moved + state.diff(current)
+                else:
+                    # What the slot holds is not known until the move is
+                    # sent, so every setting is written.
+                    current = None
+                    changed = state.SETTINGS
+            with self.pipeline():
+                if 'fee' in changed:
+                    for i in range(4):
+                        if current is None or state.fee[i] != current.fee[i]:
+                            self._write(const.FEE_WRITE, i,
+                                        int(state.fee[i]))
+                    self._written('power', tuple(state.fee))
+                for field in ('atten0', 'atten1', 'filter'):
+                    if field in changed:
+                        setattr(self, field, getattr(state, field))
+        return changed
 
     def roach(self, state):
         if 0 <= state <= 1:
@@ -237,7 +898,7 @@ class ARX(object):
 
 
     def write_flash(self):
-        resp = self._send(const.FLASH_WRITE)
+        resp = self._write(const.FLASH_WRITE)
         return True
 
     
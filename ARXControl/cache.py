@@ -0,0 +1,57 @@
+import time
+
+
+class StateCache(object):
+    """
+    Write-through cache of ACU state, used by :class:`ARXControl.arx.ARX`.
+
+    Values are stored by field name (``'power'``, ``'atten0'``, ``'atten1'``,
+    ``'filter'``, ``'eeprom_offset'``) and expire `ttl` seconds after they
+    were stored.
+    """
+
+    def __init__(self, ttl):
+        """
+        :param ttl: Time to live in seconds, either a single number for every
+        field, or a dict mapping field names to their TTL. Fields missing from
+        the dict are not cached.
+        """
+        self.ttl = ttl
+        self._values = {}
+
+    def ttl_for(self, field):
+        """Returns the TTL in seconds for `field`."""
+        if isinstance(self.ttl, dict):
+            return self.ttl.get(field, 0)
+        return self.ttl
+
+    def lookup(self, field):
+        """
+        Looks up a cached value.
+
+        :rtype: A tuple of (hit, value). `value` is None on a miss.
+        """
+        try:
+            value, expires = self._values[field]
+        except KeyError:
+            return False, None
+        if time.time() >= expires:
+            # Another thread may have dropped it already.
+            self._values.pop(field, None)
+            return False, None
+        return True, value
+
+    def store(self, field, value):
+        """Stores `value` for `field`, restarting its TTL."""
+        ttl = self.ttl_for(field)
+        if ttl > 0:
+            self._values[field] = (value, time.time() + ttl)
+        else:
+            self._values.pop(field, None)
+
+    def invalidate(self, *fields):
+        """Drops the cached `fields`, or every field if none are given."""
+        if not fields:
+            self._values.clear()
+        for field in fields:
+            self._values.pop(field, None)
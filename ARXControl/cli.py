@@ -0,0 +1,197 @@
+"""
+``arxctl``, the ARX command-line tool.
+
+Runs a batch of operations on one ACU in a single session, and prints one
+JSON object per operation::
+
+    arxctl /dev/ttyUSB0 'power 1 0 1 0; atten0 5; filter 2; flash'
+    arxctl /dev/ttyUSB0 -f night.arx
+    echo 'state' | arxctl --socket /tmp/arxd.sock
+
+Operations are separated by ``;`` or newlines, and ``#`` starts a comment:
+
+=========================  =============================================
+``power [V | V V V V]``    Read, or set all or each FEE channel.
+``atten0 [LEVEL]``         Read or set attenuator 0. Likewise ``atten1``.
+``filter [N]``             Read or set the filter.
+``eeprom_offset [N]``      Read or set the EEPROM offset.
+``state``                  Read every setting.
+``roach 0|1``              Set the ROACH switch.
+``flash``                  Store the settings in EEPROM.
+``sleep SECONDS``          Wait.
+=========================  =============================================
+
+The whole script is parsed before the ACU is opened, and the serial stack
+is only imported once there is work to do.
+"""
+import argparse
+import json
+import sys
+import time
+
+from . import const
+
+#: Operations taking an optional single integer, mapped to ARX properties.
+PROPERTIES = ('atten0', 'atten1', 'filter', 'eeprom_offset')
+
+#: Operations, mapped to the numbers of arguments they accept.
+OPERATIONS = dict([(name, (0, 1)) for name in PROPERTIES] +
+                  [('power', (0, 1, 4)), ('state', (0,)), ('roach', (1,)),
+                   ('flash', (0,)), ('sleep', (1,))])
+
+
+class ScriptError(ValueError):
+    """Raised for a batch script that cannot be parsed."""
+    pass
+
+
+def parse(text):
+    """
+    Parses a batch script.
+
+    :param text: Script text.
+
+    :rtype: List of (operation, args) tuples.
+    """
+    ops = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.split('#', 1)[0]
+        for statement in line.split(';'):
+            words = statement.split()
+            if not words:
+                continue
+            name, args = words[0], words[1:]
+            if name not in OPERATIONS:
+                raise ScriptError("line %d: unknown operation `%s`" %
+                                  (lineno, name))
+            if len(args) not in OPERATIONS[name]:
+                raise ScriptError("line %d: wrong number of arguments to "
+                                  "`%s`" % (lineno, name))
+            try:
+                args = [float(arg) if name == 'sleep' else int(arg)
+                        for arg in args]
+            except ValueError:
+                raise ScriptError("line %d: bad argument to `%s`" %
+                                  (lineno, name))
+            ops.append((name, args))
+    return ops
+
+
+def execute(arx, name, args):
+    """
+    Runs one operation.
+
+    :rtype: The value read, or None for a write.
+    """
+    if name in PROPERTIES:
+        if not args:
+            return getattr(arx, name)
+        setattr(arx, name, args[0])
+    elif name == 'power':
+        if not args:
+            return arx.power
+        arx.power = args if len(args) == 4 else args[0]
+    elif name == 'state':
+        state = arx.read_all()
+        out = state._asdict()
+        out['fee'] = list(state.fee)
+        return out
+    elif name == 'roach':
+        arx.roach(args[0])
+    elif name == 'flash':
+        arx.write_flash()
+    elif name == 'sleep':
+        time.sleep(args[0])
+    return None
+
+
+def run(arx, ops, out, keep_going=False):
+    """
+    Runs parsed operations in one session, writing a JSON line for each.
+
+    :param arx: :class:`ARXControl.arx.ARX` to run them on.
+    :param ops: Operations returned by :func:`parse`.
+    :param out: File to write the results to.
+    :param keep_going: Run the remaining operations after one fails.
+
+    :rtype: Number of failed operations.
+    """
+    failed = 0
+    with arx.session():
+        for name, args in ops:
+            result = {'op': name, 'args': args}
+            try:
+                value = execute(arx, name, args)
+            except Exception as e:
+                failed += 1
+                result.update(ok=False, error=type(e).__name__,
+                              message=str(e))
+            else:
+                result['ok'] = True
+                if value is not None:
+                    result['value'] = value
+            out.write(json.dumps(result, sort_keys=True) + '\n')
+            out.flush()
+            if failed and not keep_going:
+                break
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='arxctl', description='Run operations on an ARX Control Unit.',
+        epilog='Operations: %s.' % ', '.join(sorted(OPERATIONS)))
+    parser.add_argument('tty', nargs='?', help='serial port of the ACU')
+    parser.add_argument('script', nargs='?',
+                        help='operations to run, e.g. "atten0 5; flash"')
+    parser.add_argument('-f', '--file', metavar='FILE',
+                        help='read operations from FILE, or stdin for "-"')
+    parser.add_argument('-s', '--socket',
+                        help='use the arxd daemon listening on SOCKET '
+                        'instead of a serial port')
+    parser.add_argument('-r', '--rate', default=None,
+                        help='baud rate, or "auto" to negotiate it')
+    parser.add_argument('-k', '--keep-going', action='store_true',
+                        help='run every operation even if one fails')
+    args = parser.parse_args(argv)
+
+    if args.socket and args.tty and not args.script:
+        # With --socket the only positional argument is the script.
+        args.tty, args.script = None, args.tty
+    if not args.socket and not args.tty:
+        parser.error('a tty or --socket is required')
+    if args.script is not None and args.file is not None:
+        parser.error('give a script or --file, not both')
+
+    if args.file == '-' or (args.script is None and args.file is None):
+        text = sys.stdin.read()
+    elif args.file is not None:
+        with open(args.file) as f:
+            text = f.read()
+    else:
+        text = args.script
+    try:
+        ops = parse(text)
+    except ScriptError as e:
+        parser.error(str(e))
+    if not ops:
+        return 0
+
+    if args.socket:
+        from .daemon import RemoteARX
+        arx = RemoteARX(args.socket)
+    else:
+        from .arx import ARX
+        rate = args.rate
+        if rate is not None and rate != const.AUTO_BAUD:
+            rate = int(rate)
+        arx = ARX(args.tty, rate)
+    try:
+        failed = run(arx, ops, sys.stdout, args.keep_going)
+    finally:
+        arx.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
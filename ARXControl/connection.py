@@ -1,7 +1,17 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from serial import Serial
 
-from .arx import unpack 
 from . import const
+from .decoder import Decoder, unpack
+from .retry import RetryPolicy
+from .metrics import NULL_METRICS
 from .err import ConnError
 
 #def unpack(inputstring):
@@ -25,19 +35,343 @@ from .err import ConnError
     #return command, args
 
 
+def _encode(cmd, *args):
+    """
+    Formats a command frame.
+
+    :rtype: The frame as ASCII `bytes`.
+    """
+    out = str(cmd)
+    if args:
+        if len(args) > 2:
+            raise TypeError('Only accepts a maximum of two arguments')
+        out += const.SEPARATOR+const.ARG_SEPARATOR.join(map(str,args))
+    out += const.END_COMMAND
+    return out.encode('ascii')
+
+
+def _build_frames():
+    keys = [(const.ACU_READY,), (const.FILTER_READ,), (const.EEPROM_READ,),
+            (const.FLASH_WRITE,), (const.STATE_READ,)]
+    keys += [(const.FEE_READ,i) for i in range(4)]
+    keys += [(const.FEE_WRITE,i,v) for i in range(4) for v in range(2)]
+    keys += [(const.FILTER_WRITE,v) for v in range(3)]
+    keys += [(const.ATTEN_READ,i) for i in range(2)]
+    keys += [(const.ATTEN_WRITE,i,v) for i in range(2) for v in range(16)]
+    keys += [(const.EEPROM_WRITE,v) for v in range(1, const.EEPROM_SLOTS)]
+    keys += [(const.ROACH_WRITE,v) for v in range(2)]
+    return dict((key, _encode(*key)) for key in keys)
+
+_END = const.END_COMMAND.encode('ascii')
+
+#: Prebuilt command frames, keyed by (cmd,) + args, covering every valid
+#: command the ACU accepts.
+FRAMES = _build_frames()
+
+
+class FrameReader(object):
+    """
+    Reads ACU responses from a serial port through a streaming
+    :class:`ARXControl.decoder.Decoder`. A read returns as soon as the
+    :attr:`const.END_COMMAND` terminator of a frame arrives, instead of
+    waiting for a fixed number of bytes or the timeout. Bytes received past
+    the terminator stay buffered for the next response.
+    """
+
+    def __init__(self, serial):
+        """
+        :param serial: Serial port (or compatible object) to read from.
+        """
+        self.serial = serial
+        self.decoder = Decoder()
+        #: :class:`ARXControl.metrics.Metrics` sink for received bytes.
+        self.metrics = NULL_METRICS
+
+    def _waiting(self):
+        try:
+            return self.serial.in_waiting
+        except AttributeError:
+            return self.serial.inWaiting()
+
+    def clear(self):
+        """Discards any buffered bytes."""
+        self.decoder.clear()
+
+    def feed(self, data):
+        """Appends received bytes to the buffer."""
+        self.metrics.received(len(data))
+        self.decoder.feed(data)
+
+    def next_response(self):
+        """
+        Takes one decoded response off the buffer, without reading the port.
+
+        :rtype: A `(code, args)` tuple, or None if no complete frame is
+        buffered.
+        """
+        return self.decoder.next_record()
+
+    def read_response(self):
+        """
+        Reads one response, waiting at most the serial port's timeout in
+        total, even while bytes keep arriving.
+
+        :rtype: A `(code, args)` tuple, or None if the serial port timed out
+        first. Partial frames stay buffered.
+        """
+        timeout = getattr(self.serial, 'timeout', None)
+        deadline = None if timeout is None else time.time() + timeout
+        fed = False
+        while True:
+            record = self.decoder.next_record()
+            if record is not None:
+                return record
+            if fed and deadline is not None and time.time() > deadline:
+                raise ConnError("No complete response within %s s" % timeout)
+
+            chunk = self.serial.read(max(1, self._waiting()))
+            if not chunk:
+                return None
+            self.feed(chunk)
+            fed = True
+
+
+class DuplexReader(FrameReader):
+    """
+    Full-duplex version of :class:`FrameReader`. A background thread keeps
+    draining the serial port into the decoder, and hands each response to
+    the oldest command still in flight through a
+    :class:`concurrent.futures.Future`, so writers never wait for the line
+    to turn around.
+
+    Commands are registered with :meth:`expect` before they are written.
+    A command whose response is not read, because an earlier one timed out
+    or because it timed out itself, stays in line: its late response is
+    matched to it, rather than to a later command. :meth:`clear` waits up
+    to :attr:`late_timeout` for such responses before dropping the rest, so
+    that one which never arrives does not swallow the response to a command
+    sent after it.
+    Responses arriving while no command is in flight are counted in
+    :attr:`unsolicited` and discarded.
+    """
+
+    def __init__(self, serial):
+        """
+        :param serial: Serial port (or compatible object) to read from. Its
+        timeout is set to :attr:`const.DUPLEX_POLL`.
+        """
+        FrameReader.__init__(self, serial)
+        #: Seconds :meth:`read_response` waits for each response.
+        self.timeout = const.TIMEOUT
+        #: Seconds after it was sent that a command's response is still
+        #: waited for by :meth:`clear`.
+        self.late_timeout = const.LATE_TIMEOUT
+        #: Number of responses received with no command in flight.
+        self.unsolicited = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        # (time sent, future) of every command awaiting a response.
+        self._inflight = deque()
+        # Futures of the commands whose responses are yet to be read.
+        self._unread = deque()
+        self._running = True
+        serial.timeout = const.DUPLEX_POLL
+        self._thread = threading.Thread(target=self._run, name='arx-reader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def inflight(self):
+        """Number of commands awaiting a response."""
+        return len(self._inflight)
+
+    def expect(self, count):
+        """
+        Registers `count` commands, which must be written right after, so
+        that no response can arrive before its command is in line. Commands
+        registered earlier whose responses were not read are abandoned.
+
+        :rtype: List of futures of the `(code, args)` responses, in order.
+        """
+        with self._lock:
+            self._unread.clear()
+            futures = self._register(count)
+            self._unread.extend(futures)
+        return futures
+
+    def drop(self, futures):
+        """
+        Stops waiting for the responses to commands registered by
+        :meth:`register`, e.g. ones the ACU may never answer, so that they
+        do not take the responses to later commands.
+        """
+        with self._lock:
+            self._inflight = deque(entry for entry in self._inflight
+                                   if entry[1] not in futures)
+            for future in futures:
+                if not future.done():
+                    future.set_result(None)
+
+    def register(self, count):
+        """
+        Registers `count` commands like :meth:`expect`, but leaves them out
+        of :meth:`read_response`: the caller waits on the futures itself.
+
+        :rtype: List of futures of the `(code, args)` responses, in order.
+        """
+        with self._lock:
+            return self._register(count)
+
+    def _register(self, count):
+        now = time.time()
+        futures = [Future() for i in range(count)]
+        for future in futures:
+            self._inflight.append((now, future))
+        return futures
+
+    def wake(self):
+        """Wakes the reader thread after commands were written."""
+        self._wake.set()
+
+    def read_response(self):
+        """
+        Waits for the response to the oldest command registered by
+        :meth:`expect` whose response has not been read yet.
+
+        :rtype: A `(code, args)` tuple, or None if it did not arrive within
+        :attr:`timeout` seconds, or no command is waiting.
+        """
+        with self._lock:
+            if not self._unread:
+                return None
+            future = self._unread.popleft()
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            return None
+
+    def clear(self):
+        """
+        Resynchronizes with the ACU: waits for the responses to commands in
+        flight, up to :attr:`late_timeout` seconds after each was sent, then
+        abandons the rest and discards any buffered bytes.
+        """
+        with self._lock:
+            self._unread.clear()
+            inflight = list(self._inflight)
+        for sent, future in inflight:
+            try:
+                future.result(max(0, sent + self.late_timeout - time.time()))
+            except FutureTimeout:
+                break
+        with self._lock:
+            for sent, future in self._inflight:
+                future.set_result(None)
+            self._inflight.clear()
+            self.decoder.clear()
+
+    def close(self):
+        """Stops the reader thread."""
+        self._running = False
+        self._wake.set()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while self._running:
+            try:
+                chunk = self.serial.read(max(1, self._waiting()))
+            except (IOError, OSError, TypeError, ValueError):
+                # The port was closed under the reader.
+                break
+            if not chunk:
+                self._wake.wait(const.DUPLEX_POLL)
+                self._wake.clear()
+                continue
+            with self._lock:
+                self.feed(chunk)
+                for record in self.decoder.records():
+                    if self._inflight:
+                        self._inflight.popleft()[1].set_result(record)
+                    else:
+                        self.unsolicited += 1
+        self._running = False
+
+
+def _load_json(path):
+    """:rtype: The dict stored in the JSON file `path`, or an empty one."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_json(path, data):
+    """Atomically replaces the JSON file `path` with `data`."""
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp = '%s.%d' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.rename(tmp, path)
+
+
 class Connection(object):
     """
     Connection class. Provides a wrapper around a serial connection
     that verifies the ARX Control Unit is ready to accept commands.
+
+    When created with a rate of :data:`const.AUTO_BAUD`, the baud rate is
+    negotiated on open, see :meth:`negotiate`. See :attr:`duplex` for
+    full-duplex operation.
     """
     _unpack = unpack
 
+    _crc = None
+    _frames = FRAMES
+    _duplex = False
+
+    #: Optional opcodes probed by :meth:`discover`.
+    OPTIONAL = (const.STATE_READ,)
+    #: Optional opcodes the firmware answers, or None until probed on the
+    #: first handshake.
+    capabilities = None
+
+    #: File the negotiated baud rate of each device is cached in, e.g.
+    #: ``~/.arxcontrol/rates.json``, or None (the default) to negotiate on
+    #: every open.
+    rate_cache = None
+    #: File the capabilities of each device are cached in, e.g.
+    #: ``~/.arxcontrol/capabilities.json``, or None (the default) to probe
+    #: on every connection.
+    capability_cache = None
+
     def __init__(self, tty, rate):
         """
         :param tty: `port` parameter for serial connection to ARX
+        :param rate: Baud rate, None for :attr:`const.BAUDRATE`, or
+        :data:`const.AUTO_BAUD` to negotiate it.
         """
-        self.serial = self._connect(tty, rate)
+        self.tty = tty
+        auto = rate == const.AUTO_BAUD
+        self.rate = None if auto else rate
+        self.serial = self._connect(tty, self.rate)
+        self._metrics = NULL_METRICS
+        self.reader = self._make_reader()
         self.conn_failure = 0
+        #: :class:`ARXControl.retry.RetryPolicy` used for this connection.
+        self.retry_policy = RetryPolicy()
+        #: True while READY has been verified for the current session.
+        self.ready = False
+        #: Seconds a session may sit idle before READY is checked again.
+        self.idle_timeout = const.SESSION_IDLE_TIMEOUT
+        self._session = 0
+        self._last_used = 0
+        if auto:
+            self.rate = self.negotiate()
 
     def _connect(self, tty, rate):
         """Connect hook. Useful for testing hooks"""
@@ -46,9 +380,93 @@ class Connection(object):
 
         return Serial(tty, timeout=const.TIMEOUT, baudrate=rate)
 
+    def _make_reader(self):
+        if self._duplex:
+            reader = DuplexReader(self.serial)
+        else:
+            reader = FrameReader(self.serial)
+        reader.metrics = self._metrics
+        reader.decoder.crc = self._crc
+        return reader
+
+    @property
+    def metrics(self):
+        """
+        :class:`ARXControl.metrics.Metrics` recording handshakes and bytes on
+        the wire. A :class:`ARXControl.metrics.NullMetrics` when disabled.
+        """
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self._metrics = metrics
+        self.reader.metrics = metrics
+
+    def write(self, data):
+        """
+        Writes raw frames to the serial port. In full-duplex mode, a
+        response is expected for each frame.
+        """
+        self._metrics.sent(len(data))
+        if self._duplex:
+            self.reader.expect(data.count(_END))
+            self.serial.write(data)
+            self.reader.wake()
+        else:
+            self.serial.write(data)
+
+    def submit(self, data):
+        """
+        Full-duplex version of :meth:`write` that does not wait for the
+        responses: they are awaited with :meth:`wait`, while other frames
+        are written. Must be called with exclusive use of the connection,
+        like :meth:`write`.
+
+        :rtype: List of futures of the responses, one per frame.
+        """
+        self._metrics.sent(len(data))
+        futures = self.reader.register(data.count(_END))
+        self.serial.write(data)
+        self.reader.wake()
+        return futures
+
+    def wait(self, future):
+        """
+        Waits for a response registered by :meth:`submit`, at most the
+        timeout given by :attr:`retry_policy`.
+
+        :rtype: A `(code, args)` tuple, or None on timeout.
+        """
+        policy = self.retry_policy
+        try:
+            record = future.result(policy.get_timeout())
+        except FutureTimeout:
+            record = None
+        if record is None:
+            policy.record_timeout()
+        return record
+
     def _split(self, resp):
         return resp.strip(';').split(',')
 
+    def read_response(self):
+        """
+        Reads and decodes one response frame, waiting at most the timeout
+        given by :attr:`retry_policy`. See :meth:`FrameReader.read_response`.
+        Round-trip times are sampled by :class:`ARXControl.retry.Burst`.
+        """
+        policy = self.retry_policy
+        timeout = policy.get_timeout()
+        if self._duplex:
+            self.reader.timeout = timeout
+        elif getattr(self.serial, 'timeout', None) != timeout:
+            self.serial.timeout = timeout
+
+        record = self.reader.read_response()
+        if record is None:
+            policy.record_timeout()
+        return record
+
     def _make_cmd(self, cmd, *args):
         """
         Generates a command string
@@ -56,34 +474,274 @@ class Connection(object):
         :param cmd: Command Code, usually from :module:`.const`.
         :param args: One or two arguments used to build the command string.
 
-        :rtype: A properly formatted string that meets the ACU Command
-        Structure.
+        :rtype: A properly formatted frame, as `bytes`, that meets the ACU
+        Command Structure, sealed with :attr:`crc` if set. Valid commands
+        are served from :data:`FRAMES` without any formatting.
         """
-        out = str(cmd)
-        if args:
-            if len(args) > 2:
-                raise TypeError('Only accepts a maximum of two arguments')
-            out += const.SEPARATOR+const.ARG_SEPARATOR.join(map(str,args))
-        out += const.END_COMMAND
-        return out 
+        try:
+            return self._frames[(cmd,) + args]
+        except KeyError:
+            frame = _encode(cmd, *args)
+        if self._crc is not None:
+            frame = self._crc.seal(frame)
+        return frame
 
+    @property
+    def crc(self):
+        """
+        :class:`ARXControl.crc.CRC` that seals every frame sent and checks
+        every frame received, or None. The ACU must be set to the same CRC.
+        """
+        return self._crc
 
+    @crc.setter
+    def crc(self, crc):
+        self._crc = crc
+        self._frames = crc.frames(FRAMES) if crc is not None else FRAMES
+        self.reader.decoder.crc = crc
 
-    def __enter__(self):
-        while self.conn_failure < const.MAX_RETRIES:
-            self.serial.write(self._make_cmd(const.ACU_READY))
+    @property
+    def duplex(self):
+        """
+        True in full-duplex mode, where a :class:`DuplexReader` thread reads
+        every response as it arrives, and writes never wait for the
+        responses to earlier commands. Off by default.
+        """
+        return self._duplex
 
-            cmd, _ = self._unpack(self.serial.read(const.FRAME_OFFSET))
+    @duplex.setter
+    def duplex(self, duplex):
+        duplex = bool(duplex)
+        if duplex == self._duplex:
+            return
+        if self._duplex:
+            self.reader.close()
+        self._duplex = duplex
+        self.reader = self._make_reader()
+        self.ready = False
 
-            if  int(cmd) == const.kREADY:
-                break
+    def reconnect(self):
+        """
+        Closes and reopens the serial connection. READY is checked again
+        before the next command.
+        """
+        if self._duplex:
+            self.reader.close()
+        self.serial.close()
+        self.serial = self._connect(self.tty, self.rate)
+        self.reader = self._make_reader()
+        self.ready = False
+        self.capabilities = None
+
+    def discover(self, refresh=False):
+        """
+        Finds which of the :attr:`OPTIONAL` opcodes the firmware answers.
+        Called on the first handshake, and again after :meth:`reconnect`.
+
+        When :attr:`capability_cache` is set, the result for each device is
+        kept there, so usually nothing is sent. Otherwise each opcode is sent
+        once, and counts as supported if it is acknowledged within
+        :attr:`const.PROBE_TIMEOUT`. Firmware that predates an opcode
+        answers it with :attr:`const.kCOMM_ERR`, or not at all.
+
+        :param refresh: Probe even if the device is in the cache.
+
+        :rtype: frozenset of the supported opcodes. It is kept in
+        :attr:`capabilities` unless an answer failed its CRC check, in which
+        case the next handshake probes again.
+        """
+        key = os.path.realpath(str(self.tty))
+        cached = {}
+        if self.capability_cache is not None:
+            cached = _load_json(self.capability_cache)
+            if not refresh and isinstance(cached.get(key), list):
+                self.capabilities = frozenset(cached[key])
+                return self.capabilities
+
+        found = set()
+        known = True
+        for cmd in self.OPTIONAL:
+            record = self._send_probe(cmd)
+            if record is None:
+                continue
+            if record[0] == const.kACK:
+                found.add(cmd)
+            elif record[0] == const.kCRC_ERR:
+                known = False
+        found = frozenset(found)
+        if not known:
+            return found
+        self.capabilities = found
+        if self.capability_cache is not None:
+            cached[key] = sorted(found)
+            try:
+                _save_json(self.capability_cache, cached)
+            except (IOError, OSError):
+                # Only costs a probe on the next connection.
+                pass
+        return found
+
+    def forget_capabilities(self):
+        """
+        Discards the known capabilities, here and in
+        :attr:`capability_cache`, so that the next handshake probes again.
+        """
+        self.capabilities = None
+        if self.capability_cache is None:
+            return
+        cached = _load_json(self.capability_cache)
+        if cached.pop(os.path.realpath(str(self.tty)), None) is not None:
+            try:
+                _save_json(self.capability_cache, cached)
+            except (IOError, OSError):
+                pass
+
+    def _send_probe(self, cmd):
+        """
+        Sends `cmd` and reads its response, waiting at most
+        :attr:`const.PROBE_TIMEOUT`, without recording it in
+        :attr:`retry_policy`. In full-duplex mode, a response that does not
+        arrive in time is no longer waited for.
+
+        :rtype: A `(code, args)` tuple, or None on timeout.
+        """
+        frame = self._make_cmd(cmd)
+        if self._duplex:
+            futures = self.submit(frame)
+            try:
+                return futures[0].result(const.PROBE_TIMEOUT)
+            except FutureTimeout:
+                self.reader.drop(futures)
+                return None
+        self.write(frame)
+        timeout = getattr(self.serial, 'timeout', None)
+        self.serial.timeout = const.PROBE_TIMEOUT
+        try:
+            return self.reader.read_response()
+        finally:
+            self.serial.timeout = timeout
+
+    def negotiate(self, rates=const.BAUDRATES):
+        """
+        Finds the fastest baud rate the ACU answers reliably at. Each rate
+        is tried from fastest to slowest with a READY check followed by a
+        burst of :attr:`const.PROBE_BURST` back-to-back READY frames, which
+        must all be answered. When :attr:`rate_cache` is set, the result is
+        cached there, so later opens only need to confirm it with a single
+        READY.
+
+        :param rates: Candidate baud rates.
+
+        :rtype: The chosen baud rate, which the port is left set to.
+        """
+        key = os.path.realpath(self.tty)
+        cached = {}
+        if self.rate_cache is not None:
+            cached = _load_json(self.rate_cache)
+        timeout = getattr(self.serial, 'timeout', None)
+        try:
+            rate = cached.get(key)
+            if rate in rates and self._probe(rate, 1):
+                return rate
+            for rate in sorted(rates, reverse=True):
+                if self._probe(rate, 1) and \
+                        self._probe(rate, const.PROBE_BURST):
+                    if self.rate_cache is None:
+                        return rate
+                    cached[key] = rate
+                    try:
+                        _save_json(self.rate_cache, cached)
+                    except (IOError, OSError):
+                        # Only costs a probe on the next open.
+                        pass
+                    return rate
+        finally:
+            self.serial.timeout = timeout
+        raise ConnError("Control unit does not answer at any of %s baud" %
+                        ', '.join(map(str, rates)))
+
+    def _probe(self, rate, count):
+        """
+        :rtype: True if `count` READY frames sent back-to-back at `rate` are
+        all answered with :attr:`const.kREADY`.
+        """
+        self.serial.baudrate = rate
+        self.serial.timeout = const.PROBE_TIMEOUT
+        self.reader.clear()
+        reset = getattr(self.serial, 'reset_input_buffer', None)
+        if reset is not None:
+            reset()
+        self.write(self._make_cmd(const.ACU_READY) * count)
+        for i in range(count):
+            record = self.reader.read_response()
+            if record is None or record[0] != const.kREADY:
+                return False
+        return True
+
+    def close(self):
+        """Stops the duplex reader, if any, and closes the serial port."""
+        if self._duplex:
+            self.reader.close()
+        self.serial.close()
+
+    @contextmanager
+    def session(self):
+        """
+        Context manager for a long-lived session. READY is checked once when
+        the session opens, and then only again after an error, after
+        :attr:`idle_timeout` seconds without traffic, or after
+        :meth:`reconnect`.
+        """
+        self._session += 1
+        try:
+            with self as serial:
+                yield serial
+        finally:
+            self._session -= 1
+            if not self._session:
+                self.ready = False
+
+    def _handshake(self):
+        self.reader.clear()
+        reset = getattr(self.serial, 'reset_input_buffer', None)
+        if reset is not None:
+            reset()
+        policy = self.retry_policy
+        nacks = timeouts = 0
+        while policy.should_retry(nacks, timeouts):
+            if self.conn_failure:
+                time.sleep(policy.delay(self.conn_failure))
+            self.write(self._make_cmd(const.ACU_READY))
+
+            record = self.read_response()
+
+            if record is not None and record[0] == const.kREADY:
+                return
+            if record is None:
+                timeouts += 1
+            else:
+                nacks += 1
             self.conn_failure += 1
 
-        if self.conn_failure >= const.MAX_RETRIES:
-            raise ConnError(
-                "Failure attempting to communicate with control unit.")
+        raise ConnError(
+            "Failure attempting to communicate with control unit.")
+
+    def __enter__(self):
+        if self.ready and time.time() - self._last_used > self.idle_timeout:
+            self.ready = False
+        if not self.ready:
+            start = time.time()
+            self._handshake()
+            if self.capabilities is None:
+                self.discover()
+            self._last_used = time.time()
+            self._metrics.handshake(self._last_used - start)
+            self.ready = self._session > 0
 
         return self.serial 
             
     def __exit__(self, etype, value, tb):
         self.conn_failure = 0
+        self._last_used = time.time()
+        if etype is not None or not self._session:
+            self.ready = False
@@ -3,6 +3,7 @@ kCOMM_ERR = 0
 kACK = 1
 kREADY = 2
 kERR = 3
+kCRC_ERR = -1 # Not sent by the ACU: a frame that failed its CRC check
 
 # Commands
 ACU_READY = 4
@@ -16,12 +17,16 @@ EEPROM_READ = 11
 EEPROM_WRITE = 12
 FLASH_WRITE = 13
 ROACH_WRITE = 14
+STATE_READ = 15 # Optional, see Connection.discover
 
 # Consts
 MAX_RETRIES = 3
 FRAME_SIZE = 4  # Bytes
 FRAME_OFFSET = 15 # Bytes
 BUFFER_SIZE = 100 # Bytes
+EEPROM_SIZE = 1024 # Bytes
+FLASH_SIZE = 64 # Bytes per stored state
+EEPROM_SLOTS = EEPROM_SIZE // FLASH_SIZE # Valid offsets are 1 to EEPROM_SLOTS-1
 
 SEPARATOR = ','
 ARG_SEPARATOR = '|'
@@ -29,8 +34,15 @@ END_COMMAND = ';'
 
 BAUDRATE = 57600 # Baudrate for Arduino Duemilanove (FTDI Comms)
 #BAUDRATE = 115200 # Baudrate for Arduino Uno + (AT8u2 Comms)
+AUTO_BAUD = 'auto' # Pass as the rate to probe BAUDRATES
+BAUDRATES = (115200, 57600, 38400, 19200, 9600) # Probed fastest first
+PROBE_BURST = 16 # READY frames sent back-to-back to test a rate
+PROBE_TIMEOUT = 0.25 # Seconds
 
 TIMEOUT = 1 # Seconds
+LATE_TIMEOUT = 2 # Seconds a late response is waited for when resynchronizing
+DUPLEX_POLL = 0.05 # Seconds the full-duplex reader waits on an idle line
+SESSION_IDLE_TIMEOUT = 5 # Seconds
 
 # Responses
 READY_RSP = "READY"
@@ -0,0 +1,93 @@
+"""
+Frame checksums.
+
+With a CRC enabled, every frame carries a trailer of ``*`` and the CRC of
+the bytes before it, in hexadecimal, ahead of the terminator. With CRC-8::
+
+    10,0|5*C8;
+
+Checksums are computed a byte at a time from a precomputed 256-entry table.
+"""
+
+
+def _table(width, poly):
+    top = 1 << (width - 1)
+    mask = (1 << width) - 1
+    table = []
+    for byte in range(256):
+        crc = byte << (width - 8)
+        for i in range(8):
+            crc = (crc << 1) ^ poly if crc & top else crc << 1
+        table.append(crc & mask)
+    return tuple(table)
+
+
+class CRC(object):
+    """
+    Table-driven, non-reflected CRC of 8 or 16 bits.
+    """
+
+    def __init__(self, width, poly, init=0):
+        """
+        :param width: CRC width in bits, a multiple of 8.
+        :param poly: Generator polynomial, without the top bit.
+        :param init: Initial register value.
+        """
+        self.width = width
+        self.poly = poly
+        self.init = init
+        self.table = _table(width, poly)
+        self._mask = (1 << width) - 1
+        self._shift = width - 8
+        self._format = '*%%0%dX' % (width // 4)
+        self._frames = None
+
+    def __call__(self, data):
+        """:rtype: CRC of `data` (`bytes`), as an int."""
+        table, mask, shift = self.table, self._mask, self._shift
+        crc = self.init
+        for byte in bytearray(data):
+            crc = ((crc << 8) & mask) ^ table[((crc >> shift) ^ byte) & 0xff]
+        return crc
+
+    def seal(self, frame):
+        """
+        :param frame: Frame, as `bytes`, ending in its terminator.
+
+        :rtype: `frame` with the CRC trailer inserted before the terminator.
+        """
+        body = frame[:-1]
+        return body + (self._format % self(body)).encode('ascii') + frame[-1:]
+
+    def check(self, body, trailer):
+        """
+        :param body: Frame bytes before the ``*``.
+        :param trailer: Hex digits after the ``*``.
+
+        :rtype: True if `trailer` is the CRC of `body`.
+        """
+        try:
+            return int(trailer, 16) == self(body)
+        except ValueError:
+            return False
+
+    def frames(self, frames):
+        """
+        :param frames: Dict of prebuilt frames, see
+        :data:`ARXControl.connection.FRAMES`.
+
+        :rtype: Dict with the same keys and sealed frames, built once.
+        """
+        if self._frames is None:
+            self._frames = dict((key, self.seal(frame))
+                                for key, frame in frames.items())
+        return self._frames
+
+
+#: CRC-8/SMBUS.
+CRC8 = CRC(8, 0x07)
+#: CRC-16/CCITT-FALSE.
+CRC16 = CRC(16, 0x1021, 0xffff)
+
+#: CRCs by width in bits.
+CRCS = {8: CRC8, 16: CRC16}
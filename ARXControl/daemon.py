@@ -0,0 +1,384 @@
+"""
+ARX daemon.
+
+``arxd`` owns the serial connection to one ACU and serves it to any number
+of local or remote clients, so that monitoring, scheduling and operator
+tools can share the tty::
+
+    arxd /dev/ttyUSB0 --socket /tmp/arxd.sock
+
+Clients use :class:`RemoteARX`, which has the same interface as
+:class:`ARXControl.arx.ARX`::
+
+    arx = RemoteARX('/tmp/arxd.sock')
+    arx.atten0 = 5
+
+The protocol is one JSON object per line. A request is
+``{"id": 1, "cmds": [[9, 0], [9, 1]]}``, a list of commands as taken by
+:meth:`ARX._send_many`. The reply is ``{"id": 1, "resps": [[15], [15]]}``,
+or ``{"id": 1, "error": "IOError", "message": "..."}`` if the commands
+failed. ``{"id": 2, "capabilities": true}`` asks for the optional opcodes
+the daemon's ACU supports, and is answered with
+``{"id": 2, "capabilities": [15]}``.
+
+Identical read requests that are in flight at the same time are coalesced
+into one ACU transaction. Every other request is run in arrival order.
+"""
+import json
+import os
+import socket
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from . import const
+from .arx import ARX
+from .err import CheckError, ConnError
+from .metrics import NULL_METRICS
+from .retry import RetryPolicy
+from .scheduler import READS
+
+
+class FairLock(object):
+    """Lock granted to waiting threads in the order they asked for it."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._queue = deque()
+
+    def acquire(self):
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            while self._queue[0] is not ticket:
+                self._cond.wait()
+
+    def release(self):
+        with self._cond:
+            self._queue.popleft()
+            self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, etype, value, tb):
+        self.release()
+
+
+class _Call(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class Dispatcher(object):
+    """
+    Runs command batches from many clients on one :class:`ARX`, one batch at
+    a time, in arrival order. Identical read-only batches in flight at the
+    same time share a single ACU transaction.
+    """
+
+    def __init__(self, arx):
+        self.arx = arx
+        self._lock = FairLock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def execute(self, cmds):
+        """
+        :param cmds: Sequence of command tuples, as taken by
+        :meth:`ARX._send_many`.
+
+        :rtype: List of ACU Response Messages.
+        """
+        cmds = tuple(tuple(cmd) for cmd in cmds)
+        if cmds and all(cmd[0] in READS for cmd in cmds):
+            return self._coalesced(cmds)
+        return self._run(cmds)
+
+    def _run(self, cmds):
+        with self._lock:
+            return self.arx._send_many(cmds)
+
+    def _coalesced(self, cmds):
+        # The lookup and the insert must be one step, or two identical
+        # reads arriving together would both become owners.
+        with self._inflight_lock:
+            call = self._inflight.get(cmds)
+            owner = call is None
+            if owner:
+                call = self._inflight[cmds] = _Call()
+        if owner:
+            result = error = None
+            try:
+                result = self._run(cmds)
+            except Exception as e:
+                error = e
+            with self._inflight_lock:
+                del self._inflight[cmds]
+                call.result = result
+                call.error = error
+                call.event.set()
+        return call.wait()
+
+    def capabilities(self):
+        """
+        :rtype: Sorted list of the optional opcodes the ACU supports, see
+        :attr:`ARXControl.connection.Connection.capabilities`.
+        """
+        with self._lock:
+            return sorted(self.arx.conn.capabilities or ())
+
+    def handle(self, line):
+        """
+        Executes one protocol request.
+
+        :param line: Request line, as `bytes`.
+
+        :rtype: Reply line, as `bytes`.
+        """
+        reply = {}
+        try:
+            request = json.loads(line.decode('utf-8'))
+            reply['id'] = request.get('id')
+            if request.get('capabilities'):
+                reply['capabilities'] = self.capabilities()
+            else:
+                reply['resps'] = self.execute(request['cmds'])
+        except Exception as e:
+            reply.pop('resps', None)
+            reply['error'] = type(e).__name__
+            reply['message'] = str(e)
+        return (json.dumps(reply) + '\n').encode('utf-8')
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                self.wfile.write(self.server.dispatcher.handle(line))
+                self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _remove_stale(path):
+    """Removes a Unix socket left behind by a daemon that is not running."""
+    if not os.path.exists(path):
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        os.unlink(path)
+    else:
+        raise IOError("arxd is already listening on %s" % path)
+    finally:
+        sock.close()
+
+
+class ARXDaemon(object):
+    """
+    Serves one :class:`ARX` over a Unix socket and, optionally, TCP. The ACU
+    connection is kept in a long-lived session, so READY is only checked
+    again after errors or idle periods.
+    """
+
+    def __init__(self, arx, path=None, address=None):
+        """
+        :param arx: :class:`ARX` to serve.
+        :param path: Path of the Unix socket to listen on.
+        :param address: Optional (host, port) to also listen on over TCP.
+        """
+        self.arx = arx
+        self.dispatcher = Dispatcher(arx)
+        self.path = path
+        self.servers = []
+        if path is not None:
+            _remove_stale(path)
+            self.servers.append(_UnixServer(path, _Handler))
+        if address is not None:
+            self.servers.append(_TCPServer(tuple(address), _Handler))
+        for server in self.servers:
+            server.dispatcher = self.dispatcher
+        self._session = None
+        self._threads = []
+
+    def start(self):
+        """Starts serving in background threads."""
+        self._session = self.arx.session()
+        self._session.__enter__()
+        for server in self.servers:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Stops serving and closes the sockets."""
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        for thread in self._threads:
+            thread.join()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+        if self._session is not None:
+            self._session.__exit__(None, None, None)
+            self._session = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, etype, value, tb):
+        self.stop()
+
+
+class RemoteConnection(object):
+    """
+    Client side of the ``arxd`` protocol. Stands in for
+    :class:`ARXControl.connection.Connection` in :class:`RemoteARX`.
+    """
+
+    def __init__(self, address, timeout=None):
+        """
+        :param address: Path of the daemon's Unix socket, or a (host, port)
+        tuple for TCP.
+        :param timeout: Optional socket timeout, in seconds.
+        """
+        self.tty = address
+        if isinstance(address, tuple):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(address)
+        self._sock = sock
+        self._file = sock.makefile('rwb')
+        self._lock = threading.Lock()
+        self._id = 0
+        self.metrics = NULL_METRICS
+        self.retry_policy = RetryPolicy()
+        self.ready = True
+        #: Optional opcodes supported by the daemon's ACU.
+        self.capabilities = frozenset(
+            self._request({'capabilities': True})['capabilities'])
+
+    def call(self, cmds):
+        """
+        Runs a batch of commands on the daemon.
+
+        :rtype: List of ACU Response Messages.
+        """
+        return self._request({'cmds': [list(cmd) for cmd in cmds]})['resps']
+
+    def forget_capabilities(self):
+        """Stops using the optional opcodes for this connection."""
+        self.capabilities = frozenset()
+
+    def _request(self, request):
+        with self._lock:
+            self._id += 1
+            request = dict(request, id=self._id)
+            self._file.write((json.dumps(request) + '\n').encode('utf-8'))
+            self._file.flush()
+            line = self._file.readline()
+        if not line:
+            raise ConnError("Connection to arxd closed")
+        reply = json.loads(line.decode('utf-8'))
+        if 'error' in reply:
+            if reply['error'] == 'ConnError':
+                raise ConnError(reply['message'])
+            if reply['error'] == 'CheckError':
+                raise CheckError(reply['message'])
+            raise IOError(reply['message'])
+        return reply
+
+    @contextmanager
+    def session(self):
+        """The daemon keeps its own session, so this does nothing."""
+        yield self
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+class RemoteARX(ARX):
+    """
+    :class:`ARX` that talks to an ``arxd`` daemon instead of a tty. Takes
+    the daemon's address in place of the tty, see :class:`RemoteConnection`.
+    """
+
+    def _connect(self, address, rate):
+        return RemoteConnection(address)
+
+    def _send_many(self, cmds):
+        try:
+            return self.conn.call([tuple(cmd) for cmd in cmds])
+        except (IOError, ConnError):
+            if self.cache is not None:
+                self.cache.invalidate()
+            raise
+
+
+def _rate(value):
+    return value if value == const.AUTO_BAUD else int(value)
+
+
+def main(argv=None):
+    import argparse
+    import signal
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(
+        description='Share one ARX Control Unit between many clients.')
+    parser.add_argument('tty', help='serial port of the ACU')
+    parser.add_argument('--rate', type=_rate, default=None,
+                        help='baud rate, or "%s" to negotiate it (default '
+                        '%d)' % (const.AUTO_BAUD, const.BAUDRATE))
+    parser.add_argument('--socket', default='/tmp/arxd.sock',
+                        help='Unix socket to listen on (default %(default)s)')
+    parser.add_argument('--tcp', metavar='HOST:PORT',
+                        help='also listen on TCP')
+    args = parser.parse_args(argv)
+
+    address = None
+    if args.tcp:
+        host, port = args.tcp.rsplit(':', 1)
+        address = (host, int(port))
+
+    daemon = ARXDaemon(ARX(args.tty, args.rate), args.socket, address)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with daemon:
+        try:
+            while True:
+                time.sleep(1)
+        except (KeyboardInterrupt, SystemExit):
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import re
+
+from . import const
+
+_FRAME = re.compile(br'(\d+)(?:' + re.escape(const.SEPARATOR.encode('ascii')) +
+                    br'([^;*]*))?(?:\*([0-9A-Fa-f]*))?;')
+_END = const.END_COMMAND.encode('ascii')
+
+
+def _args(payload):
+    if payload is None:
+        return None
+    args = payload.decode('ascii', 'replace').split(const.ARG_SEPARATOR)
+    for i in range(len(args)):
+        try:
+            args[i] = int(args[i])
+        except ValueError:
+            pass
+    return args
+
+
+def _record(match, crc):
+    if crc is not None:
+        trailer = match.group(3)
+        if trailer is None or not crc.check(
+                match.string[match.start():match.start(3) - 1], trailer):
+            return const.kCRC_ERR, None
+    return int(match.group(1)), _args(match.group(2))
+
+
+def parse(frame, crc=None):
+    """
+    Parses a single ACU Command or Response frame.
+
+    :param frame: The frame, as `str` or `bytes`, with or without its
+    terminator.
+    :param crc: Optional :class:`ARXControl.crc.CRC` the frame's trailer
+    must match. A CRC trailer is ignored otherwise.
+
+    :rtype: A tuple of (CMD Code | RESP Code, ARGS | RESP String | None).
+    The code is :attr:`const.kCRC_ERR` if the CRC does not match.
+    """
+    if not isinstance(frame, (bytes, bytearray)):
+        frame = frame.encode('ascii')
+    frame = frame.strip()
+    if not frame.endswith(_END):
+        frame += _END
+    match = _FRAME.match(frame)
+    if match is None or match.end() != len(frame):
+        raise ValueError("Not an ACU frame: %r" % bytes(frame))
+    return _record(match, crc)
+
+
+def unpack(self, inputstring):
+    """
+    Unpacks an ACU Command Structure into a tuple. Bound as the `_unpack`
+    method of :class:`ARXControl.arx.ARX` and
+    :class:`ARXControl.connection.Connection`.
+
+    :param inputstring: ACU Command String (or Response String).
+
+    :rtype: A tuple of (CMD Code | RESP Code, ARGS | RESP String | None).
+    """
+    return parse(inputstring)
+
+
+class Decoder(object):
+    """
+    Incremental decoder for a stream of ACU frames.
+
+    Arbitrary chunks of bytes are fed in with :meth:`feed`, and fully parsed
+    `(code, args)` records come out of :meth:`next_record` or
+    :meth:`records`, in the same form as :func:`parse`. Split and merged
+    frames are handled, and bytes that cannot start a frame are skipped so
+    the decoder resynchronizes on the next valid frame.
+
+    With :attr:`crc` set, each frame's trailer is checked, and a frame that
+    fails is returned as ``(const.kCRC_ERR, None)``.
+    """
+
+    def __init__(self, crc=None):
+        """
+        :param crc: Optional :class:`ARXControl.crc.CRC` to check frames
+        with.
+        """
+        self.crc = crc
+        self._buf = bytearray()
+        self._pos = 0
+        #: Number of junk bytes skipped while resynchronizing.
+        self.discarded = 0
+
+    def clear(self):
+        """Discards any buffered bytes."""
+        del self._buf[:]
+        self._pos = 0
+
+    def feed(self, data):
+        """
+        Appends received bytes to the buffer.
+
+        :param data: `bytes`, `bytearray` or `memoryview`.
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = data.encode('ascii')
+        self._buf.extend(data)
+
+    def __len__(self):
+        """Number of bytes buffered but not yet decoded."""
+        return len(self._buf) - self._pos
+
+    def next_record(self):
+        """
+        Decodes the next complete frame in the buffer.
+
+        :rtype: A `(code, args)` tuple, or None if no complete frame is
+        buffered.
+        """
+        buf, pos = self._buf, self._pos
+        match = _FRAME.search(buf, pos)
+        if match is None:
+            end = buf.rfind(_END, pos)
+            if end >= 0:
+                # Everything up to the last terminator is junk.
+                self.discarded += end + 1 - pos
+                pos = end + 1
+            elif len(buf) - pos > const.BUFFER_SIZE:
+                self.discarded += len(buf) - pos
+                pos = len(buf)
+            self._compact(pos)
+            return None
+
+        self.discarded += match.start() - pos
+        record = _record(match, self.crc)
+        self._compact(match.end())
+        return record
+
+    def records(self):
+        """Yields every complete record in the buffer."""
+        record = self.next_record()
+        while record is not None:
+            yield record
+            record = self.next_record()
+
+    def decode(self, data):
+        """
+        Feeds `data` and decodes what is buffered.
+
+        :rtype: List of `(code, args)` records.
+        """
+        self.feed(data)
+        return list(self.records())
+
+    def _compact(self, pos):
+        if pos >= len(self._buf):
+            del self._buf[:]
+            pos = 0
+        elif pos > const.BUFFER_SIZE:
+            del self._buf[:pos]
+            pos = 0
+        self._pos = pos
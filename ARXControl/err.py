@@ -3,9 +3,11 @@ class Error(Exception):
     """Base class for exceptions in this module."""
     pass
 
-class CheckError(Error):
+class CheckError(Error, IOError):
     """
-    Exception raised when reading from ARX Control Module Fails.
+    Exception raised when reading from ARX Control Module Fails, e.g. when a
+    frame keeps failing its CRC check. It is an `IOError`, like other failed
+    commands.
     """
     def __init__(self,msg=''):
         """
@@ -43,3 +45,16 @@ class WriteError(Error):
         return "'%s'"%self.msg
 
 
+
+class QueueFull(Error):
+    """
+    Exception raised when the command queue has no room left.
+    """
+    def __init__(self,msg=''):
+        """
+        :param msg: Error message.
+        """
+        self.msg = msg
+
+    def __str__(self):
+        return "'%s'"%self.msg
@@ -0,0 +1,156 @@
+import copy
+import threading
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .arx import ARX
+
+
+def _apply(arx, states):
+    return arx.apply(states[arx.conn.tty])
+
+
+class Result(namedtuple('Result', ['value', 'error'])):
+    """
+    Outcome of an :class:`ARXFleet` operation on a single unit. Exactly one
+    of :attr:`value` and :attr:`error` is meaningful: :attr:`error` holds the
+    exception raised for the unit, or None on success.
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class ARXFleet(object):
+    """
+    Runs ARX operations across several ACUs concurrently, each on its own
+    tty, using a bounded pool of worker threads. Each unit is only used by
+    one worker at a time.
+
+    Every operation returns an ordered dict of unit name to :class:`Result`.
+    A failing unit never fails the whole batch::
+
+        with ARXFleet(['/dev/ttyUSB0', '/dev/ttyUSB1']) as fleet:
+            results = fleet.set('power', 1)
+            failed = [name for name, res in results.items() if not res.ok]
+    """
+
+    def __init__(self, units, max_workers=None, **kwargs):
+        """
+        :param units: Iterable of ttys, (tty, rate) pairs, or already
+        connected :class:`ARX` instances. Units given by tty are connected on
+        first use, so one missing board does not stop the others.
+        :param max_workers: Size of the worker pool. Defaults to one worker
+        per unit.
+        :param kwargs: Extra keyword arguments for :class:`ARX`. Each unit
+        gets its own copy of `metrics` and `retry_policy`, as neither may be
+        shared between connections. The copied metrics start empty, are
+        labelled with the unit's tty and are found on
+        ``fleet.units[name].metrics``.
+        """
+        self.kwargs = kwargs
+        self.units = OrderedDict()
+        self._specs = {}
+        self._locks = {}
+        for unit in units:
+            if isinstance(unit, ARX):
+                self.units[unit.conn.tty] = unit
+                continue
+            if isinstance(unit, tuple):
+                tty, rate = unit
+            else:
+                tty, rate = unit, None
+            self.units[tty] = None
+            self._specs[tty] = rate
+            self._locks[tty] = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers or max(1, len(self.units)))
+
+    def _connect(self, tty, rate):
+        """Connection hook. Useful for testing."""
+        return ARX(tty, rate, **self._kwargs(tty))
+
+    def _kwargs(self, tty):
+        kwargs = dict(self.kwargs)
+        for key in ('metrics', 'retry_policy'):
+            if kwargs.get(key) is not None:
+                kwargs[key] = copy.deepcopy(kwargs[key])
+        metrics = kwargs.get('metrics')
+        if getattr(metrics, 'enabled', False):
+            metrics.labels.setdefault('tty', tty)
+            metrics.reset()
+        return kwargs
+
+    def _unit(self, name):
+        arx = self.units[name]
+        if arx is None:
+            # Concurrent operations must not open the same tty twice.
+            with self._locks[name]:
+                arx = self.units[name]
+                if arx is None:
+                    arx = self._connect(name, self._specs[name])
+                    self.units[name] = arx
+        return arx
+
+    def _run(self, name, func, args):
+        try:
+            return Result(func(self._unit(name), *args), None)
+        except Exception as e:
+            return Result(None, e)
+
+    def map(self, func, *args, **kwargs):
+        """
+        Calls ``func(arx, *args)`` for every unit concurrently.
+
+        :param names: Optional keyword argument, the unit names to run on.
+        Defaults to every unit.
+
+        :rtype: OrderedDict of unit name to :class:`Result`.
+        """
+        names = kwargs.pop('names', None)
+        if names is None:
+            names = list(self.units)
+        if kwargs:
+            raise TypeError("Unexpected keyword arguments %s" % list(kwargs))
+        futures = [(name, self._pool.submit(self._run, name, func, args))
+                   for name in names]
+        return OrderedDict((name, future.result()) for name, future in futures)
+
+    def get(self, attr):
+        """Reads property `attr` (e.g. ``'atten0'``) from every unit."""
+        return self.map(getattr, attr)
+
+    def set(self, attr, value):
+        """
+        Assigns `value` to property `attr` on every unit. The value of each
+        successful :class:`Result` is None.
+        """
+        return self.map(setattr, attr, value)
+
+    def read_all(self):
+        """Takes a :class:`ARXControl.state.State` snapshot of every unit."""
+        return self.map(ARX.read_all)
+
+    def apply(self, states):
+        """
+        Applies snapshots to their units.
+
+        :param states: Dict of unit name to
+        :class:`ARXControl.state.State`.
+        """
+        return self.map(_apply, states, names=list(states))
+
+    def write_flash(self):
+        """Commits the state of every unit to its EEPROM."""
+        return self.map(ARX.write_flash)
+
+    def close(self):
+        """Shuts down the worker pool."""
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, tb):
+        self.close()
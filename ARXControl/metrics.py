@@ -0,0 +1,225 @@
+import bisect
+
+from . import const
+
+#: Command names, keyed by opcode.
+OPCODES = dict((getattr(const, name), name) for name in
+               ['ACU_READY', 'FEE_READ', 'FEE_WRITE', 'FILTER_READ',
+                'FILTER_WRITE', 'ATTEN_READ', 'ATTEN_WRITE', 'EEPROM_READ',
+                'EEPROM_WRITE', 'FLASH_WRITE', 'ROACH_WRITE', 'STATE_READ'])
+
+
+class NullMetrics(object):
+    """
+    Metrics sink that discards everything. Used when instrumentation is
+    disabled, so every hook is a bare method call.
+    """
+    enabled = False
+
+    def latency(self, opcode, seconds):
+        """Records the time a command took to be answered."""
+        pass
+
+    def retry(self, opcode):
+        """Records a command being sent again."""
+        pass
+
+    def nack(self, opcode):
+        """Records a negative response (``kERR``/``kCOMM_ERR``)."""
+        pass
+
+    def timeout(self, opcode):
+        """Records a command that was not answered in time."""
+        pass
+
+    def handshake(self, seconds):
+        """Records the time a READY handshake took."""
+        pass
+
+    def sent(self, nbytes):
+        """Records bytes written to the serial port."""
+        pass
+
+    def received(self, nbytes):
+        """Records bytes read from the serial port."""
+        pass
+
+    def queued(self, priority, seconds):
+        """Records the time a command waited in the scheduler queue."""
+        pass
+
+    def as_dict(self):
+        return {}
+
+    def to_prometheus(self):
+        return ''
+
+
+#: Shared instance of :class:`NullMetrics`.
+NULL_METRICS = NullMetrics()
+
+
+class Histogram(object):
+    """Fixed-bucket latency histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def as_dict(self):
+        cumulative, total = [], 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return {'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'],
+                                    cumulative)),
+                'sum': self.sum, 'count': self.count}
+
+
+class Metrics(NullMetrics):
+    """
+    Per-command latency and error metrics for one ACU link, recorded by
+    :class:`ARXControl.arx.ARX` and
+    :class:`ARXControl.connection.Connection`::
+
+        arx = ARX('/dev/ttyUSB0', metrics=Metrics({'tty': '/dev/ttyUSB0'}))
+        ...
+        print(arx.metrics.to_prometheus())
+
+    Recording is not locked, so one instance should only be fed by one
+    thread at a time.
+    """
+    enabled = True
+
+    #: Upper bounds of the latency histogram buckets, in seconds.
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.,
+               2.5)
+
+    def __init__(self, labels=None, buckets=None):
+        """
+        :param labels: Optional dict of labels added to every Prometheus
+        sample, e.g. ``{'tty': '/dev/ttyUSB0'}``.
+        :param buckets: Optional histogram bucket bounds, in seconds.
+        """
+        self.labels = labels or {}
+        self.buckets = tuple(buckets or self.BUCKETS)
+        self.reset()
+
+    def reset(self):
+        """Clears every metric."""
+        self.latencies = {}
+        self.retries = {}
+        self.nacks = {}
+        self.timeouts = {}
+        self.handshakes = Histogram(self.buckets)
+        self.queue_waits = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def latency(self, opcode, seconds):
+        try:
+            hist = self.latencies[opcode]
+        except KeyError:
+            hist = self.latencies[opcode] = Histogram(self.buckets)
+        hist.observe(seconds)
+
+    def retry(self, opcode):
+        self.retries[opcode] = self.retries.get(opcode, 0) + 1
+
+    def nack(self, opcode):
+        self.nacks[opcode] = self.nacks.get(opcode, 0) + 1
+
+    def timeout(self, opcode):
+        self.timeouts[opcode] = self.timeouts.get(opcode, 0) + 1
+
+    def handshake(self, seconds):
+        self.handshakes.observe(seconds)
+
+    def queued(self, priority, seconds):
+        try:
+            hist = self.queue_waits[priority]
+        except KeyError:
+            hist = self.queue_waits[priority] = Histogram(self.buckets)
+        hist.observe(seconds)
+
+    def sent(self, nbytes):
+        self.bytes_sent += nbytes
+
+    def received(self, nbytes):
+        self.bytes_received += nbytes
+
+    def as_dict(self):
+        """
+        :rtype: Dict of every metric. Per-command metrics are keyed by
+        command name.
+        """
+        def named(counts):
+            return dict((OPCODES.get(op, str(op)), value)
+                        for op, value in counts.items())
+        return {'latency': named(dict((op, hist.as_dict()) for op, hist in
+                                      self.latencies.items())),
+                'retries': named(self.retries),
+                'nacks': named(self.nacks),
+                'timeouts': named(self.timeouts),
+                'handshake': self.handshakes.as_dict(),
+                'queue_wait': dict((priority, hist.as_dict()) for
+                                   priority, hist in self.queue_waits.items()),
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received}
+
+    def _labels(self, extra=None):
+        labels = dict(self.labels)
+        labels.update(extra or {})
+        if not labels:
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (key, labels[key])
+                                 for key in sorted(labels))
+
+    def _histogram(self, lines, name, hist, extra=None):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), hist.counts):
+            cumulative += count
+            labels = dict(extra or {}, le=str(bound))
+            lines.append('%s_bucket%s %d' % (name, self._labels(labels),
+                                             cumulative))
+        lines.append('%s_sum%s %r' % (name, self._labels(extra), hist.sum))
+        lines.append('%s_count%s %d' % (name, self._labels(extra),
+                                        hist.count))
+
+    def to_prometheus(self):
+        """
+        :rtype: Every metric in the Prometheus text exposition format.
+        """
+        lines = ['# TYPE arx_command_latency_seconds histogram']
+        for op in sorted(self.latencies):
+            self._histogram(lines, 'arx_command_latency_seconds',
+                            self.latencies[op],
+                            {'command': OPCODES.get(op, str(op))})
+        for name, counts in [('retries', self.retries),
+                             ('nacks', self.nacks),
+                             ('timeouts', self.timeouts)]:
+            lines.append('# TYPE arx_command_%s_total counter' % name)
+            for op in sorted(counts):
+                labels = {'command': OPCODES.get(op, str(op))}
+                lines.append('arx_command_%s_total%s %d' % (
+                    name, self._labels(labels), counts[op]))
+        lines.append('# TYPE arx_handshake_seconds histogram')
+        self._histogram(lines, 'arx_handshake_seconds', self.handshakes)
+        lines.append('# TYPE arx_queue_wait_seconds histogram')
+        for priority in sorted(self.queue_waits):
+            self._histogram(lines, 'arx_queue_wait_seconds',
+                            self.queue_waits[priority],
+                            {'priority': priority})
+        for name, value in [('sent', self.bytes_sent),
+                            ('received', self.bytes_received)]:
+            lines.append('# TYPE arx_bytes_%s_total counter' % name)
+            lines.append('arx_bytes_%s_total%s %d' % (name, self._labels(),
+                                                      value))
+        return '\n'.join(lines) + '\n'
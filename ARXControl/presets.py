@@ -0,0 +1,161 @@
+"""
+Named presets stored in ACU EEPROM slots.
+
+The ACU stores its FEE, attenuator and filter settings with FLASH_WRITE in
+the EEPROM slot selected by :attr:`ARXControl.arx.ARX.eeprom_offset`, and
+loads them again when the offset moves back to that slot. A
+:class:`PresetManager` writes each named configuration into its own slot
+once, and keeps a local index of which slot holds which preset, so that
+switching configuration is a single EEPROM_WRITE::
+
+    arx.presets.store('night', arx.read_all()._replace(atten0=5, filter=2))
+    ...
+    arx.presets.recall('night')
+"""
+import os
+
+from . import const
+from .connection import _load_json, _save_json
+from .state import State
+
+#: EEPROM offsets usable as preset slots.
+SLOTS = tuple(range(1, const.EEPROM_SLOTS))
+
+
+class PresetManager(object):
+    """
+    Stores and recalls named presets on one ACU. The index of presets is
+    kept in :attr:`index_path`, shared by every device and keyed by tty.
+    """
+
+    #: Default file the preset index is kept in.
+    INDEX = os.path.join(os.path.expanduser('~'), '.arxcontrol',
+                         'presets.json')
+
+    def __init__(self, arx, index_path=None):
+        """
+        :param arx: :class:`ARXControl.arx.ARX` to manage.
+        :param index_path: Optional index file, :attr:`INDEX` by default.
+        """
+        self.arx = arx
+        self.index_path = index_path or self.INDEX
+        self.device = os.path.realpath(str(arx.conn.tty))
+
+    def _load(self):
+        return _load_json(self.index_path)
+
+    @property
+    def index(self):
+        """
+        Dict of preset name to ``{'slot': offset, 'state': packed}``, where
+        `packed` is the stored settings as packed by :meth:`State.pack`.
+        """
+        return self._load().get(self.device, {})
+
+    def _save(self, presets):
+        data = self._load()
+        if presets:
+            data[self.device] = presets
+        else:
+            data.pop(self.device, None)
+        _save_json(self.index_path, data)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        """:rtype: Sorted list of preset names."""
+        return sorted(self.index)
+
+    def get(self, name):
+        """
+        :rtype: :class:`State` stored under `name`, with its slot as the
+        EEPROM offset and no timestamp.
+        """
+        try:
+            entry = self.index[name]
+        except KeyError:
+            raise KeyError("No preset named `%s`" % name)
+        return State.unpack(entry['state'], None)._replace(
+            eeprom_offset=entry['slot'])
+
+    def free_slots(self):
+        """:rtype: List of the slots not holding a preset."""
+        used = set(entry['slot'] for entry in self.index.values())
+        return [slot for slot in SLOTS if slot not in used]
+
+    def store(self, name, state=None, slot=None):
+        """
+        Writes a preset into an EEPROM slot. This moves the ACU to the
+        preset, and leaves it there.
+
+        :param name: Preset name. An existing preset of that name is
+        overwritten in its slot.
+        :param state: :class:`State` to store. Its EEPROM offset is ignored.
+        The current settings by default.
+        :param slot: Optional slot to use. Defaults to the preset's current
+        slot, or the first free one.
+
+        :rtype: The slot used.
+        """
+        presets = self.index
+        if slot is None:
+            if name in presets:
+                slot = presets[name]['slot']
+            else:
+                free = self.free_slots()
+                if not free:
+                    raise ValueError("Every EEPROM slot holds a preset")
+                slot = free[0]
+        if slot not in SLOTS:
+            raise ValueError("EEPROM slot must be in %d-%d" %
+                             (SLOTS[0], SLOTS[-1]))
+        for other, entry in list(presets.items()):
+            if entry['slot'] == slot and other != name:
+                del presets[other]
+
+        arx = self.arx
+        with arx.session():
+            if state is None:
+                state = arx.read_all()
+            # Moving the offset may load the slot's old settings, so the
+            # new ones are only compared once it has moved.
+            arx.eeprom_offset = slot
+            arx.invalidate()
+            state = state._replace(eeprom_offset=slot)
+            arx.apply(state)
+            arx.write_flash()
+        presets[name] = {'slot': slot, 'state': state.pack()}
+        self._save(presets)
+        return slot
+
+    def recall(self, name, verify=False):
+        """
+        Switches the ACU to a preset by moving the EEPROM offset to its
+        slot, in one round trip.
+
+        :param verify: Read the settings back and raise IOError if they do
+        not match the preset.
+
+        :rtype: The recalled :class:`State`.
+        """
+        state = self.get(name)
+        arx = self.arx
+        arx.eeprom_offset = state.eeprom_offset
+        if verify:
+            current = arx.read_all()
+            if state.diff(current):
+                raise IOError("Preset `%s` did not load, %s differ" %
+                              (name, ', '.join(state.diff(current))))
+            return current
+        arx._acked('power', state.fee)
+        for field in ('atten0', 'atten1', 'filter'):
+            arx._acked(field, getattr(state, field))
+        return state
+
+    def delete(self, name):
+        """Forgets a preset. Its slot is left as it is on the ACU."""
+        presets = self.index
+        if presets.pop(name, None) is None:
+            raise KeyError("No preset named `%s`" % name)
+        self._save(presets)
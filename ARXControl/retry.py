@@ -0,0 +1,260 @@
+import random
+import time
+
+from . import const
+from .err import CheckError
+
+
+class RetryPolicy(object):
+    """
+    Retry and timeout policy for :class:`ARXControl.connection.Connection`
+    and :class:`ARXControl.arx.ARX`.
+
+    Negative responses (``kERR``/``kCOMM_ERR``) and silence are counted
+    against separate budgets. This base policy retries immediately and waits
+    a fixed :attr:`timeout` for each response, which matches the historical
+    behaviour with the default arguments.
+    """
+
+    def __init__(self, nack_retries=const.MAX_RETRIES,
+                 timeout_retries=const.MAX_RETRIES, timeout=const.TIMEOUT):
+        """
+        :param nack_retries: Attempts allowed to end in a negative response.
+        :param timeout_retries: Attempts allowed to end in silence.
+        :param timeout: Seconds to wait for each response.
+        """
+        self.nack_retries = nack_retries
+        self.timeout_retries = timeout_retries
+        self.timeout = timeout
+
+    def get_timeout(self):
+        """Seconds to wait for the next response."""
+        return self.timeout
+
+    def should_retry(self, nacks, timeouts):
+        """
+        :param nacks: Attempts so far that ended in a negative response.
+        :param timeouts: Attempts so far that ended in silence.
+
+        :rtype: True if another attempt is allowed.
+        """
+        return nacks < self.nack_retries and timeouts < self.timeout_retries
+
+    def delay(self, attempt):
+        """Seconds to wait before retry number `attempt` (from 1)."""
+        return 0
+
+    def record_rtt(self, rtt):
+        """
+        Records the seconds from writing a burst to its first response. Only
+        bursts sent for the first time are sampled, since a response to a
+        retransmission may answer the earlier attempt (Karn's rule).
+        """
+        pass
+
+    def record_timeout(self):
+        """Records a response that did not arrive in time."""
+        pass
+
+
+class AdaptiveRetryPolicy(RetryPolicy):
+    """
+    Retry policy with exponential backoff and jitter, and a response timeout
+    that adapts to the observed round-trip times.
+
+    The timeout follows the smoothed round-trip time plus four times its
+    mean deviation (as in TCP), bounded by :attr:`min_timeout` and
+    :attr:`max_timeout`. Each timeout doubles it, and the doubled timeout is
+    kept until a burst sent for the first time is answered (Karn's rule). A
+    healthy link therefore fails fast, while a slow or noisy one keeps
+    enough slack to recover.
+    """
+
+    #: Gains for the smoothed round-trip time and its deviation.
+    ALPHA = 0.125
+    BETA = 0.25
+
+    def __init__(self, nack_retries=const.MAX_RETRIES,
+                 timeout_retries=const.MAX_RETRIES, timeout=const.TIMEOUT,
+                 min_timeout=0.05, max_timeout=2 * const.TIMEOUT,
+                 backoff=0.01, max_backoff=0.5):
+        """
+        :param timeout: Initial response timeout, used until a round-trip
+        time has been observed.
+        :param min_timeout: Lower bound of the adaptive timeout.
+        :param max_timeout: Upper bound of the adaptive timeout.
+        :param backoff: Base delay before the first retry, doubled for each
+        following retry.
+        :param max_backoff: Upper bound of the retry delay.
+        """
+        RetryPolicy.__init__(self, nack_retries, timeout_retries, timeout)
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.srtt = None
+        self.rttvar = None
+
+    def get_timeout(self):
+        return min(self.max_timeout, max(self.min_timeout, self.timeout))
+
+    def delay(self, attempt):
+        # Full jitter keeps several units from retrying in lockstep.
+        cap = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, cap)
+
+    def record_rtt(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2.
+        else:
+            self.rttvar += self.BETA * (abs(self.srtt - rtt) - self.rttvar)
+            self.srtt += self.ALPHA * (rtt - self.srtt)
+        self.timeout = self.srtt + 4 * self.rttvar
+
+    def record_timeout(self):
+        self.timeout = min(self.max_timeout, 2 * self.get_timeout())
+
+
+class Burst(object):
+    """
+    Retry state of one pipelined burst of commands, shared by
+    :meth:`ARXControl.arx.ARX._send_many` and
+    :meth:`ARXControl.aio.AsyncConnection.send_many`, which do the I/O::
+
+        burst = Burst(cmds, conn.retry_policy, conn.metrics)
+        while burst.pending:
+            if burst.retrying:
+                time.sleep(burst.delay())
+                if burst.resync:
+                    conn._handshake()
+            conn.write(b''.join([conn._make_cmd(*cmd)
+                                 for cmd in burst.begin()]))
+            while burst.feed(conn.read_response()):
+                pass
+            burst.end()
+            if not burst.should_retry():
+                break
+
+    Each round sends the commands still :attr:`pending`, and matches the
+    responses to them in order. ACU responses do not say which command they
+    answer, so once one is lost the rest of the round cannot be trusted:
+    the whole round is sent again, after a READY handshake to resynchronize
+    (see :attr:`resync`). Otherwise only the commands that were not
+    acknowledged are sent again.
+    """
+
+    def __init__(self, cmds, policy, metrics):
+        """
+        :param cmds: Sequence of argument tuples, as taken by
+        :meth:`ARXControl.connection.Connection._make_cmd`.
+        :param policy: :class:`RetryPolicy` of the connection.
+        :param metrics: :class:`ARXControl.metrics.Metrics` of the
+        connection.
+        """
+        self.cmds = cmds
+        self.policy = policy
+        self.metrics = metrics
+        #: Responses, in the same order as `cmds`.
+        self.out = [None] * len(cmds)
+        #: Indices of the commands still to be executed.
+        self.pending = list(range(len(cmds)))
+        #: Rounds that ended in a negative response, or in silence.
+        self.nacks = self.timeouts = 0
+        #: True if the last round timed out, so the next one must be
+        #: preceded by a READY handshake.
+        self.resync = False
+        self._rsp = [''] * len(cmds)
+        self._corrupt = [False] * len(cmds)
+        self._round = []
+        self._failed = []
+        self._next = 0
+        self._start = None
+
+    @property
+    def retrying(self):
+        """True once a round has failed."""
+        return bool(self.nacks or self.timeouts)
+
+    def delay(self):
+        """Seconds to wait before the next round."""
+        return self.policy.delay(self.nacks + self.timeouts)
+
+    def begin(self):
+        """
+        Starts a round.
+
+        :rtype: List of the commands to send, in order.
+        """
+        if self.retrying:
+            for i in self.pending:
+                self.metrics.retry(self.cmds[i][0])
+        self._round = list(self.pending)
+        self._failed = []
+        self._next = 0
+        self.resync = False
+        self._start = time.time()
+        return [self.cmds[i] for i in self._round]
+
+    def feed(self, record):
+        """
+        Matches the next response of the round to its command.
+
+        :param record: A `(code, args)` tuple, or None on timeout.
+
+        :rtype: True if more responses are expected in this round.
+        """
+        i = self._round[self._next]
+        self._next += 1
+        cmd = self.cmds[i][0]
+        if record is None:
+            self.metrics.timeout(cmd)
+            for j in self._round:
+                self.out[j] = None
+            self._failed = list(self._round)
+            self.resync = True
+            return False
+        rtt = time.time() - self._start
+        self.metrics.latency(cmd, rtt)
+        if self._next == 1 and not self.retrying:
+            self.policy.record_rtt(rtt)
+        code, resp = record
+        if code != const.kACK:
+            self._failed.append(i)
+            self._rsp[i] = resp
+            self._corrupt[i] = code == const.kCRC_ERR
+            self.metrics.nack(cmd)
+        else:
+            self.out[i] = resp
+        return self._next < len(self._round)
+
+    def end(self):
+        """Ends the round."""
+        if self.resync:
+            self.timeouts += 1
+        elif self._failed:
+            self.nacks += 1
+        self.pending = self._failed
+
+    def should_retry(self):
+        """:rtype: True if the pending commands may be sent again."""
+        return bool(self.pending) and self.policy.should_retry(self.nacks,
+                                                               self.timeouts)
+
+    def error(self, make_cmd):
+        """
+        :param make_cmd: Function building the frame of a command, for the
+        message.
+
+        :rtype: The exception to raise for the first pending command, or
+        None if none is pending.
+        """
+        if not self.pending:
+            return None
+        i = self.pending[0]
+        cmd_str = make_cmd(*self.cmds[i]).decode('ascii')
+        if self._corrupt[i]:
+            return CheckError("Response to `%s` failed its CRC check" %
+                              cmd_str)
+        return IOError("Could not execute `%s`. Recieved response `%s`"%(
+                       cmd_str, self._rsp[i]))
@@ -0,0 +1,139 @@
+"""
+Prioritized command scheduler.
+
+A :class:`CommandScheduler` owns all I/O for one ACU link. Callers on any
+thread submit work, and a single worker thread runs it one item at a time,
+lowest priority value first and in submission order within a priority. A
+command written by an operator therefore goes out ahead of telemetry polls
+that were queued before it.
+"""
+import itertools
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from concurrent.futures import Future
+
+from . import const
+from .err import QueueFull
+from .metrics import NULL_METRICS
+
+#: Priority of commands that change the ACU state.
+WRITE = 0
+#: Priority of interactive reads.
+READ = 1
+#: Priority of background polling.
+TELEMETRY = 2
+
+#: Priority names, keyed by value.
+PRIORITIES = {WRITE: 'write', READ: 'read', TELEMETRY: 'telemetry'}
+
+#: Commands that only read state.
+READS = frozenset([const.FEE_READ, const.FILTER_READ, const.ATTEN_READ,
+                   const.EEPROM_READ, const.STATE_READ])
+
+
+def priority_of(cmds):
+    """
+    :param cmds: Sequence of command tuples.
+
+    :rtype: :data:`READ` if every command only reads state, else
+    :data:`WRITE`.
+    """
+    if all(cmd[0] in READS for cmd in cmds):
+        return READ
+    return WRITE
+
+
+class CommandScheduler(object):
+    """
+    Bounded priority queue drained by a single I/O worker thread::
+
+        scheduler = CommandScheduler(maxsize=32)
+        resps = scheduler.call(arx._transact, cmds, priority=TELEMETRY)
+
+    The time each item spends queued is recorded in :attr:`metrics` and in
+    :attr:`max_wait`.
+    """
+
+    def __init__(self, maxsize=64, metrics=None):
+        """
+        :param maxsize: Maximum number of queued items. :meth:`submit` blocks
+        while the queue is full.
+        :param metrics: Optional :class:`ARXControl.metrics.Metrics` to record
+        queueing latency in. Only the worker thread records into it.
+        """
+        self.maxsize = maxsize
+        self.metrics = metrics or NULL_METRICS
+        #: Longest time an item has spent queued, in seconds.
+        self.max_wait = 0.
+        self._queue = queue.PriorityQueue(maxsize)
+        self._seq = itertools.count()
+        self._thread = threading.Thread(target=self._run, name='arx-io')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def depth(self):
+        """Number of items waiting to run."""
+        return self._queue.qsize()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues ``fn(*args)`` to run on the worker thread.
+
+        :param priority: Keyword-only. One of :data:`WRITE`, :data:`READ`
+        (default) or :data:`TELEMETRY`.
+        :param timeout: Keyword-only. Seconds to wait for room in the queue.
+        Waits for as long as needed by default.
+
+        :rtype: :class:`concurrent.futures.Future` of the result.
+        """
+        priority = kwargs.pop('priority', READ)
+        timeout = kwargs.pop('timeout', None)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments %s' % list(kwargs))
+        future = Future()
+        item = (priority, next(self._seq), time.time(), fn, args, future)
+        try:
+            self._queue.put(item, timeout=timeout)
+        except queue.Full:
+            raise QueueFull("Command queue is full (%d items)" % self.maxsize)
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Runs ``fn(*args)`` on the worker thread and waits for the result.
+        Takes the same keyword arguments as :meth:`submit`. When called from
+        the worker thread itself, `fn` runs right away.
+        """
+        if threading.current_thread() is self._thread:
+            return fn(*args)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def close(self):
+        """Runs every queued item, then stops the worker thread."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put((float('inf'), next(self._seq), 0, None, (), None))
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            priority, seq, queued, fn, args, future = self._queue.get()
+            if fn is None:
+                break
+            wait = time.time() - queued
+            self.max_wait = max(self.max_wait, wait)
+            self.metrics.queued(PRIORITIES.get(priority, str(priority)), wait)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
@@ -0,0 +1,329 @@
+"""
+ARX Control Unit simulator.
+
+:class:`ACUFirmware` emulates the ACU firmware's command handling.
+:class:`VirtualACU` serves it over a pseudo-terminal, byte by byte, so the
+unmodified serial path can be exercised without hardware::
+
+    with VirtualACU(faults=Faults(garbage=0.1)) as acu:
+        arx = ARX(acu.port)
+        arx.power = 1
+
+It can also be run standalone, printing the port to connect to::
+
+    python -m ARXControl.sim
+"""
+import copy
+import os
+import random
+import select
+import threading
+import time
+
+from . import const
+from .crc import CRCS
+from .decoder import Decoder
+
+
+class ACUFirmware(object):
+    """
+    Emulates the ARX Control Unit firmware. Each command is answered with a
+    response frame, built from :attr:`state`.
+
+    FLASH_WRITE stores the FEE, attenuator and filter settings in the EEPROM
+    slot selected by the offset, and moving the offset to a stored slot
+    loads its settings, as the firmware does at power-on.
+
+    With :attr:`crc` set, responses are sealed with a CRC trailer. Commands
+    that fail their CRC check reach :meth:`handle` as
+    :attr:`const.kCRC_ERR`, and are answered with a communication error.
+
+    STATE_READ answers with every FEE channel, both attenuators, the filter
+    and the EEPROM offset, separated by :attr:`const.ARG_SEPARATOR`. With
+    :attr:`state_read` off it is answered like an unknown command, as by
+    older firmware.
+    """
+
+    DEFAULT_STATE = {'FEE':[0,0,0,0],
+                     'ATTEN':[15,15],
+                     'FILTER':0,
+                     'EEPROM':1}
+
+    def __init__(self, state_read=True):
+        """
+        :param state_read: Support the STATE_READ command.
+        """
+        self.responses = {const.ACU_READY: self._ready,
+                          const.FEE_READ: self._fee_read,
+                          const.FEE_WRITE: self._fee_write,
+                          const.FILTER_READ: self._filter_read,
+                          const.FILTER_WRITE: self._filter_write,
+                          const.ATTEN_READ: self._atten_read,
+                          const.ATTEN_WRITE: self._atten_write,
+                          const.EEPROM_READ: self._eeprom_read,
+                          const.EEPROM_WRITE: self._eeprom_write,
+                          const.FLASH_WRITE: self._flash_write,
+                          const.ROACH_WRITE: self._roach_write,
+                          const.STATE_READ: self._state_read,
+                          }
+        self.state = copy.deepcopy(self.DEFAULT_STATE)
+        #: Stored settings, keyed by EEPROM offset.
+        self.eeprom = {}
+        #: Number of READY handshakes answered.
+        self.ready_count = 0
+        #: :class:`ARXControl.crc.CRC` for response frames, or None.
+        self.crc = None
+        #: True if STATE_READ is supported.
+        self.state_read = state_read
+
+    def handle(self, command, args):
+        """
+        Executes one command.
+
+        :param command: Command code.
+        :param args: List of arguments, or None.
+
+        :rtype: Response frame string.
+        """
+        try:
+            handler = self.responses[command]
+        except KeyError:
+            return self._build_resp(const.kCOMM_ERR, const.DATA_PARSE_FAIL)
+        return handler(args)
+
+    def _build_resp(self,code=1,resp_str=None):
+        out = str(code)
+        if resp_str is not None and resp_str != '':
+            out += const.SEPARATOR + str(resp_str)
+        out += const.END_COMMAND
+        if self.crc is not None:
+            out = self.crc.seal(out.encode('ascii')).decode('ascii')
+        return out
+
+    def _ready(self,msg=None):
+        self.ready_count += 1
+        return self._build_resp(const.kREADY,const.READY_RSP)
+
+    def _fee_read(self, args):
+        if args is not None and 0 <= args[0] < 4:
+            return self._build_resp(const.kACK, self.state['FEE'][args[0]])
+        return self._build_resp(const.kERR, const.FEE_RANGE)
+
+    def _fee_write(self, args):
+        if args is not None:
+            if args[0] >=0 and args[0] < 4:
+                self.state['FEE'][args[0]] = args[1]
+                return self._build_resp(const.kACK, const.FEE_WRITTEN)
+            return self._build_resp(const.kERR, const.FEE_RANGE)
+        return self._build_resp(const.kERR, const.DATA_PARSE_FAIL)
+
+    def _filter_read(self, args):
+        return self._build_resp(const.kACK, self.state['FILTER'])
+
+    def _filter_write(self, args):
+        if args is not None and 0 <= args[0] < 4:
+            self.state['FILTER'] = args[0]
+            return self._build_resp(const.kACK, const.FILTER_WRITTEN)
+        return self._build_resp(const.kERR, const.FILTER_RANGE)
+
+    def _atten_read(self, args):
+        if args is not None and 0 <= args[0] < 2:
+            return self._build_resp(const.kACK, self.state['ATTEN'][args[0]])
+        return self._build_resp(const.kERR, const.DATA_PARSE_FAIL)
+
+    def _atten_write(self, args):
+        if args is not None and 0 <= args[0] < 2:
+            self.state['ATTEN'][args[0]] = args[1]
+            return self._build_resp(const.kACK, const.ATTEN_WRITTEN)
+        return self._build_resp(const.kERR, const.DATA_PARSE_FAIL)
+
+    def _eeprom_read(self, args):
+        return self._build_resp(const.kACK, self.state['EEPROM'])
+
+    def _eeprom_write(self, args):
+        if args is not None:
+            if 1 <= args[0] < const.EEPROM_SLOTS:
+                self.state['EEPROM'] = args[0]
+                if args[0] in self.eeprom:
+                    self.state.update(copy.deepcopy(self.eeprom[args[0]]))
+                return self._build_resp(const.kACK, const.EEPROM_WRITTEN)
+            return self._build_resp(const.kERR, const.EEPROM_RANGE)
+        return self._build_resp(const.kERR, const.DATA_PARSE_FAIL)
+
+    def _state_read(self, args):
+        if not self.state_read:
+            return self._build_resp(const.kCOMM_ERR, const.DATA_PARSE_FAIL)
+        state = self.state
+        values = state['FEE'] + state['ATTEN'] + [state['FILTER'],
+                                                  state['EEPROM']]
+        return self._build_resp(const.kACK,
+                                const.ARG_SEPARATOR.join(map(str, values)))
+
+    def _flash_write(self, args):
+        self.eeprom[self.state['EEPROM']] = copy.deepcopy(
+            dict((key, self.state[key]) for key in ('FEE', 'ATTEN', 'FILTER')))
+        return self._build_resp(const.kACK, const.FLASH_WRITTEN)
+
+    def _roach_write(self, args):
+        if args is not None:
+            if 0 <= args[0] <= 1:
+                return self._build_resp(const.kACK, const.ROACH_WRITTEN)
+            return self._build_resp(const.kACK, const.ROACH_RANGE)
+        return self._build_resp(const.kERR, const.DATA_PARSE_FAIL)
+
+
+class Faults(object):
+    """
+    Faults injected by :class:`VirtualACU` into its responses.
+    """
+
+    def __init__(self, garbage=0., drop=0., delay=0., seed=None, corrupt=0.):
+        """
+        :param garbage: Probability that junk bytes are sent before a
+        response.
+        :param drop: Probability that each response byte is dropped.
+        :param corrupt: Probability that a bit is flipped in a response.
+        :param delay: Extra seconds before each response is sent.
+        :param seed: Optional random seed, for repeatable faults.
+        """
+        self.garbage = garbage
+        self.drop = drop
+        self.delay = delay
+        self.corrupt = corrupt
+        self.random = random.Random(seed)
+
+    def apply(self, resp):
+        """:rtype: `resp` bytes with the faults applied."""
+        rand = self.random
+        if self.garbage and rand.random() < self.garbage:
+            junk = bytearray(rand.randint(0, 255) for i in range(4))
+            resp = bytes(junk.replace(b';', b'?')) + resp
+        if self.corrupt and rand.random() < self.corrupt and len(resp) > 1:
+            # Any byte but the terminator, so the frame stays delimited.
+            data = bytearray(resp)
+            i = rand.randrange(len(data) - 1)
+            data[i] ^= 1 << rand.randrange(7)
+            if data[i] == ord(';'):
+                data[i] ^= 1
+            resp = bytes(data)
+        if self.drop:
+            resp = bytes(bytearray(b for b in bytearray(resp)
+                                   if rand.random() >= self.drop))
+        return resp
+
+
+class VirtualACU(object):
+    """
+    Virtual ACU device on a pseudo-terminal. A background thread reads
+    command bytes from the master side as they arrive, runs complete frames
+    through an :class:`ACUFirmware`, and writes the responses back. Connect
+    to :attr:`port` like any other tty.
+    """
+
+    def __init__(self, firmware=None, faults=None, processing=0., rate=None,
+                 crc=None):
+        """
+        :param firmware: :class:`ACUFirmware` to serve. A new one by default.
+        :param faults: Optional :class:`Faults` to inject.
+        :param processing: Seconds the firmware takes per command.
+        :param rate: Optional baud rate to pace response bytes at. Responses
+        are written as fast as possible by default.
+        :param crc: Optional :class:`ARXControl.crc.CRC` for every frame, in
+        both directions.
+        """
+        import pty
+        import tty
+
+        self.firmware = firmware or ACUFirmware()
+        self.faults = faults
+        self.processing = processing
+        self.byte_time = 10. / rate if rate else 0.
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        #: Path of the tty to connect to.
+        self.port = os.ttyname(self._slave)
+        self._decoder = Decoder(crc)
+        self.firmware.crc = crc
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Starts serving in a background thread."""
+        self._running = True
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving and closes the pseudo-terminal."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, etype, value, tb):
+        self.stop()
+
+    def _serve(self):
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                data = os.read(self._master, 1024)
+            except OSError:
+                break
+            for command, args in self._decoder.decode(data):
+                self._respond(self.firmware.handle(command, args))
+
+    def _respond(self, resp):
+        resp = resp.encode('ascii')
+        if self.faults is not None:
+            resp = self.faults.apply(resp)
+        delay = self.processing
+        if self.faults is not None:
+            delay += self.faults.delay
+        if delay:
+            time.sleep(delay)
+        if not self.byte_time:
+            os.write(self._master, resp)
+            return
+        for i in range(len(resp)):
+            os.write(self._master, resp[i:i + 1])
+            time.sleep(self.byte_time)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Serve a virtual ARX Control Unit on a pseudo-terminal.')
+    parser.add_argument('--garbage', type=float, default=0.)
+    parser.add_argument('--drop', type=float, default=0.)
+    parser.add_argument('--delay', type=float, default=0.)
+    parser.add_argument('--processing', type=float, default=0.)
+    parser.add_argument('--corrupt', type=float, default=0.)
+    parser.add_argument('--rate', type=int, default=None)
+    parser.add_argument('--crc', type=int, choices=sorted(CRCS), default=None)
+    parser.add_argument('--no-state-read', action='store_true',
+                        help='answer STATE_READ like older firmware')
+    args = parser.parse_args()
+
+    faults = Faults(args.garbage, args.drop, args.delay, corrupt=args.corrupt)
+    firmware = ACUFirmware(state_read=not args.no_state_read)
+    with VirtualACU(firmware, faults=faults, processing=args.processing,
+                    rate=args.rate, crc=CRCS.get(args.crc)) as acu:
+        print(acu.port)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
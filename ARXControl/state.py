@@ -0,0 +1,53 @@
+from collections import namedtuple
+
+
+class State(namedtuple('State', ['fee', 'atten0', 'atten1', 'filter',
+                                 'eeprom_offset', 'timestamp'])):
+    """
+    Immutable snapshot of the ACU state, as returned by
+    :meth:`ARXControl.arx.ARX.read_all`.
+
+    :attr:`fee` is a tuple of the four FEE power states. :attr:`timestamp`
+    is the time the snapshot was taken, in seconds since the epoch.
+    """
+    __slots__ = ()
+
+    #: Fields that hold ACU settings, i.e. everything but the timestamp.
+    SETTINGS = ('fee', 'atten0', 'atten1', 'filter', 'eeprom_offset')
+
+    def diff(self, other):
+        """
+        :rtype: Tuple of the names of the settings that differ between this
+        snapshot and `other`.
+        """
+        return tuple(field for field in self.SETTINGS
+                     if getattr(self, field) != getattr(other, field))
+
+    def pack(self):
+        """
+        Packs the settings into a 32-bit integer: the FEE channels in bits
+        0-3, :attr:`atten0` in bits 4-7, :attr:`atten1` in bits 8-11,
+        :attr:`filter` in bits 12-15 and :attr:`eeprom_offset` in bits 16-31.
+        The timestamp is not included.
+
+        :rtype: int
+        """
+        fee = 0
+        for i, on in enumerate(self.fee):
+            fee |= (1 if on else 0) << i
+        return (fee | self.atten0 << 4 | self.atten1 << 8 | self.filter << 12 |
+                self.eeprom_offset << 16)
+
+    @classmethod
+    def unpack(cls, packed, timestamp):
+        """
+        Inverse of :meth:`pack`.
+
+        :param packed: Integer returned by :meth:`pack`.
+        :param timestamp: Timestamp of the new snapshot.
+
+        :rtype: :class:`State`
+        """
+        return cls(tuple((packed >> i) & 1 for i in range(4)),
+                   (packed >> 4) & 0xf, (packed >> 8) & 0xf,
+                   (packed >> 12) & 0xf, (packed >> 16) & 0xffff, timestamp)
@@ -0,0 +1,304 @@
+"""
+On-disk ACU state log.
+
+The log is an append-only binary file of fixed-size records, one for each
+poll sample or acknowledged setting change, in time order::
+
+    writer = StateLogWriter('/data/arx.log')
+    writer.attach(arx)
+    arx.start_poller(callback=writer.sample)
+    ...
+    log = StateLog('/data/arx.log')
+    state = log.at(t)
+    changes = log.changes(start, end)
+
+:class:`StateLogWriter` never blocks the caller: records are queued and
+written by a background thread. :class:`StateLog` memory-maps the file and
+finds a time with a sparse in-memory index of every
+:attr:`StateLog.INDEX_EVERY`-th record, followed by a binary search inside
+one block. Only the pages that are touched are read from disk.
+"""
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import deque
+
+from .state import State
+
+#: File header: magic, format version, record size.
+HEADER = struct.Struct('<8sII')
+MAGIC = b'ARXLOG\x00\x00'
+VERSION = 1
+
+#: Record: timestamp, packed state (see :meth:`State.pack`), kind.
+RECORD = struct.Struct('<dIB3x')
+
+#: Record kinds.
+SAMPLE = 0
+CHANGE = 1
+
+# Map from :class:`ARXControl.arx.ARX` field names to :class:`State` fields.
+_FIELDS = {'power': 'fee'}
+
+
+class StateLogWriter(object):
+    """
+    Appends records to a state log from a background thread.
+
+    Records are queued, so logging costs the caller one append. When more
+    than `maxsize` records are waiting, new ones are dropped and counted in
+    :attr:`dropped` rather than blocking.
+    """
+
+    def __init__(self, path, maxsize=100000):
+        """
+        :param path: Log file. Created if missing, appended to otherwise.
+        :param maxsize: Maximum number of records waiting to be written.
+        """
+        self.path = path
+        self.maxsize = maxsize
+        #: Number of records dropped because the queue was full.
+        self.dropped = 0
+        #: Latest known state, completed by setting changes.
+        self.state = None
+        self._last_time = 0.
+        self._file = _open_append(path)
+        self._queue = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='arx-statelog')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def attach(self, arx):
+        """
+        Logs every setting change acknowledged by `arx`, and records its
+        current state as a first sample.
+
+        :param arx: :class:`ARXControl.arx.ARX` to follow.
+        """
+        arx.listeners.append(self.change)
+        self.sample(arx.read_all())
+
+    def sample(self, state):
+        """Logs a :class:`State` sampled from the ACU."""
+        self._put((SAMPLE, state))
+
+    def change(self, field, value):
+        """
+        Logs a setting change, on top of the latest known state. Changes are
+        dropped until a first sample has been logged.
+
+        :param field: :class:`ARXControl.arx.ARX` field name, e.g.
+        ``'atten0'``.
+        """
+        self._put((CHANGE, (time.time(), field, value)))
+
+    def _put(self, item):
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                self.dropped += 1
+                return
+            self._queue.append(item)
+            self._cond.notify()
+
+    def flush(self):
+        """Waits until every queued record is on disk."""
+        done = threading.Event()
+        with self._cond:
+            self._queue.append((None, done))
+            self._cond.notify()
+        done.wait()
+
+    def close(self):
+        """Writes the queued records, then closes the file."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._file.close()
+
+    def _pack(self, kind, payload):
+        if kind == SAMPLE:
+            self.state = payload
+        else:
+            if self.state is None:
+                return b''
+            timestamp, field, value = payload
+            self.state = self.state._replace(
+                **{_FIELDS.get(field, field): value, 'timestamp': timestamp})
+        # Keep the file in time order, even if a sample and a change were
+        # queued out of order.
+        self._last_time = max(self._last_time, self.state.timestamp)
+        return RECORD.pack(self._last_time, self.state.pack(), kind)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                items, self._queue = self._queue, deque()
+                closed = self._closed
+            data, flushed = [], []
+            for kind, payload in items:
+                if kind is None:
+                    flushed.append(payload)
+                else:
+                    data.append(self._pack(kind, payload))
+            if data:
+                self._file.write(b''.join(data))
+                self._file.flush()
+            for done in flushed:
+                done.set()
+            if closed and not items:
+                return
+
+
+def _open_append(path):
+    """Opens a log for appending, writing the header or checking it."""
+    f = open(path, 'ab')
+    size = f.tell()
+    if not size:
+        f.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        f.flush()
+        return f
+    with open(path, 'rb') as check:
+        _check_header(check.read(HEADER.size), path)
+    # Drop a partial record left by a crash.
+    extra = (size - HEADER.size) % RECORD.size
+    if extra:
+        f.truncate(size - extra)
+    return f
+
+
+def _check_header(data, path):
+    if len(data) < HEADER.size:
+        raise IOError("%s is not an ARX state log" % path)
+    magic, version, size = HEADER.unpack(data)
+    if magic != MAGIC or version != VERSION or size != RECORD.size:
+        raise IOError("%s is not an ARX state log" % path)
+
+
+class _Times(object):
+    """Sequence view of the record timestamps in a mapped log."""
+
+    def __init__(self, mm):
+        self.mm = mm
+
+    def __getitem__(self, i):
+        return struct.unpack_from('<d', self.mm,
+                                  HEADER.size + i * RECORD.size)[0]
+
+
+class StateLog(object):
+    """
+    Read-only view of a state log, memory-mapped. Call :meth:`refresh` to
+    see records appended since it was opened.
+    """
+
+    #: Records between entries of the sparse time index.
+    INDEX_EVERY = 512
+
+    def __init__(self, path):
+        """
+        :param path: Log file written by :class:`StateLogWriter`.
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        _check_header(self._file.read(HEADER.size), path)
+        self._mm = None
+        self._count = 0
+        self._index = array('d')
+        self.refresh()
+
+    def __len__(self):
+        return self._count
+
+    def refresh(self):
+        """Maps records appended since the last refresh."""
+        size = os.fstat(self._file.fileno()).st_size
+        count = (size - HEADER.size) // RECORD.size
+        if count == self._count and self._mm is not None:
+            return
+        if self._mm is not None:
+            self._mm.close()
+        self._mm = mmap.mmap(self._file.fileno(), size,
+                             access=mmap.ACCESS_READ)
+        self._count = count
+        times = _Times(self._mm)
+        for i in range(len(self._index) * self.INDEX_EVERY, count,
+                       self.INDEX_EVERY):
+            self._index.append(times[i])
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, tb):
+        self.close()
+
+    def _record(self, i):
+        timestamp, packed, kind = RECORD.unpack_from(
+            self._mm, HEADER.size + i * RECORD.size)
+        return timestamp, packed, kind
+
+    def _position(self, t, right=True):
+        """
+        :rtype: Number of records at or before `t`, or strictly before `t`
+        when not `right`.
+        """
+        search = bisect.bisect_right if right else bisect.bisect_left
+        block = max(0, search(self._index, t) - 1)
+        lo = block * self.INDEX_EVERY
+        hi = min(lo + self.INDEX_EVERY, self._count)
+        return search(_Times(self._mm), t, lo, hi)
+
+    def record(self, i):
+        """
+        :rtype: A tuple of (:class:`State`, kind) for record `i`.
+        """
+        if not 0 <= i < self._count:
+            raise IndexError("record %d out of range" % i)
+        timestamp, packed, kind = self._record(i)
+        return State.unpack(packed, timestamp), kind
+
+    def at(self, t):
+        """
+        :rtype: The :class:`State` in effect at `t`, or None if the log
+        starts later.
+        """
+        n = self._position(t)
+        if not n:
+            return None
+        return self.record(n - 1)[0]
+
+    def range(self, start, end):
+        """
+        :rtype: Iterator over (:class:`State`, kind) for every record from
+        `start` to `end`, inclusive.
+        """
+        for i in range(self._position(start, right=False),
+                       self._position(end)):
+            yield self.record(i)
+
+    def changes(self, start, end):
+        """
+        :rtype: List of every :class:`State` from `start` to `end` that
+        differs from the record before it.
+        """
+        first = self._position(start, right=False)
+        prev = self._record(first - 1)[1] if first else None
+        out = []
+        for i in range(first, self._position(end)):
+            timestamp, packed, kind = self._record(i)
+            if packed != prev:
+                prev = packed
+                out.append(State.unpack(packed, timestamp))
+        return out
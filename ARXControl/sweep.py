@@ -0,0 +1,140 @@
+"""
+Settings sweeps for calibration runs.
+
+A sweep visits every combination of a set of settings, in "snake" order: a
+reflected, mixed-radix Gray code, so that exactly one setting changes
+between consecutive points::
+
+    results = arx.sweep([('filter', range(3)),
+                         ('atten0', range(16)),
+                         ('atten1', range(16))],
+                        hook=measure, settle=0.05)
+
+A full 3x16x16 sweep therefore takes one single-frame write per point, all
+in one session, instead of three property writes with handshakes per point.
+"""
+import time
+
+
+def snake(*axes):
+    """
+    Iterates over the product of `axes`, with the last axis varying fastest
+    and reversing direction each time an outer axis moves, so that
+    consecutive points differ in exactly one coordinate.
+
+    :param axes: Sequences of values.
+
+    :rtype: Iterator over tuples, one value per axis.
+    """
+    if not axes:
+        yield ()
+        return
+    inner = list(snake(*axes[1:]))
+    for i, value in enumerate(axes[0]):
+        for point in (inner if i % 2 == 0 else reversed(inner)):
+            yield (value,) + point
+
+
+class Sweep(object):
+    """
+    Sweep of :class:`ARXControl.arx.ARX` settings. Usually run through
+    :meth:`ARXControl.arx.ARX.sweep`.
+
+    Every value is validated before anything is written. At each point only
+    the setting that changed is written, then the sweep waits `settle`
+    seconds and calls `hook` with a dict of the current settings.
+    """
+
+    #: Settings that can be swept.
+    FIELDS = ('power', 'atten0', 'atten1', 'filter', 'eeprom_offset')
+
+    def __init__(self, arx, axes, hook=None, settle=0.):
+        """
+        :param arx: :class:`ARXControl.arx.ARX` to sweep.
+        :param axes: Sequence of (field, values) pairs, outermost (slowest
+        changing) first.
+        :param hook: Optional callable, called with a dict of field to value
+        at each settled point. Its return values are collected.
+        :param settle: Seconds to wait after each write before calling
+        `hook`.
+        """
+        self.arx = arx
+        self.fields = [field for field, values in axes]
+        self.values = [list(values) for field, values in axes]
+        self.hook = hook
+        self.settle = settle
+        #: Number of commands written by the last :meth:`run`.
+        self.writes = 0
+        for field in self.fields:
+            if field not in self.FIELDS:
+                raise ValueError("Cannot sweep `%s`" % field)
+        if len(set(self.fields)) != len(self.fields):
+            raise ValueError("Each field can only be swept once")
+        self._cmds = dict(((field, i), self._cmds_for(field, value))
+                          for field, values in zip(self.fields, self.values)
+                          for i, value in enumerate(values))
+
+    def _cmds_for(self, field, value):
+        arx = self.arx
+        if field == 'power':
+            return arx._power_cmds(value)
+        if field == 'filter':
+            return [arx._filter_cmd(value)]
+        if field == 'eeprom_offset':
+            return [arx._eeprom_cmd(value)]
+        return [arx._atten_cmd(int(field[-1]), value)]
+
+    def __len__(self):
+        total = 1
+        for values in self.values:
+            total *= len(values)
+        return total
+
+    def points(self):
+        """
+        :rtype: Iterator over the points of the sweep, in the order they are
+        visited, as tuples of value indices.
+        """
+        return snake(*[range(len(values)) for values in self.values])
+
+    def run(self):
+        """
+        Runs the sweep in a single session.
+
+        :rtype: List of (point, hook result) pairs, where each point is a
+        dict of field to value.
+        """
+        arx = self.arx
+        results = []
+        self.writes = 0
+        with arx.session():
+            current = arx.read_all()
+            previous = None
+            for point in self.points():
+                changed = [n for n, i in enumerate(point)
+                           if previous is None or previous[n] != i]
+                cmds = []
+                for n in changed:
+                    field_cmds = self._cmds[(self.fields[n], point[n])]
+                    if previous is None:
+                        # Skip settings that already hold at the start.
+                        field_cmds = [cmd for cmd in field_cmds
+                                      if not arx._holds(current, cmd)]
+                    cmds.extend(field_cmds)
+                if cmds:
+                    arx._send_many(cmds)
+                    self.writes += len(cmds)
+                values = dict((field, self.values[n][point[n]])
+                              for n, field in enumerate(self.fields))
+                for n in changed:
+                    field = self.fields[n]
+                    value = self._cmds[(field, point[n])]
+                    arx._acked(field, tuple(cmd[2] for cmd in value)
+                               if field == 'power' else value[0][-1])
+                if self.settle:
+                    time.sleep(self.settle)
+                result = self.hook(values) if self.hook is not None else None
+                results.append((values, result))
+                previous = point
+        return results
+
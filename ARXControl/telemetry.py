@@ -0,0 +1,229 @@
+"""
+Background telemetry.
+
+:class:`TelemetryPoller` samples the ACU state at a fixed interval into a
+:class:`StateHistory`, a fixed-size ring buffer of packed records::
+
+    poller = arx.start_poller(interval=1.)
+    ...
+    state = poller.history.at(t)
+    changes = poller.history.changes(start, end)
+
+Each sample costs 12 bytes, so memory stays flat however long the poller
+runs.
+"""
+import bisect
+import threading
+import time
+from array import array
+
+from .err import ConnError
+from .scheduler import TELEMETRY
+from .state import State
+
+# Smallest unsigned array type that holds a packed state.
+_PACKED = 'I' if array('I').itemsize >= 4 else 'L'
+
+
+class StateHistory(object):
+    """
+    Ring buffer of timestamped ACU states, kept in two flat arrays: sample
+    times as doubles, and states packed with :meth:`State.pack`. Once full,
+    each new sample overwrites the oldest one.
+
+    Samples are kept in time order. A sample older than the latest one is
+    recorded at the latest sample's time.
+    """
+
+    def __init__(self, capacity):
+        """
+        :param capacity: Maximum number of samples kept.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._times = array('d', [0.]) * capacity
+        self._states = array(_PACKED, [0]) * capacity
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        """Drops every sample."""
+        with self._lock:
+            self._next = 0
+            self._count = 0
+
+    def append(self, timestamp, packed):
+        """
+        Records a sample.
+
+        :param timestamp: Sample time, in seconds since the epoch.
+        :param packed: State packed with :meth:`State.pack`.
+        """
+        with self._lock:
+            if self._count:
+                timestamp = max(timestamp,
+                                self._times[self._next - 1])
+            self._times[self._next] = timestamp
+            self._states[self._next] = packed
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def record(self, state):
+        """Records a :class:`State` snapshot."""
+        self.append(state.timestamp, state.pack())
+
+    def _oldest(self):
+        return self._next if self._count == self.capacity else 0
+
+    def _position(self, t, right=True):
+        """
+        :rtype: Number of samples taken at or before `t`, or strictly before
+        `t` when not `right`.
+        """
+        search = bisect.bisect_right if right else bisect.bisect_left
+        times, oldest = self._times, self._oldest()
+        if oldest and (times[0] <= t if right else times[0] < t):
+            # Every sample in the older segment, [oldest, capacity), counts.
+            return self.capacity - oldest + search(times, t, 0, oldest)
+        hi = min(oldest + self._count, self.capacity)
+        return search(times, t, oldest, hi) - oldest
+
+    def _sample(self, i):
+        j = (self._oldest() + i) % self.capacity
+        return State.unpack(self._states[j], self._times[j])
+
+    def latest(self):
+        """:rtype: The most recent :class:`State`, or None if empty."""
+        with self._lock:
+            if not self._count:
+                return None
+            return self._sample(self._count - 1)
+
+    def at(self, t):
+        """
+        :param t: Time, in seconds since the epoch.
+
+        :rtype: The :class:`State` in effect at `t`, i.e. the last sample
+        taken at or before `t`, or None if there is none.
+        """
+        with self._lock:
+            n = self._position(t)
+            if not n:
+                return None
+            return self._sample(n - 1)
+
+    def changes(self, start, end):
+        """
+        :param start: Start of the window, in seconds since the epoch.
+        :param end: End of the window, inclusive.
+
+        :rtype: List of every :class:`State` sampled in the window that
+        differs from the sample before it. A first sample with no earlier
+        sample counts as a change.
+        """
+        with self._lock:
+            first = self._position(start, right=False)
+            last = self._position(end)
+            oldest, capacity = self._oldest(), self.capacity
+            states, times = self._states, self._times
+            prev = states[(oldest + first - 1) % capacity] if first else None
+            out = []
+            for i in range(first, last):
+                j = (oldest + i) % capacity
+                if states[j] != prev:
+                    prev = states[j]
+                    out.append(State.unpack(prev, times[j]))
+            return out
+
+
+class TelemetryPoller(object):
+    """
+    Samples an :class:`ARXControl.arx.ARX` with
+    :meth:`ARXControl.arx.ARX.read_all` from a background thread, into a
+    :class:`StateHistory`. Polls run at
+    :data:`ARXControl.scheduler.TELEMETRY` priority, so commands from other
+    threads go first when the ARX has a scheduler.
+
+    Failed polls, including malformed replies, are counted in
+    :attr:`errors` and skipped. If a poll overruns
+    the interval, the missed samples are skipped rather than run back to
+    back.
+    """
+
+    def __init__(self, arx, interval=1., capacity=86400, history=None,
+                 callback=None):
+        """
+        :param arx: :class:`ARXControl.arx.ARX` to poll.
+        :param interval: Seconds between samples.
+        :param capacity: Number of samples kept, when `history` is not given.
+        The default keeps a day of samples at one per second.
+        :param history: Optional :class:`StateHistory` to record into.
+        :param callback: Optional callable, called with each sampled
+        :class:`State` from the polling thread.
+        """
+        self.arx = arx
+        self.interval = interval
+        self.history = history if history is not None else \
+            StateHistory(capacity)
+        self.callback = callback
+        #: Number of failed polls.
+        self.errors = 0
+        #: Exception raised by the last failed poll.
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """
+        Takes one sample now.
+
+        :rtype: The sampled :class:`State`.
+        """
+        with self.arx.priority(TELEMETRY):
+            state = self.arx.read_all()
+        self.history.record(state)
+        if self.callback is not None:
+            self.callback(state)
+        return state
+
+    def start(self):
+        """Starts polling in a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='arx-telemetry')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops polling, waiting for a poll in progress to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, etype, value, tb):
+        self.stop()
+
+    def _run(self):
+        due = time.time()
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except (IOError, ConnError, TypeError, ValueError) as e:
+                # Malformed replies must not stop the sampling either.
+                self.errors += 1
+                self.last_error = e
+            due += self.interval
+            now = time.time()
+            if due < now:
+                due = now
+            self._stop.wait(due - now)
@@ -0,0 +1,208 @@
+"""
+ARXControl benchmark suite.
+
+Runs the real :class:`ARXControl.arx.ARX` and
+:class:`ARXControl.connection.Connection` code against
+:class:`benchmarks.simulator.TimedACU`, and reports commands/sec and
+p50/p99 latency for each scenario. Run from the repository root::
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --compare bench.json
+
+Results are saved as JSON so that runs can be compared across releases.
+"""
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+
+import ARXControl
+from ARXControl import const
+
+from .simulator import TimedARX
+
+
+def _read_atten0(arx, i):
+    arx.atten0
+
+def _write_atten0(arx, i):
+    arx.atten0 = i % 16
+
+def _read_power(arx, i):
+    arx.power
+
+def _write_power(arx, i):
+    arx.power = i % 2
+
+def _read_all(arx, i):
+    arx.read_all()
+
+def _apply(arx, i):
+    state = arx.read_all()
+    arx.apply(state._replace(atten0=i % 16, filter=i % 3))
+
+def _session_reads(arx, i):
+    with arx.session():
+        arx.atten0
+        arx.atten1
+        arx.filter
+
+def _sweep(arx, i):
+    with arx.session():
+        for level in range(16):
+            arx.atten0 = level
+
+def _sweep_engine(arx, i):
+    arx.sweep([('atten0', range(16))])
+
+def _threaded_reads(arx, i):
+    # Four threads sharing one session, as telemetry and control do.
+    with arx.session():
+        threads = [threading.Thread(target=getattr, args=(arx, field))
+                   for field in ('atten0', 'atten1', 'filter', 'power')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+#: Benchmark scenarios, as (name, function) pairs.
+SCENARIOS = [
+    ('read_atten0', _read_atten0),
+    ('write_atten0', _write_atten0),
+    ('read_power', _read_power),
+    ('write_power', _write_power),
+    ('read_all', _read_all),
+    ('apply', _apply),
+    ('session_reads', _session_reads),
+    ('sweep_atten0', _sweep),
+    ('sweep_engine', _sweep_engine),
+    ('threaded_reads', _threaded_reads),
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values`."""
+    values = sorted(values)
+    index = int(round(pct / 100. * (len(values) - 1)))
+    return values[index]
+
+
+def run_scenario(arx, func, iterations):
+    """
+    Runs `func` `iterations` times. Commands/sec counts every frame the
+    simulated ACU received, handshakes and retries included.
+    """
+    latencies = []
+    sent = arx.conn.serial.commands
+    start = time.time()
+    for i in range(iterations):
+        t0 = time.time()
+        func(arx, i)
+        latencies.append(time.time() - t0)
+    elapsed = time.time() - start
+    commands = arx.conn.serial.commands - sent
+    return {'iterations': iterations,
+            'commands': commands,
+            'commands_per_sec': commands / elapsed,
+            'ops_per_sec': iterations / elapsed,
+            'p50_ms': 1e3 * percentile(latencies, 50),
+            'p99_ms': 1e3 * percentile(latencies, 99),
+            'mean_ms': 1e3 * elapsed / iterations}
+
+
+def run(sim_args, rate, iterations, names=None, duplex=False):
+    """
+    Runs the benchmark scenarios.
+
+    :param sim_args: Keyword arguments for
+    :class:`benchmarks.simulator.TimedACU`.
+    :param names: Optional list of scenario names to run.
+    :param duplex: Use full-duplex connections.
+
+    :rtype: Dict of results, as saved by :func:`main`.
+    """
+    results = {}
+    for name, func in SCENARIOS:
+        if names and name not in names:
+            continue
+        arx = TimedARX(rate, sim_args, duplex=duplex)
+        results[name] = run_scenario(arx, func, iterations)
+        arx.close()
+    return {'version': str(ARXControl.__version__),
+            'python': platform.python_version(),
+            'timestamp': time.time(),
+            'rate': rate or const.BAUDRATE,
+            'sim': sim_args,
+            'duplex': duplex,
+            'iterations': iterations,
+            'results': results}
+
+
+def compare(old, new, out=sys.stdout):
+    """
+    Prints the change in operations/sec between two result dicts, or in
+    commands/sec against results saved before operations were counted.
+    """
+    out.write('%-16s %12s %12s %8s\n' % ('scenario', 'old rate',
+                                        'new rate', 'change'))
+    for name in sorted(new['results']):
+        key = 'ops_per_sec'
+        if key not in old['results'].get(name, {}):
+            key = 'commands_per_sec'
+        new_rate = new['results'][name][key]
+        try:
+            old_rate = old['results'][name][key]
+        except KeyError:
+            out.write('%-16s %12s %12.1f\n' % (name, '-', new_rate))
+            continue
+        out.write('%-16s %12.1f %12.1f %+7.1f%%\n' % (
+            name, old_rate, new_rate, 100. * (new_rate / old_rate - 1)))
+
+
+def report(data, out=sys.stdout):
+    out.write('%-16s %10s %10s %10s %10s\n' % ('scenario', 'ops/s', 'cmd/s',
+                                              'p50 ms', 'p99 ms'))
+    for name, func in SCENARIOS:
+        if name in data['results']:
+            res = data['results'][name]
+            out.write('%-16s %10.1f %10.1f %10.2f %10.2f\n' % (
+                name, res['ops_per_sec'], res['commands_per_sec'],
+                res['p50_ms'], res['p99_ms']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rate', type=int, default=None,
+                        help='baud rate (default %d)' % const.BAUDRATE)
+    parser.add_argument('--processing', type=float, default=0.002,
+                        help='firmware processing time per command, seconds')
+    parser.add_argument('--loss', type=float, default=0.,
+                        help='probability that a response is lost')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-state-read', action='store_true',
+                        help='simulate firmware without STATE_READ')
+    parser.add_argument('--duplex', action='store_true',
+                        help='use full-duplex connections')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--scenario', action='append', dest='names',
+                        help='scenario to run (repeatable, default all)')
+    parser.add_argument('--output', help='save results as JSON')
+    parser.add_argument('--compare', help='JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    sim_args = {'processing': args.processing, 'loss': args.loss,
+                'seed': args.seed, 'state_read': not args.no_state_read}
+    data = run(sim_args, args.rate, args.iterations, args.names, args.duplex)
+    report(data)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), data)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Timing-accurate ACU simulator for benchmarks.
+
+:class:`TimedACU` answers like :class:`ARXControl.sim.ACUFirmware`, and models the
+serial link and the firmware: every byte takes one character time at the
+configured baud rate in each direction, every command takes a fixed
+processing delay, and responses can be lost at random. Reads block, in real
+time, until the modelled bytes have arrived or the port times out. Reading
+and writing from different threads, as in full-duplex mode, is supported.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+from ARXControl import ARX, const
+from ARXControl.connection import Connection
+from ARXControl.decoder import Decoder
+from ARXControl.sim import ACUFirmware
+
+#: Bits on the wire per byte, for 8N1 framing.
+BITS_PER_BYTE = 10
+
+
+class TimedACU(ACUFirmware):
+    """
+    In-process serial port backed by :class:`ACUFirmware`, with a timing model
+    of the serial link and firmware.
+    """
+
+    def __init__(self, tty=None, rate=None, processing=0.002, loss=0.,
+                 seed=None, state_read=True):
+        """
+        :param rate: Baud rate of the link. Defaults to
+        :attr:`const.BAUDRATE`.
+        :param processing: Seconds the firmware takes per command.
+        :param loss: Probability that a response is lost.
+        :param seed: Optional random seed, for repeatable loss.
+        :param state_read: Support the STATE_READ command.
+        """
+        ACUFirmware.__init__(self, state_read)
+        self._decoder = Decoder()
+        self.byte_time = float(BITS_PER_BYTE) / (rate or const.BAUDRATE)
+        self.processing = processing
+        self.loss = loss
+        self.timeout = const.TIMEOUT
+        self._random = random.Random(seed)
+        self._tx_free = 0.
+        self._acu_free = 0.
+        #: Response frames as [arrival time, bytes], in arrival order.
+        self._frames = deque()
+        #: Number of command frames received.
+        self.commands = 0
+        # Guards the frames, and wakes readers when a write queues one.
+        self._cond = threading.Condition()
+
+    @property
+    def in_waiting(self):
+        now = time.time()
+        with self._cond:
+            return sum(len(data) for ready, data in self._frames
+                       if ready <= now)
+
+    def close(self):
+        with self._cond:
+            self._frames.clear()
+            self._cond.notify_all()
+
+    def reset_input_buffer(self):
+        """Discards the response bytes that have arrived."""
+        now = time.time()
+        with self._cond:
+            while self._frames and self._frames[0][0] <= now:
+                self._frames.popleft()
+
+    def write(self, data):
+        # Each command is taken to arrive after an equal share of the bytes.
+        records = self._decoder.decode(data)
+        with self._cond:
+            self.commands += len(records)
+            sent = max(time.time(), self._tx_free)
+            frame_time = len(data) * self.byte_time / max(1, len(records))
+            for command, args in records:
+                sent += frame_time
+                start = max(sent, self._acu_free) + self.processing
+                resp = self.handle(command, args)
+
+                done = start + len(resp) * self.byte_time
+                self._acu_free = done
+                if resp and self._random.random() >= self.loss:
+                    self._frames.append([done, resp.encode('ascii')])
+            self._tx_free = max(sent, time.time() +
+                                len(data) * self.byte_time)
+            self._cond.notify_all()
+
+    def read(self, numberOfBytes):
+        deadline = time.time() + (self.timeout or 0)
+        with self._cond:
+            # Wait for a frame to be queued, then for it to arrive.
+            while True:
+                now = time.time()
+                if self._frames and self._frames[0][0] <= now:
+                    break
+                if now >= deadline:
+                    return b''
+                if self._frames:
+                    self._cond.wait(min(deadline, self._frames[0][0]) - now)
+                else:
+                    self._cond.wait(deadline - now)
+
+            out = b''
+            while self._frames and self._frames[0][0] <= now and \
+                    len(out) < numberOfBytes:
+                ready, data = self._frames[0]
+                take = numberOfBytes - len(out)
+                out += data[:take]
+                if take >= len(data):
+                    self._frames.popleft()
+                else:
+                    self._frames[0][1] = data[take:]
+            return out
+
+
+class TimedConnection(Connection):
+    """:class:`Connection` talking to a :class:`TimedACU`."""
+
+    def __init__(self, tty, rate, sim_args):
+        """
+        :param sim_args: Keyword arguments for :class:`TimedACU`.
+        """
+        self.sim_args = sim_args
+        Connection.__init__(self, tty, rate)
+
+    def _connect(self, tty, rate):
+        return TimedACU(tty, rate, **self.sim_args)
+
+
+class TimedARX(ARX):
+    """:class:`ARX` talking to a :class:`TimedACU`."""
+
+    def __init__(self, rate=None, sim_args=None, **kwargs):
+        """
+        :param sim_args: Keyword arguments for :class:`TimedACU`.
+        :param kwargs: Keyword arguments for :class:`ARX`.
+        """
+        self.sim_args = sim_args or {}
+        ARX.__init__(self, '/dev/sim', rate, **kwargs)
+
+    def _connect(self, tty, rate):
+        return TimedConnection(tty, rate, self.sim_args)
@@ -32,11 +32,18 @@ setup(
     packages=[
         'ARXControl',
     ],
+    entry_points={
+        'console_scripts': [
+            'arxctl = ARXControl.cli:main',
+            'arxd = ARXControl.daemon:main',
+        ],
+    },
     test_suite='nose.collector',
     zip_safe=False,
     platforms='any',
     install_requires=[
         'pyserial',
+        'futures; python_version < "3"',
     ],
     tests_require=[
         'nose',
@@ -2,7 +2,9 @@
 
 from ARXControl import ARX, const 
 from ARXControl.arx import unpack
+from ARXControl.decoder import parse
 from ARXControl.connection import Connection
+from ARXControl.sim import ACUFirmware
 
 class MockConnection(Connection):
     """
@@ -31,184 +33,50 @@ class MockARX(ARX):
         pass
 
 
-class MockACU(ARX, Connection):
+class MockACU(ACUFirmware, ARX, Connection):
     """
     Mock object to emulate the ARX Control Unit.
 
     Emulates a serial connection, and behaves like the ACU when
-    given commands.
+    given commands, using :class:`ARXControl.sim.ACUFirmware`.
     """
 
-    
-
-    DEFAULT_STATE = {'FEE':[0,0,0,0],
-                     'ATTEN':[15,15],
-                     'FILTER':0,
-                     'EEPROM':1}
-
+    #: Firmware CRC, shadowing :attr:`Connection.crc`.
+    crc = None
 
     def __init__(self, tty=None, rate=None):
-        self.responses = {const.ACU_READY: self._ready,
-                          const.FEE_READ: self._fee_read,
-                          const.FEE_WRITE: self._fee_write,
-                          const.FILTER_READ: self._filter_read,
-                          const.FILTER_WRITE: self._filter_write,
-                          const.ATTEN_READ: self._atten_read,
-                          const.ATTEN_WRITE: self._atten_write,
-                          const.EEPROM_READ: self._eeprom_read,
-                          const.EEPROM_WRITE: self._eeprom_write,
-                          const.FLASH_WRITE: self._flash_write,
-                          const.ROACH_WRITE: self._roach_write,
-                          }
-
+        ACUFirmware.__init__(self)
+        self._resp_buffer = ''
+        #: Every frame written, as `(command, args)` tuples, in order.
+        self.sent = []
+        #: Commands, as argument tuples, whose next response is lost.
+        self.drop = []
+
+    def count(self, command):
+        """:rtype: Number of `command` frames written."""
+        return [cmd for cmd, args in self.sent].count(command)
+
+    @property
+    def in_waiting(self):
+        """Emulates Serial interface."""
+        return len(self._resp_buffer)
+
+    def close(self):
+        """Emulates Serial interface."""
         self._resp_buffer = ''
-        self.state = self.DEFAULT_STATE
-
-    def _build_resp(self,code=1,resp_str=None):
-        out = str(code)
-        if resp_str or resp_str is 0:
-            out += const.SEPARATOR + str(resp_str)
-        out += const.END_COMMAND
-        return out
-
-
-    #def _send_cmd(self, command, *args):
-        #out = str(command)
-        #if args or args is 0:
-            #if len(args) > 2:
-                #raise TypeError('Only accepts a maximum of two arguments')
-            #out += const.SEPARATOR +  '|'.join(map(str,args))
-        #out += const.END_COMMAND
-        #return out 
-        
-
-    def _ready(self,msg=None):
-        self._resp_buffer = self._build_resp(const.kREADY,const.READY_RSP)
-
-
-    def _fee_read(self, args):
-        if args[0] >=0 and args[0] < 4:
-            state = self.state['FEE'][args[0]]
-            self._resp_buffer = self._build_resp(const.kACK,
-                                             state)
-        else:
-            self._resp_buffer = self._build_resp(const.kERR, const.FEE_RANGE)
-
-   
-    def _fee_write(self, args):
-        if args is not None:
-            if args[0] >=0 and args[0] < 4:
-                self.state['FEE'][args[0]] = args[1]
-                self._resp_buffer = self._build_resp(const.kACK,
-                                        const.FEE_WRITTEN)
-            else:
-                self._resp_buffer = self._build_resp(const.kERR,
-                                        const.FEE_RANGE)
-        else:
-            self._resp_buffer = self._build_resp(const.kERR,
-                                    const.DATA_PARSE_FAIL)
-
-
-    def _filter_read(self, args):
-        self._resp_buffer = self._build_resp(const.kACK, self.state['FILTER'])
-   
-    def _filter_write(self, args):
-        if args[0] >=0 and args[0] < 4:
-            self.state['FILTER'] = args[0]
-            self._resp_buffer = self._build_resp(const.kACK,
-                                                 const.FILTER_WRITTEN)
-        else:
-            self._resp_buffer = self._build_resp(const.kERR, const.FILTER_RANGE)
-
-
-    def _atten_read(self, args):
-        if args is not None:
-            if args[0] >=0 and args[0] < 2:
-                self._resp_buffer = self._build_resp(const.kACK,
-                                         self.state['ATTEN'][args[0]])
-            else:
-                self._resp_buffer = self._build_resp(const.kERR,
-                                        const.DATA_PARSE_FAIL)
-        else:
-            self._resp_buffer = self._build_resp(const.kERR,
-                                    const.DATA_PARSE_FAIL)
-   
-    def _atten_write(self, args):
-        if args is not None:
-            if args[0] >=0 and args[0] < 2:
-                self.state['ATTEN'][args[0]] = args[1]
-                self._resp_buffer = self._build_resp(const.kACK,
-                                        const.ATTEN_WRITTEN)
-            else:
-                self._resp_buffer = self._build_resp(const.kERR,
-                                        const.DATA_PARSE_FAIL)
-        else:
-            self._resp_buffer = self._build_resp(const.kERR,
-                                    const.DATA_PARSE_FAIL)
-
-
-    def _eeprom_read(self, args):
-        self._resp_buffer = self._build_resp(const.kACK, self.state['EEPROM'])
-   
-    def _eeprom_write(self, args):
-        if args is not None:
-            if args[0] < 1024 and args[0] >=1:
-                self.state['EEPROM'] = args[0]
-                self._resp_buffer = self._build_resp(const.kACK,
-                                                     const.EEPROM_WRITTEN)
-            else:
-                self._resp_buffer = self._build_resp(const.kERR,
-                                        const.EEPROM_RANGE)
-        else:
-            self._resp_buffer = self._build_resp(const.kERR,
-                                    const.DATA_PARSE_FAIL)
-
-    def _flash_write(self, args):
-        self._resp_buffer = self._build_resp(const.kACK,
-                                             const.FLASH_WRITTEN)
-
-    def _roach_write(self, args):
-        if args is not None:
-            if 0 <= args[0] <= 1:
-                self._resp_buffer = self._build_resp(const.kACK,
-                                                     const.ROACH_WRITTEN)
-            else:
-                self._resp_buffer = self._build_resp(const.kACK,
-                                                     const.ROACH_RANGE)
-        else:
-            self._resp_buffer = self._build_resp(const.kERR,
-                                    const.DATA_PARSE_FAIL)
-
-
-
-    #def _unpack(self, inputstring):
-        #inputstring = inputstring.strip(const.END_COMMAND)
-        #parts = inputstring.split(const.SEPARATOR)
-
-        #command = parts[0]
-        #try:
-            #args = parts[1].split(const.ARG_SEPARATOR)
-            #for i in range(len(args)):
-                #try:
-                    #args[i] = int(args[i])
-                #except ValueError:
-                    #pass
-        #except IndexError:
-            #args = None
-
-        #return command, args
-        
 
     def read(self, numberOfBytes):
         """
         Emulates Serial interface. 
 
-        Takes the same arguments as :func:Serial.read but does not respect the
-        `numberOfBytes` argument. 
+        Takes the same arguments as :func:Serial.read.
 
-        Returns the response generated by the last :func:write command.
+        Returns up to `numberOfBytes` of the responses generated by previous
+        :func:write commands, in the order they were issued.
         """
-        return self._resp_buffer
+        out = self._resp_buffer[:numberOfBytes]
+        self._resp_buffer = self._resp_buffer[numberOfBytes:]
+        return out
 
     def write(self, inputstring):
         """
@@ -216,10 +84,17 @@ class MockACU(ARX, Connection):
 
         Takes the same arguments as :func:Serial.write.
 
-        Sets up a response generated by the issued command, which can be
-        retrieved via the :func:read command.
+        Sets up a response for each command frame in `inputstring`, which can
+        be retrieved via the :func:read command.
         """
-        command, args = self._unpack(inputstring)
-        if int(command) <= max(self.responses):
-            self.responses[int(command)](args)
- 
+        if not isinstance(inputstring, str):
+            inputstring = inputstring.decode('ascii')
+        for frame in inputstring.split(const.END_COMMAND)[:-1]:
+            command, args = parse(frame + const.END_COMMAND, self.crc)
+            self.sent.append((command, args))
+            resp = self.handle(command, args)
+            key = (command,) + tuple(args or ())
+            if key in self.drop:
+                self.drop.remove(key)
+                continue
+            self._resp_buffer += resp
@@ -6,6 +6,9 @@ import unittest2 as unittest
 
 from .mocks import MockARX
 from ARXControl import const
+from ARXControl.cache import StateCache
+from ARXControl.connection import FrameReader
+from ARXControl.err import ConnError
 
 #: Simulated Test State for ARX Control Unit.
 TEST_STATE_1 = {'FEE':[1,1,1,1],
@@ -151,3 +154,197 @@ class TestARXControl(unittest.TestCase):
         self.assertEqual(0, i, "Shutting Down Roach")
 
 
+
+    def test_pipeline_write(self):
+        serial = self.arx.conn.serial
+        with self.arx.pipeline():
+            self.arx.power = [1,0,1,0]
+            self.arx.atten0 = 5
+            self.arx.atten1 = 6
+            self.arx.filter = 2
+            self.assertEqual(len(self.arx._queue), 7, "Frames queued")
+            self.assertEqual(serial.state['FILTER'], 0, "Nothing sent yet")
+        self.assertEqual(self.arx._queue, None)
+        self.assertEqual(self.arx.power, [1,0,1,0])
+        self.assertEqual(self.arx.atten0, 5)
+        self.assertEqual(self.arx.atten1, 6)
+        self.assertEqual(self.arx.filter, 2)
+
+    def test_pipeline_read(self):
+        serial = self.arx.conn.serial
+        with self.arx.pipeline():
+            self.arx.power = [1,0,1,0]
+            self.assertEqual(self.arx.power, [1,0,1,0])
+            self.arx.atten1 = 4
+            self.assertEqual(self.arx.read_all().atten1, 4)
+        self.assertEqual(serial.state['ATTEN'], [15,4])
+
+    def test_pipeline_discard(self):
+        self.arx.atten0 = 15
+        with self.assertRaises(ValueError):
+            with self.arx.pipeline():
+                self.arx.atten0 = 3
+                self.arx.atten1 = 30
+        self.assertEqual(self.arx.atten0, 15, "Queued frames discarded")
+
+    def test_send_many(self):
+        resps = self.arx._send_many([(const.ATTEN_WRITE,0,4),
+                                     (const.ATTEN_READ,0),
+                                     (const.FILTER_READ,)])
+        self.assertEqual(resps[0], [const.ATTEN_WRITTEN])
+        self.assertEqual(resps[1], [4])
+        with self.assertRaises(IOError):
+            self.arx._send_many([(const.ATTEN_READ,0),(const.FEE_READ,7)])
+
+    def test_lost_response(self):
+        serial = self.arx.conn.serial
+        serial.state_read = False
+        serial.state.update(ATTEN=[3,9], FILTER=2)
+        serial.drop.append((const.ATTEN_READ,0))
+        state = self.arx.read_all()
+        self.assertEqual((state.atten0, state.atten1, state.filter), (3,9,2),
+                         "Later responses not shifted onto other commands")
+        self.assertEqual(serial.ready_count, 2, "READY again before resending")
+        self.assertEqual(serial.count(const.FILTER_READ), 2,
+                         "Whole burst resent")
+
+    def test_session_handshake(self):
+        serial = self.arx.conn.serial
+        self.arx.atten0
+        self.arx.atten1
+        self.assertEqual(serial.ready_count, 2, "One handshake per command")
+        with self.arx.session():
+            self.arx.atten0 = 3
+            self.arx.atten0
+            self.arx.filter
+        self.assertEqual(serial.ready_count, 3, "One handshake per session")
+        self.assertFalse(self.arx.conn.ready)
+
+    def test_session_recheck(self):
+        serial = self.arx.conn.serial
+        with self.arx.session():
+            self.arx.filter
+            with self.assertRaises(IOError):
+                self.arx._send(const.FEE_READ,7)
+            self.arx.filter
+            self.assertEqual(serial.ready_count, 2, "READY after error")
+            self.arx.conn.idle_timeout = -1
+            self.arx.filter
+            self.assertEqual(serial.ready_count, 3, "READY after idle")
+            self.arx.conn.idle_timeout = const.SESSION_IDLE_TIMEOUT
+            self.arx.conn.reconnect()
+            serial = self.arx.conn.serial
+            self.arx.filter
+            self.arx.filter
+            self.assertEqual(serial.ready_count, 1, "READY after reconnect")
+        self.assertEqual(self.arx.conn.conn_failure, 0)
+
+    def test_frame_reader(self):
+        serial = self.arx.conn.serial
+        serial.write(self.arx.conn._make_cmd(const.FILTER_READ) +
+                     self.arx.conn._make_cmd(const.ATTEN_READ,1))
+        self.assertEqual(self.arx.conn.read_response(), (const.kACK,[0]))
+        self.assertEqual(serial.in_waiting, 0, "Leftover bytes buffered")
+        self.assertEqual(self.arx.conn.read_response(), (const.kACK,[15]))
+        self.assertEqual(self.arx.conn.read_response(), None, "Timeout")
+
+    def test_frame_reader_deadline(self):
+        class Babble(object):
+            """Serial port that keeps sending bytes, but never a frame."""
+            timeout = 0.05
+            in_waiting = 1
+
+            def read(self, numberOfBytes):
+                return b'0'
+        with self.assertRaises(ConnError):
+            FrameReader(Babble()).read_response()
+
+    def test_cache(self):
+        arx = MockARX('/dev/usbtty0', cache_ttl=60)
+        serial = arx.conn.serial
+        self.assertEqual(arx.atten0, 15)
+        self.assertEqual(arx.atten0, 15)
+        self.assertEqual(serial.ready_count, 1, "Second read from cache")
+
+        arx.atten0 = 4
+        arx.power = [1,0,1,0]
+        count = serial.ready_count
+        self.assertEqual(arx.atten0, 4, "Write-through")
+        self.assertEqual(arx.power, [1,0,1,0], "Write-through")
+        self.assertEqual(serial.ready_count, count)
+
+        serial.state['ATTEN'][0] = 9
+        arx.invalidate('atten0')
+        self.assertEqual(arx.atten0, 9)
+        serial.state['FILTER'] = 2
+        arx.refresh()
+        count = serial.ready_count
+        self.assertEqual(arx.filter, 2)
+        self.assertEqual(serial.ready_count, count)
+
+    def test_cache_ttl(self):
+        arx = MockARX('/dev/usbtty0', cache_ttl={'filter': 60})
+        serial = arx.conn.serial
+        arx.filter
+        arx.filter
+        arx.atten0
+        arx.atten0
+        self.assertEqual(serial.ready_count, 3, "Only filter is cached")
+        arx.cache.ttl = 0
+        arx.filter = 1
+        self.assertEqual(arx.filter, 1)
+        self.assertEqual(serial.ready_count, 5, "Expired values are fetched")
+
+    def test_cache_expire_race(self):
+        class Racing(dict):
+            """Dict whose entries are dropped by another thread once read."""
+            def __getitem__(self, key):
+                value = dict.__getitem__(self, key)
+                del self[key]
+                return value
+        cache = StateCache(60)
+        cache._values = Racing(filter=(1, 0))
+        self.assertEqual(cache.lookup('filter'), (False, None))
+
+    def test_cache_pipeline(self):
+        arx = MockARX('/dev/usbtty0', cache_ttl=60)
+        with self.assertRaises(IOError):
+            with arx.pipeline():
+                arx.atten0 = 3
+                arx._queue.append((const.FEE_WRITE,9,1))
+        self.assertFalse(arx.cache.lookup('atten0')[0])
+        with arx.pipeline():
+            arx.atten1 = 3
+        self.assertEqual(arx.cache.lookup('atten1'), (True, 3))
+
+    def test_read_all(self):
+        serial = self.arx.conn.serial
+        state = self.arx.read_all()
+        self.assertEqual(state.fee, (0,0,0,0))
+        self.assertEqual((state.atten0, state.atten1), (15,15))
+        self.assertEqual(state.filter, 0)
+        self.assertEqual(state.eeprom_offset, 1)
+        self.assertEqual(serial.ready_count, 1, "Single session")
+        with self.assertRaises(AttributeError):
+            state.filter = 2
+
+    def test_apply(self):
+        state = self.arx.read_all()
+        target = state._replace(fee=(0,1,0,0), atten1=3)
+        self.assertEqual(self.arx.apply(target), ('fee', 'atten1'))
+        serial = self.arx.conn.serial
+        self.assertEqual(serial.state['FEE'], [0,1,0,0])
+        self.assertEqual(serial.state['ATTEN'], [15,3])
+        self.assertEqual(self.arx.apply(target), ())
+        self.assertEqual(self.arx.read_all().diff(target), ())
+
+    def test_make_cmd(self):
+        conn = self.arx.conn
+        frame = conn._make_cmd(const.ATTEN_WRITE,1,7)
+        self.assertEqual(frame, b'10,1|7;')
+        self.assertIs(frame, conn._make_cmd(const.ATTEN_WRITE,1,7),
+                      "Frame served from the prebuilt table")
+        self.assertEqual(conn._make_cmd(const.FLASH_WRITE), b'13;')
+        self.assertEqual(conn._make_cmd(const.FEE_READ,7), b'5,7;')
+        with self.assertRaises(TypeError):
+            conn._make_cmd(const.FEE_WRITE,1,2,3)
@@ -0,0 +1,153 @@
+import os
+
+import unittest2 as unittest
+
+from .mocks import MockACU
+from ARXControl import const
+
+try:
+    import asyncio
+    from ARXControl.aio import AsyncARX, AsyncConnection
+    from ARXControl.err import ConnError
+    from ARXControl.metrics import Metrics
+    from ARXControl.retry import RetryPolicy
+except (ImportError, SyntaxError):
+    AsyncARX = None
+
+
+class PipeACU(MockACU):
+    """
+    :class:`MockACU` with a file descriptor to register with the event loop:
+    the read end of a pipe that is never written to.
+    """
+
+    def __init__(self, tty=None, rate=None):
+        MockACU.__init__(self, tty, rate)
+        self._pipe = os.pipe()
+
+    def fileno(self):
+        return self._pipe[0]
+
+    def close(self):
+        MockACU.close(self)
+        for fd in self._pipe:
+            os.close(fd)
+        self._pipe = (None, None)
+
+
+if AsyncARX is not None:
+    class MockAsyncConnection(AsyncConnection):
+        """
+        Mocked version of :class:`AsyncConnection`.
+
+        Replaces :class:`Serial` with :class:`PipeACU`, and signals the
+        response as readable on the next loop iteration instead of when its
+        file descriptor is.
+        """
+        #: When True, the mock stops answering.
+        mute = False
+
+        def _connect(self, tty, rate):
+            return PipeACU(tty, rate)
+
+        def _write(self, data):
+            if not self.mute:
+                self.serial.write(data)
+                asyncio.get_running_loop().call_soon(self._on_readable)
+
+    class MockAsyncARX(AsyncARX):
+        def _connect(self, tty, rate):
+            return MockAsyncConnection(tty, rate)
+
+
+@unittest.skipIf(AsyncARX is None, "asyncio is not available")
+class TestAsyncARX(unittest.TestCase):
+    """
+    Testcase for the asyncio ARX Control interface.
+    """
+
+    def setUp(self):
+        self.arx = MockAsyncARX('/dev/usbtty0')
+        self.arx.conn.retry_policy = RetryPolicy(timeout=0.05)
+
+    def tearDown(self):
+        if self.arx.conn.serial._pipe[0] is not None:
+            self.arx.close()
+
+    def run_async(self, coro):
+        return asyncio.run(coro)
+
+    def test_properties(self):
+        async def run():
+            await self.arx.set_power([1,0,1,0])
+            await self.arx.set_atten0(3)
+            await self.arx.set_atten1(4)
+            await self.arx.set_filter(2)
+            return (await self.arx.power, await self.arx.atten0,
+                    await self.arx.atten1, await self.arx.filter)
+        self.assertEqual(self.run_async(run()), ([1,0,1,0], 3, 4, 2))
+        self.assertEqual(self.arx.conn.serial.ready_count, 1)
+
+    def test_read_all(self):
+        state = self.run_async(self.arx.read_all())
+        self.assertEqual(state.fee, (0,0,0,0))
+        self.assertEqual((state.atten0, state.atten1), (15,15))
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            self.run_async(self.arx.set_atten0(30))
+        with self.assertRaises(ValueError):
+            self.run_async(self.arx.set_power([1,1]))
+
+    def test_timeout(self):
+        async def run():
+            await self.arx.atten0
+            self.arx.conn.mute = True
+            with self.assertRaises(asyncio.TimeoutError):
+                await self.arx.get_atten0(timeout=0.01)
+            self.assertFalse(self.arx.conn.ready)
+            self.arx.conn.mute = False
+            return await self.arx.atten0
+        self.assertEqual(self.run_async(run()), 15)
+        self.assertEqual(self.arx.conn.serial.ready_count, 2)
+
+    def test_handshake_failure(self):
+        async def run():
+            self.arx.conn.mute = True
+            with self.assertRaises(ConnError):
+                await self.arx.atten0
+            self.arx.conn.mute = False
+            return await self.arx.atten0
+        self.assertEqual(self.run_async(run()), 15,
+                         "Retries are counted per handshake")
+
+    def test_lost_response(self):
+        self.arx.conn.metrics = Metrics()
+        serial = self.arx.conn.serial
+        serial.state.update(ATTEN=[3,9], FILTER=2)
+        serial.drop.append((const.ATTEN_READ,0))
+        state = self.run_async(self.arx.read_all())
+        self.assertEqual((state.atten0, state.atten1, state.filter), (3,9,2))
+        self.assertEqual(serial.ready_count, 2, "READY again before resending")
+        data = self.arx.conn.metrics.as_dict()
+        self.assertEqual(sum(data['timeouts'].values()), 1)
+        self.assertEqual(data['handshake']['count'], 1)
+
+    def test_close(self):
+        self.assertEqual(self.run_async(self.arx.atten0), 15)
+        self.assertEqual(self.run_async(self.arx.atten1), 15,
+                         "Moved to the new loop")
+        self.arx.close()
+        self.assertFalse(self.arx.conn._attached)
+
+    def test_cancel(self):
+        async def run():
+            self.arx.conn.mute = True
+            task = asyncio.ensure_future(self.arx.filter)
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.arx.conn.mute = False
+            return await self.arx.filter
+        self.assertEqual(self.run_async(run()), 0)
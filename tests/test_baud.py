@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+
+from .mocks import MockACU, MockARX, MockConnection
+from ARXControl import const
+from ARXControl.crc import CRC8
+from ARXControl.err import ConnError
+
+
+class BaudACU(MockACU):
+    """
+    :class:`MockACU` that only answers at :attr:`rate`, and drops part of
+    any burst at :attr:`flaky`, with :attr:`firmware_crc`.
+    """
+    rate = 57600
+    flaky = 115200
+    firmware_crc = None
+
+    def __init__(self, tty=None, rate=None):
+        MockACU.__init__(self, tty, rate)
+        self.crc = self.firmware_crc
+        self.baudrate = rate or const.BAUDRATE
+        self.probes = []
+
+    def write(self, inputstring):
+        self.probes.append((self.baudrate, inputstring.count(b';')))
+        if self.baudrate == self.flaky and inputstring.count(b';') > 1:
+            MockACU.write(self, inputstring[:len(inputstring) // 2])
+        elif self.baudrate in (self.rate, self.flaky):
+            MockACU.write(self, inputstring)
+        else:
+            self._resp_buffer += '~x'
+
+
+class BaudConnection(MockConnection):
+    def _connect(self, tty, rate):
+        return BaudACU(tty, rate)
+
+
+class BaudARX(MockARX):
+    def _connect(self, tty, rate):
+        return BaudConnection(tty, rate)
+
+
+class TestBaudNegotiation(unittest.TestCase):
+    """
+    Testcase for baud rate negotiation.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = os.path.join(self.tmp, 'cache', 'rates.json')
+        BaudConnection.rate_cache = self.cache
+
+    def tearDown(self):
+        del BaudConnection.rate_cache
+        shutil.rmtree(self.tmp)
+
+    def test_negotiate(self):
+        arx = BaudARX('/dev/usbtty0', const.AUTO_BAUD)
+        acu = arx.conn.serial
+        self.assertEqual(arx.conn.rate, 57600)
+        self.assertEqual(acu.baudrate, 57600)
+        self.assertEqual(acu.probes, [(115200, 1), (115200, 16),
+                                      (57600, 1), (57600, 16)])
+        with open(self.cache) as f:
+            self.assertEqual(list(json.load(f).values()), [57600])
+        arx.atten0 = 3
+        self.assertEqual(arx.atten0, 3)
+
+        arx = BaudARX('/dev/usbtty0', const.AUTO_BAUD)
+        self.assertEqual(arx.conn.rate, 57600)
+        self.assertEqual(arx.conn.serial.probes, [(57600, 1)],
+                         "Cached rate confirmed with one READY")
+
+    def test_fastest(self):
+        BaudACU.rate, BaudACU.flaky = 115200, None
+        try:
+            conn = BaudConnection('/dev/usbtty0', const.AUTO_BAUD)
+        finally:
+            BaudACU.rate, BaudACU.flaky = 57600, 115200
+        self.assertEqual(conn.rate, 115200)
+
+    def test_crc(self):
+        BaudACU.firmware_crc = CRC8
+        try:
+            arx = BaudARX('/dev/usbtty0', const.AUTO_BAUD, crc=8)
+        finally:
+            BaudACU.firmware_crc = None
+        self.assertEqual(arx.conn.rate, 57600)
+        self.assertEqual(arx.atten0, 15)
+
+    def test_no_rate(self):
+        with self.assertRaises(ConnError):
+            BaudConnection('/dev/usbtty0', const.AUTO_BAUD).negotiate(
+                [9600, 19200])
+
+    def test_fixed(self):
+        conn = BaudConnection('/dev/usbtty0', None)
+        self.assertEqual(conn.serial.probes, [])
+        self.assertFalse(os.path.exists(self.cache))
@@ -0,0 +1,64 @@
+import json
+import subprocess
+import sys
+
+import unittest2 as unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from .mocks import MockARX
+from ARXControl.cli import ScriptError, parse, run
+
+
+class TestCLI(unittest.TestCase):
+    """
+    Testcase for the arxctl batch mode.
+    """
+
+    def setUp(self):
+        self.arx = MockARX('/dev/usbtty0')
+
+    def run_script(self, text, keep_going=False):
+        out = StringIO()
+        failed = run(self.arx, parse(text), out, keep_going)
+        return failed, [json.loads(line) for line in out.getvalue().split('\n')
+                        if line]
+
+    def test_parse(self):
+        self.assertEqual(parse('power 1 0 1 0; atten0 5\n# all done\n'
+                               'filter 2;flash  # store'),
+                         [('power', [1, 0, 1, 0]), ('atten0', [5]),
+                          ('filter', [2]), ('flash', [])])
+        for bad in ['atten2 1', 'power 1 0', 'atten0 x', 'state 1']:
+            with self.assertRaises(ScriptError):
+                parse(bad)
+
+    def test_run(self):
+        failed, results = self.run_script(
+            'power 1 0 1 0; atten0 5; filter 2; flash; power; state')
+        self.assertEqual(failed, 0)
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(result['ok'] for result in results))
+        self.assertEqual(results[4]['value'], [1, 0, 1, 0])
+        self.assertEqual(results[5]['value']['atten0'], 5)
+        self.assertEqual(self.arx.conn.serial.ready_count, 1,
+                         "Single session")
+
+    def test_errors(self):
+        failed, results = self.run_script('atten0 20; atten1 3')
+        self.assertEqual(failed, 1)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['error'], 'ValueError')
+        failed, results = self.run_script('atten0 20; atten1 3',
+                                          keep_going=True)
+        self.assertEqual([result['ok'] for result in results], [False, True])
+
+    @unittest.skipIf(sys.version_info < (3, 7), "Needs lazy imports")
+    def test_lazy_imports(self):
+        code = ('import sys; from ARXControl.cli import parse; '
+                'parse("atten0 1"); print("serial" in sys.modules)')
+        out = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(out.strip(), b'False')
@@ -0,0 +1,138 @@
+import unittest2 as unittest
+
+from .mocks import MockACU, MockARX, MockConnection
+from ARXControl import const
+from ARXControl.crc import CRC8, CRC16
+from ARXControl.decoder import Decoder, parse
+from ARXControl.err import CheckError, ConnError
+from ARXControl.retry import RetryPolicy
+
+try:
+    from ARXControl import ARX
+    from ARXControl.sim import VirtualACU, Faults
+    import pty
+except ImportError:
+    pty = None
+
+
+class CorruptACU(MockACU):
+    """
+    :class:`MockACU` that flips a bit in its next :attr:`corrupt` responses.
+    """
+    corrupt = 0
+
+    def write(self, inputstring):
+        before = len(self._resp_buffer)
+        MockACU.write(self, inputstring)
+        if self.corrupt:
+            self.corrupt -= 1
+            resp = self._resp_buffer
+            self._resp_buffer = resp[:before] + chr(ord(resp[before]) ^ 1) + \
+                resp[before + 1:]
+
+
+class CorruptConnection(MockConnection):
+    def _connect(self, tty, rate):
+        return CorruptACU(tty, rate)
+
+
+class CorruptARX(MockARX):
+    def _connect(self, tty, rate):
+        return CorruptConnection(tty, rate)
+
+
+class TestCRC(unittest.TestCase):
+    """
+    Testcase for CRC-sealed frames.
+    """
+
+    def test_check_values(self):
+        self.assertEqual(CRC8(b'123456789'), 0xF4)
+        self.assertEqual(CRC16(b'123456789'), 0x29B1)
+
+    def test_seal(self):
+        self.assertEqual(CRC8.seal(b'10,0|5;'), b'10,0|5*C8;')
+        self.assertEqual(parse(b'10,0|5*C8;', CRC8), (10, [0, 5]))
+        self.assertEqual(parse(b'10,0|5*C8;'), (10, [0, 5]),
+                         "Trailer ignored without a CRC")
+        self.assertEqual(parse(b'10,0|4*C8;', CRC8), (const.kCRC_ERR, None))
+        self.assertEqual(parse(b'10,0|5;', CRC8), (const.kCRC_ERR, None),
+                         "Missing trailer")
+        sealed = CRC16.seal(b'2;')
+        self.assertEqual(len(sealed), len(b'2*0000;'))
+        self.assertEqual(parse(sealed, CRC16), (2, None))
+
+    def test_decoder(self):
+        decoder = Decoder(CRC8)
+        good = CRC8.seal(b'1,7;')
+        bad = bytearray(good)
+        bad[2] ^= 1
+        records = decoder.decode(good + bytes(bad) + good[:3])
+        self.assertEqual(records, [(1, [7]), (const.kCRC_ERR, None)])
+        self.assertEqual(decoder.decode(good[3:]), [(1, [7])])
+
+    def test_frames(self):
+        arx = MockARX('/dev/usbtty0', crc=8)
+        frame = arx.conn._make_cmd(const.ATTEN_WRITE, 0, 5)
+        self.assertEqual(frame, b'10,0|5*C8;')
+        self.assertIs(arx.conn._make_cmd(const.ATTEN_WRITE, 0, 5), frame,
+                      "Sealed frames are prebuilt")
+        self.assertEqual(arx.conn._make_cmd(99), CRC8.seal(b'99;'))
+        arx.conn.reconnect()
+        self.assertIs(arx.conn.reader.decoder.crc, CRC8)
+
+    def test_roundtrip(self):
+        arx = MockARX('/dev/usbtty0', crc=8)
+        arx.conn.serial.crc = CRC8
+        arx.power = [1,0,1,0]
+        arx.atten0 = 4
+        self.assertEqual(arx.power, [1,0,1,0])
+        self.assertEqual(arx.atten0, 4)
+        self.assertEqual(arx.conn.serial.state['ATTEN'], [4,15])
+
+    def test_mismatch(self):
+        arx = MockARX('/dev/usbtty0', crc=16)
+        arx.conn.serial.crc = CRC8
+        with self.assertRaises(ConnError):
+            arx.atten0 = 4
+
+    def test_retry(self):
+        arx = CorruptARX('/dev/usbtty0', crc=8)
+        acu = arx.conn.serial
+        acu.crc = CRC8
+        acu.ready_count = 0
+        with arx.session():
+            acu.corrupt = 2
+            arx.atten1 = 7
+        self.assertEqual(acu.state['ATTEN'][1], 7)
+        self.assertEqual(arx.atten1, 7)
+
+    def test_exhausted(self):
+        arx = CorruptARX('/dev/usbtty0', crc=8)
+        acu = arx.conn.serial
+        acu.crc = CRC8
+        with arx.session():
+            acu.corrupt = const.MAX_RETRIES * 4
+            with self.assertRaises(CheckError):
+                arx.atten1 = 7
+
+
+@unittest.skipIf(pty is None, "pseudo-terminals are not available")
+class TestVirtualCRC(unittest.TestCase):
+    """
+    Testcase for CRC-sealed frames through the virtual ACU.
+    """
+
+    def test_corrupt(self):
+        faults = Faults(corrupt=0.3, seed=3)
+        with VirtualACU(faults=faults, crc=CRC16) as acu:
+            arx = ARX(acu.port, crc=16,
+                      retry_policy=RetryPolicy(timeout=0.2))
+            for i in range(8):
+                arx.atten0 = i
+                self.assertEqual(acu.firmware.state['ATTEN'][0], i)
+            arx.conn.serial.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import unittest2 as unittest
+
+from .mocks import MockARX
+from ARXControl import const
+from ARXControl.daemon import ARXDaemon, Dispatcher, RemoteARX
+
+
+class SlowARX(object):
+    """Stand-in for :class:`ARX` that counts and slows down transactions."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _send_many(self, cmds):
+        self.calls.append(cmds)
+        time.sleep(0.05)
+        return [[len(self.calls)] for cmd in cmds]
+
+
+class TestDaemon(unittest.TestCase):
+    """
+    Testcase for the ARX daemon and its client.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'arxd.sock')
+        self.arx = MockARX('/dev/usbtty0')
+        self.daemon = ARXDaemon(self.arx, self.path).start()
+
+    def tearDown(self):
+        self.daemon.stop()
+        shutil.rmtree(self.tmp)
+
+    def test_remote(self):
+        remote = RemoteARX(self.path)
+        remote.power = [1,0,1,0]
+        remote.atten0 = 4
+        self.assertEqual(remote.power, [1,0,1,0])
+        self.assertEqual(remote.atten0, 4)
+        self.assertEqual(remote.read_all().fee, (1,0,1,0))
+        self.assertEqual(self.arx.conn.serial.ready_count, 1,
+                         "Daemon keeps one session")
+        with self.assertRaises(IOError):
+            remote._send(const.FEE_READ,7)
+        with self.assertRaises(ValueError):
+            remote.atten0 = 30
+        self.assertEqual(remote.atten0, 4)
+        remote.close()
+
+    def test_many_clients(self):
+        clients = [RemoteARX(self.path) for i in range(4)]
+        errors = []
+
+        def work(n, remote):
+            try:
+                for i in range(5):
+                    remote.atten1 = n
+                    remote.filter
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=work, args=(n, remote))
+                   for n, remote in enumerate(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        for remote in clients:
+            remote.close()
+
+    def test_coalesce(self):
+        arx = SlowARX()
+        dispatcher = Dispatcher(arx)
+        results = []
+
+        go = threading.Event()
+
+        def read():
+            go.wait()
+            results.append(dispatcher.execute([(const.ATTEN_READ,0)]))
+        threads = [threading.Thread(target=read) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        go.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(arx.calls), 1, "Concurrent reads coalesced")
+        self.assertEqual(results, [[[1]]] * 5)
+        dispatcher.execute([(const.ATTEN_WRITE,0,1)])
+        dispatcher.execute([(const.ATTEN_WRITE,0,1)])
+        self.assertEqual(len(arx.calls[-2:]), 2, "Writes never coalesced")
+
+    def test_capabilities(self):
+        self.assertEqual(self.arx.conn.capabilities,
+                         frozenset([const.STATE_READ]))
+        remote = RemoteARX(self.path)
+        self.assertEqual(remote.conn.capabilities,
+                         frozenset([const.STATE_READ]))
+        acu = self.arx.conn.serial
+        count = acu.count(const.STATE_READ)
+        self.assertEqual(remote.read_all().fee, (0,0,0,0))
+        self.assertEqual(acu.count(const.STATE_READ), count + 1,
+                         "Remote read_all uses STATE_READ")
+        remote.close()
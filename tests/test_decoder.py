@@ -0,0 +1,47 @@
+import unittest2 as unittest
+
+from ARXControl import const
+from ARXControl.decoder import Decoder, parse
+
+
+class TestDecoder(unittest.TestCase):
+    """
+    Testcase for the streaming ACU frame decoder.
+    """
+
+    def setUp(self):
+        self.decoder = Decoder()
+
+    def test_parse(self):
+        self.assertEqual(parse('1,0;'), (const.kACK, [0]))
+        self.assertEqual(parse(b'10,1|7;'), (const.ATTEN_WRITE, [1, 7]))
+        self.assertEqual(parse('2,READY;'), (const.kREADY, ['READY']))
+        self.assertEqual(parse('13;'), (const.FLASH_WRITE, None))
+        for junk in ['', ';', 'READY;', '1x,0;']:
+            with self.assertRaises(ValueError):
+                parse(junk)
+
+    def test_split_frames(self):
+        self.assertEqual(self.decoder.decode(b'1,1'), [])
+        self.assertEqual(self.decoder.decode(bytearray(b'5;2,RE')),
+                         [(const.kACK, [15])])
+        self.assertEqual(self.decoder.decode(memoryview(b'ADY;')),
+                         [(const.kREADY, ['READY'])])
+        self.assertEqual(len(self.decoder), 0)
+
+    def test_merged_frames(self):
+        records = self.decoder.decode(b'1,0;1,1;3,Atten selection is out '
+                                      b'of range;1;')
+        self.assertEqual(records, [(const.kACK, [0]), (const.kACK, [1]),
+                                   (const.kERR, [const.ATTEN_RANGE]),
+                                   (const.kACK, None)])
+
+    def test_resync(self):
+        records = self.decoder.decode(b'\r\n\x00zz1,4;xx5yy;1,5;')
+        self.assertEqual(records, [(const.kACK, [4]), (const.kACK, [5])])
+        self.assertEqual(self.decoder.discarded, 11)
+        self.assertEqual(self.decoder.decode(b'junk;'), [])
+        self.assertEqual(self.decoder.decode(b'1,6;'), [(const.kACK, [6])])
+        self.assertEqual(self.decoder.decode(b'x' * (const.BUFFER_SIZE + 1)),
+                         [])
+        self.assertEqual(len(self.decoder), 0, "Unterminated junk dropped")
@@ -0,0 +1,210 @@
+import threading
+import time
+
+import unittest2 as unittest
+
+from .mocks import MockACU, MockARX, MockConnection
+from ARXControl import const
+from ARXControl.connection import DuplexReader, FrameReader
+from ARXControl.retry import RetryPolicy
+
+try:
+    from ARXControl import ARX
+    from ARXControl.sim import VirtualACU, Faults
+    import pty
+except ImportError:
+    pty = None
+
+
+class DuplexACU(MockACU):
+    """
+    :class:`MockACU` that can be read from another thread, and holds back
+    the responses to its next :attr:`hold` writes for :attr:`late` seconds.
+    """
+    hold = 0
+    late = 0.1
+
+    def __init__(self, tty=None, rate=None):
+        MockACU.__init__(self, tty, rate)
+        self._buffer_lock = threading.Lock()
+
+    def read(self, numberOfBytes):
+        with self._buffer_lock:
+            return MockACU.read(self, numberOfBytes)
+
+    def write(self, inputstring):
+        with self._buffer_lock:
+            before = len(self._resp_buffer)
+            MockACU.write(self, inputstring)
+            if not self.hold:
+                return
+            self.hold -= 1
+            held = self._resp_buffer[before:]
+            self._resp_buffer = self._resp_buffer[:before]
+        timer = threading.Timer(self.late, self.send, (held,))
+        timer.daemon = True
+        timer.start()
+
+    def send(self, data):
+        """Queues `data` for reading."""
+        with self._buffer_lock:
+            self._resp_buffer += data
+
+
+class DuplexConnection(MockConnection):
+    def _connect(self, tty, rate):
+        return DuplexACU(tty, rate)
+
+
+class DuplexARX(MockARX):
+    def _connect(self, tty, rate):
+        return DuplexConnection(tty, rate)
+
+
+def wait_for(condition, timeout=1.):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class TestDuplex(unittest.TestCase):
+    """
+    Testcase for full-duplex connections.
+    """
+
+    def setUp(self):
+        self.arx = DuplexARX('/dev/usbtty0', duplex=True,
+                             retry_policy=RetryPolicy(timeout=0.05))
+        self.acu = self.arx.conn.serial
+        self.acu.state['ATTEN'] = [3, 9]
+
+    def tearDown(self):
+        self.arx.close()
+
+    def test_roundtrip(self):
+        reader = self.arx.conn.reader
+        self.assertIsInstance(reader, DuplexReader)
+        self.arx.power = [1,0,1,0]
+        self.arx.filter = 2
+        self.assertEqual(self.arx.power, [1,0,1,0])
+        self.assertEqual(self.arx.read_all().atten1, 9)
+        self.assertEqual(reader.inflight, 0)
+        self.arx.close()
+        self.assertFalse(reader._thread.is_alive())
+
+    def test_pipeline(self):
+        with self.arx.session():
+            with self.arx.pipeline():
+                for i in range(16):
+                    self.arx.atten0 = i
+                self.arx.filter = 1
+            self.assertEqual(self.acu.state['ATTEN'], [15, 9])
+            self.assertEqual(self.arx.filter, 1)
+
+    def test_late_retry(self):
+        self.acu.late = 0.08
+        with self.arx.session():
+            self.acu.hold = 1
+            self.assertEqual(self.arx.atten0, 3)
+            self.assertEqual(self.arx.atten1, 9)
+        self.assertEqual(self.arx.conn.reader.unsolicited, 0)
+
+    def test_late_response(self):
+        self.arx.conn.retry_policy = RetryPolicy(timeout_retries=1,
+                                                 timeout=0.05)
+        self.acu.late = 0.15
+        with self.arx.session():
+            self.acu.hold = 1
+            with self.assertRaises(IOError):
+                self.arx.atten0
+            # The late response is matched to the command that timed out,
+            # not to the next one.
+            self.assertEqual(self.arx.atten1, 9)
+            self.assertEqual(self.arx.atten0, 3)
+        self.assertEqual(self.arx.conn.reader.unsolicited, 0)
+
+    def test_lost_response(self):
+        reader = self.arx.conn.reader
+        reader.late_timeout = 0.1
+        self.acu.state['FILTER'] = 2
+        with self.arx.session():
+            self.acu.drop.append((const.FILTER_READ,))
+            self.assertEqual(self.arx.filter, 2)
+            self.assertEqual(self.arx.atten1, 9)
+        self.assertEqual(reader.inflight, 0)
+        self.assertEqual(self.acu.count(const.FILTER_READ), 2)
+
+    def test_wait_unlocked(self):
+        self.arx.conn.retry_policy = RetryPolicy(timeout=0.5)
+        self.acu.late = 0.2
+        results = []
+        with self.arx.session():
+            self.acu.hold = 1
+            thread = threading.Thread(
+                target=lambda: results.append(self.arx.atten0))
+            thread.start()
+            self.assertTrue(wait_for(
+                lambda: self.acu.count(const.ATTEN_READ) == 1))
+            start = time.time()
+            self.arx._io(lambda: None)
+            self.assertLess(time.time() - start, 0.1,
+                            "Connection free while the response is awaited")
+            thread.join()
+        self.assertEqual(results, [3])
+
+    def test_silent_probe(self):
+        # Firmware that ignores STATE_READ instead of rejecting it.
+        self.acu.responses[const.STATE_READ] = lambda args: ''
+        start = time.time()
+        self.assertEqual(self.arx.atten1, 9)
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(self.arx.conn.capabilities, frozenset())
+        self.assertEqual(self.arx.conn.reader.inflight, 0)
+
+    def test_unsolicited(self):
+        reader = self.arx.conn.reader
+        self.acu.send('1,5;')
+        reader.wake()
+        self.assertTrue(wait_for(lambda: reader.unsolicited == 1))
+        self.assertEqual(self.arx.atten1, 9)
+
+    def test_reconnect(self):
+        reader = self.arx.conn.reader
+        self.arx.conn.reconnect()
+        self.assertFalse(reader._thread.is_alive())
+        self.assertIsInstance(self.arx.conn.reader, DuplexReader)
+        self.arx.conn.serial.state['ATTEN'] = [3, 9]
+        self.assertEqual(self.arx.atten1, 9)
+
+    def test_disable(self):
+        reader = self.arx.conn.reader
+        self.arx.conn.duplex = False
+        self.assertFalse(reader._thread.is_alive())
+        self.assertIsInstance(self.arx.conn.reader, FrameReader)
+        self.assertEqual(self.arx.atten1, 9)
+
+
+@unittest.skipIf(pty is None, "pseudo-terminals are not available")
+class TestVirtualDuplex(unittest.TestCase):
+    """
+    Testcase for full-duplex connections through the virtual ACU.
+    """
+
+    def test_roundtrip(self):
+        with VirtualACU(faults=Faults(garbage=0.3, seed=2)) as acu:
+            arx = ARX(acu.port, duplex=True)
+            with arx.session():
+                for i in range(16):
+                    arx.atten1 = i
+                    self.assertEqual(arx.atten1, i)
+                with arx.pipeline():
+                    arx.power = [0,1,1,0]
+                    arx.atten0 = 7
+            self.assertEqual(acu.firmware.state['FEE'], [0,1,1,0])
+            self.assertEqual(acu.firmware.state['ATTEN'], [7,15])
+            arx.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import unittest2 as unittest
+
+from .mocks import MockACU, MockARX, MockConnection
+from ARXControl.fleet import ARXFleet
+from ARXControl.metrics import Metrics
+from ARXControl.retry import AdaptiveRetryPolicy
+
+
+class SlowACU(MockACU):
+    """:class:`MockACU` that takes `DELAY` seconds to answer each write."""
+    DELAY = 0.05
+
+    def write(self, inputstring):
+        time.sleep(self.DELAY)
+        MockACU.write(self, inputstring)
+
+
+class SlowConnection(MockConnection):
+    def _connect(self, tty, rate):
+        return SlowACU(tty, rate)
+
+
+class SlowARX(MockARX):
+    def _connect(self, tty, rate):
+        return SlowConnection(tty, rate)
+
+
+class MockFleet(ARXFleet):
+    def _connect(self, tty, rate):
+        if tty == '/dev/missing':
+            raise IOError("No such device")
+        return MockARX(tty, rate)
+
+
+class KwargsFleet(ARXFleet):
+    """:class:`ARXFleet` that connects slowly and counts connections."""
+
+    def __init__(self, *args, **kwargs):
+        ARXFleet.__init__(self, *args, **kwargs)
+        self.connects = []
+
+    def _connect(self, tty, rate):
+        self.connects.append(tty)
+        time.sleep(SlowACU.DELAY)
+        return MockARX(tty, rate, **self._kwargs(tty))
+
+
+class TestARXFleet(unittest.TestCase):
+    """
+    Testcase for the ARX fleet controller.
+    """
+
+    def test_set_get(self):
+        with MockFleet(['/dev/tty0', '/dev/tty1']) as fleet:
+            results = fleet.set('atten0', 4)
+            self.assertTrue(all(res.ok for res in results.values()))
+            results = fleet.get('atten0')
+            self.assertEqual(list(results), ['/dev/tty0', '/dev/tty1'])
+            self.assertEqual([res.value for res in results.values()], [4,4])
+
+    def test_errors(self):
+        with MockFleet(['/dev/tty0', '/dev/missing']) as fleet:
+            results = fleet.set('filter', 1)
+            self.assertTrue(results['/dev/tty0'].ok)
+            self.assertIsInstance(results['/dev/missing'].error, IOError)
+            results = fleet.set('filter', 9)
+            self.assertIsInstance(results['/dev/tty0'].error, ValueError)
+
+    def test_snapshots(self):
+        with MockFleet([('/dev/tty0', None), '/dev/tty1']) as fleet:
+            states = fleet.read_all()
+            target = dict((name, res.value._replace(atten1=2))
+                          for name, res in states.items())
+            del target['/dev/tty1']
+            results = fleet.apply(target)
+            self.assertEqual(results['/dev/tty0'].value, ('atten1',))
+            self.assertEqual(list(results), ['/dev/tty0'])
+
+    def test_concurrent(self):
+        units = [SlowARX('/dev/tty%d' % i) for i in range(8)]
+        with ARXFleet(units) as fleet:
+            start = time.time()
+            results = fleet.set('power', 1)
+            elapsed = time.time() - start
+        self.assertTrue(all(res.ok for res in results.values()))
+        # Handshake and write for one unit takes 2 * DELAY.
+        self.assertLess(elapsed, 8 * SlowACU.DELAY)
+
+    def test_kwargs(self):
+        metrics = Metrics({'site': 'lwa1'})
+        policy = AdaptiveRetryPolicy()
+        with KwargsFleet(['/dev/tty0', '/dev/tty1'], metrics=metrics,
+                         retry_policy=policy) as fleet:
+            fleet.get('filter')
+            arx0, arx1 = fleet.units.values()
+        self.assertIsNot(arx0.metrics, arx1.metrics)
+        self.assertIsNot(arx0.metrics, metrics)
+        self.assertEqual(arx0.metrics.labels,
+                         {'site': 'lwa1', 'tty': '/dev/tty0'})
+        self.assertEqual(metrics.labels, {'site': 'lwa1'})
+        self.assertEqual(metrics.bytes_sent, 0)
+        self.assertGreater(arx1.metrics.bytes_sent, 0)
+        self.assertIsNot(arx0.conn.retry_policy, arx1.conn.retry_policy)
+        self.assertIsNot(arx0.conn.retry_policy, policy)
+
+    def test_connect_once(self):
+        with KwargsFleet(['/dev/tty0', '/dev/tty1']) as fleet:
+            threads = [threading.Thread(target=fleet.get, args=('filter',))
+                       for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(sorted(fleet.connects), ['/dev/tty0', '/dev/tty1'])
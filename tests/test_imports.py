@@ -0,0 +1,31 @@
+import os
+import pkgutil
+import subprocess
+import sys
+
+import unittest2 as unittest
+
+import ARXControl
+
+
+class TestImports(unittest.TestCase):
+    """
+    Testcase for importing each submodule first, as scripts and the
+    documentation build do.
+    """
+
+    def test_submodules(self):
+        root = os.path.dirname(os.path.dirname(ARXControl.__file__))
+        for _, name, _ in pkgutil.iter_modules(ARXControl.__path__):
+            module = 'ARXControl.%s' % name
+            proc = subprocess.Popen([sys.executable, '-c',
+                                     'import %s' % module],
+                                    cwd=root, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+            out, err = proc.communicate()
+            err = err.decode('utf-8', 'replace')
+            self.assertEqual(proc.returncode, 0, "%s: %s" % (module, err))
+
+
+if __name__ == '__main__':
+    unittest.main()
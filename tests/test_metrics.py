@@ -0,0 +1,54 @@
+import unittest2 as unittest
+
+from .mocks import MockARX
+from ARXControl import const
+from ARXControl.metrics import Metrics, NULL_METRICS
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Testcase for per-command metrics.
+    """
+
+    def setUp(self):
+        self.metrics = Metrics({'tty': '/dev/usbtty0'})
+        self.arx = MockARX('/dev/usbtty0', metrics=self.metrics)
+
+    def test_disabled(self):
+        arx = MockARX('/dev/usbtty0')
+        self.assertIs(arx.metrics, NULL_METRICS)
+        arx.power
+        self.assertEqual(arx.metrics.as_dict(), {})
+
+    def test_as_dict(self):
+        self.arx.power
+        self.arx.atten0 = 3
+        with self.assertRaises(IOError):
+            self.arx._send(const.FEE_READ,7)
+        data = self.metrics.as_dict()
+        self.assertEqual(data['latency']['FEE_READ']['count'], 4 + 3)
+        self.assertEqual(data['latency']['ATTEN_WRITE']['count'], 1)
+        self.assertEqual(data['nacks'], {'FEE_READ': 3})
+        self.assertEqual(data['retries'], {'FEE_READ': 2})
+        self.assertEqual(data['handshake']['count'], 3)
+        # The first handshake also probes for STATE_READ.
+        self.assertEqual(data['bytes_sent'], 3 * 2 + 3 + 4 * 4 + 7 + 3 * 4)
+        self.assertEqual(data['bytes_received'], 3 * 8 +
+                         len('1,0|0|0|0|15|15|0|1;') + 4 * 4 +
+                         len('1,%s;' % const.ATTEN_WRITTEN) +
+                         3 * len('3,%s;' % const.FEE_RANGE))
+        self.assertEqual(self.arx.check_error, 3)
+
+    def test_prometheus(self):
+        self.arx.filter
+        text = self.metrics.to_prometheus()
+        self.assertIn('arx_command_latency_seconds_count{command="FILTER_READ",'
+                      'tty="/dev/usbtty0"} 1', text)
+        self.assertIn('arx_command_latency_seconds_bucket{command="FILTER_READ",'
+                      'le="+Inf",tty="/dev/usbtty0"} 1', text)
+        self.assertIn('arx_handshake_seconds_count{tty="/dev/usbtty0"} 1', text)
+        self.assertIn('arx_bytes_sent_total{tty="/dev/usbtty0"} 7', text)
+        self.arx.read_all()
+        self.assertIn('command="STATE_READ"', self.metrics.to_prometheus())
+        self.assertEqual(
+            self.metrics.as_dict()['latency']['STATE_READ']['count'], 1)
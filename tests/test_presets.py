@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+
+from .mocks import MockARX
+from ARXControl import const
+from ARXControl.presets import PresetManager, SLOTS
+
+
+class TestPresets(unittest.TestCase):
+    """
+    Testcase for presets stored in EEPROM slots.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.index = os.path.join(self.tmp, 'presets.json')
+        self.arx = MockARX('/dev/usbtty0', cache_ttl=60)
+        self.acu = self.arx.conn.serial
+        self.presets = PresetManager(self.arx, self.index)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_firmware(self):
+        self.arx.atten0 = 4
+        self.arx.write_flash()
+        self.arx.eeprom_offset = 2
+        self.arx.atten0 = 9
+        self.arx.eeprom_offset = 1
+        self.assertEqual(self.acu.state['ATTEN'][0], 4, "Slot loaded")
+        self.arx.eeprom_offset = 3
+        self.assertEqual(self.acu.state['ATTEN'][0], 4, "Empty slot")
+
+    def test_store_recall(self):
+        base = self.arx.read_all()
+        night = base._replace(fee=(1,1,1,1), atten0=5, filter=2)
+        day = base._replace(atten0=12, atten1=3)
+        self.assertEqual(self.presets.store('night', night), 1)
+        self.assertEqual(self.presets.store('day', day), 2)
+        self.assertEqual(self.presets.names(), ['day', 'night'])
+
+        self.acu.ready_count = 0
+        del self.acu.sent[:]
+        state = self.presets.recall('night')
+        self.assertEqual([cmd for cmd, args in self.acu.sent],
+                         [const.ACU_READY, const.EEPROM_WRITE])
+        self.assertEqual(self.acu.state['FEE'], [1,1,1,1])
+        self.assertEqual(self.acu.state['ATTEN'], [5, 15])
+        self.assertEqual(self.arx.filter, 2, "Cache updated")
+        self.assertEqual(len(self.acu.sent), 2)
+        self.assertEqual(state.diff(self.arx.read_all()), ())
+        self.presets.recall('day', verify=True)
+        self.assertEqual(self.acu.state['ATTEN'], [12, 3])
+
+    def test_index(self):
+        self.presets.store('a')
+        other = PresetManager(MockARX('/dev/usbtty0'), self.index)
+        self.assertIn('a', other)
+        self.assertEqual(other.free_slots(), list(SLOTS[1:]))
+        other.delete('a')
+        self.assertEqual(self.presets.names(), [])
+        with self.assertRaises(KeyError):
+            self.presets.recall('a')
+        with self.assertRaises(ValueError):
+            self.presets.store('b', slot=0)
+
+    def test_slots(self):
+        self.assertEqual(SLOTS, tuple(range(1, 16)))
+        self.arx.eeprom_offset = SLOTS[-1]
+        self.assertEqual(self.acu.state['EEPROM'], SLOTS[-1])
+        for offset in (0, SLOTS[-1] + 1):
+            with self.assertRaises(ValueError):
+                self.arx.eeprom_offset = offset
+            with self.assertRaises(IOError):
+                self.arx._send(const.EEPROM_WRITE, offset)
+
+    def test_verify(self):
+        self.presets.store('a', self.arx.read_all()._replace(atten1=2))
+        self.acu.eeprom.clear()
+        self.arx.atten1 = 9
+        with self.assertRaises(IOError):
+            self.presets.recall('a', verify=True)
@@ -0,0 +1,138 @@
+import time
+
+import unittest2 as unittest
+
+from .mocks import MockACU, MockARX, MockConnection
+from ARXControl import const
+from ARXControl.err import ConnError
+from ARXControl.metrics import NULL_METRICS
+from ARXControl.retry import Burst, RetryPolicy, AdaptiveRetryPolicy
+
+
+class MuteARX(MockARX):
+    """:class:`MockARX` whose ACU drops the first `mute` frames."""
+    mute = 0
+
+    def _initialize(self):
+        serial = self.conn.serial
+        write = serial.write
+
+        def muted_write(inputstring):
+            if self.mute:
+                self.mute -= 1
+                return
+            write(inputstring)
+        serial.write = muted_write
+
+
+class SlowACU(MockACU):
+    """
+    :class:`MockACU` whose responses arrive :attr:`latency` seconds after
+    each write, all at once.
+    """
+    latency = 0.
+    timeout = None
+
+    def write(self, inputstring):
+        self._arrival = time.time() + self.latency
+        MockACU.write(self, inputstring)
+
+    @property
+    def in_waiting(self):
+        if time.time() < self._arrival:
+            return 0
+        return MockACU.in_waiting.fget(self)
+
+    def read(self, numberOfBytes):
+        wait = self._arrival - time.time()
+        if wait > 0:
+            if wait > (self.timeout or 0):
+                time.sleep(self.timeout or 0)
+                return ''
+            time.sleep(wait)
+        return MockACU.read(self, numberOfBytes)
+
+
+class SlowConnection(MockConnection):
+    def _connect(self, tty, rate):
+        return SlowACU(tty, rate)
+
+
+class SlowARX(MockARX):
+    def _connect(self, tty, rate):
+        return SlowConnection(tty, rate)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """
+    Testcase for the retry and timeout policies.
+    """
+
+    def test_default(self):
+        policy = RetryPolicy()
+        self.assertEqual(policy.get_timeout(), const.TIMEOUT)
+        self.assertEqual(policy.delay(1), 0)
+        self.assertTrue(policy.should_retry(2, 2))
+        self.assertFalse(policy.should_retry(const.MAX_RETRIES, 0))
+        self.assertFalse(policy.should_retry(0, const.MAX_RETRIES))
+
+    def test_adaptive_timeout(self):
+        policy = AdaptiveRetryPolicy(min_timeout=0.001, max_timeout=1)
+        self.assertEqual(policy.get_timeout(), const.TIMEOUT)
+        for i in range(20):
+            policy.record_rtt(0.01)
+        self.assertLess(policy.get_timeout(), 0.05, "Healthy link fails fast")
+        timeout = policy.get_timeout()
+        policy.record_timeout()
+        self.assertAlmostEqual(policy.get_timeout(), 2 * timeout)
+        for i in range(10):
+            policy.record_timeout()
+        self.assertEqual(policy.get_timeout(), 1)
+
+    def test_backoff(self):
+        policy = AdaptiveRetryPolicy(backoff=0.01, max_backoff=0.03)
+        for attempt in range(1, 6):
+            delay = policy.delay(attempt)
+            self.assertTrue(0 <= delay <= min(0.03, 0.01 * 2 ** (attempt-1)))
+
+    def test_burst_rtt(self):
+        policy = AdaptiveRetryPolicy(timeout=0.5, min_timeout=0.01)
+        arx = SlowARX('/dev/usbtty0', retry_policy=policy)
+        arx.conn.serial.latency = 0.04
+        with arx.session():
+            for i in range(5):
+                self.assertEqual(arx.power, [0,0,0,0])
+        self.assertGreater(policy.srtt, 0.035,
+                           "Sampled from the write, not per frame")
+
+    def test_karn(self):
+        policy = AdaptiveRetryPolicy(timeout=0.1, min_timeout=0.01)
+        burst = Burst([(const.FILTER_READ,)], policy, NULL_METRICS)
+        burst.begin()
+        policy.record_timeout()
+        burst.feed(None)
+        burst.end()
+        timeout = policy.get_timeout()
+        burst.begin()
+        burst.feed((const.kACK, [0]))
+        self.assertEqual(policy.get_timeout(), timeout,
+                         "Retransmission not sampled")
+        burst = Burst([(const.FILTER_READ,)], policy, NULL_METRICS)
+        burst.begin()
+        burst.feed((const.kACK, [0]))
+        self.assertLess(policy.get_timeout(), timeout)
+
+    def test_separate_budgets(self):
+        arx = MuteARX('/dev/usbtty0',
+                      retry_policy=RetryPolicy(nack_retries=1, timeout=0))
+        with self.assertRaises(IOError):
+            arx._send(const.FEE_READ,7)
+        self.assertEqual(arx.atten0, 15)
+
+        arx.mute = 2
+        self.assertEqual(arx.atten0, 15, "Recovers from silence")
+        self.assertEqual(arx.conn.conn_failure, 0)
+        arx.mute = 3
+        with self.assertRaises(ConnError):
+            arx.atten0
+        self.assertEqual(arx.atten0, 15)
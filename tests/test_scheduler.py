@@ -0,0 +1,94 @@
+import threading
+
+import unittest2 as unittest
+
+from .mocks import MockARX
+from ARXControl.err import QueueFull
+from ARXControl.metrics import Metrics
+from ARXControl.scheduler import CommandScheduler, READ, TELEMETRY, WRITE
+
+
+class TestScheduler(unittest.TestCase):
+    """
+    Testcase for the prioritized command scheduler.
+    """
+
+    def setUp(self):
+        self.scheduler = CommandScheduler(maxsize=4, metrics=Metrics())
+        self.release = threading.Event()
+        # Keeps the worker busy so that the following items queue up.
+        self.blocker = self.scheduler.submit(self.release.wait)
+
+    def tearDown(self):
+        self.release.set()
+        self.scheduler.close()
+
+    def test_priority(self):
+        order = []
+        futures = [self.scheduler.submit(order.append, name, priority=prio)
+                   for name, prio in [('poll0', TELEMETRY), ('read', READ),
+                                      ('poll1', TELEMETRY), ('write', WRITE)]]
+        self.release.set()
+        for future in futures:
+            future.result()
+        self.assertEqual(order, ['write', 'read', 'poll0', 'poll1'])
+        waits = self.scheduler.metrics.as_dict()['queue_wait']
+        self.assertEqual(waits['telemetry']['count'], 2)
+        self.assertEqual(waits['write']['count'], 1)
+        self.assertGreater(self.scheduler.max_wait, 0)
+
+    def test_bounded(self):
+        for i in range(4):
+            self.scheduler.submit(len, ())
+        self.assertEqual(self.scheduler.depth, 4)
+        with self.assertRaises(QueueFull):
+            self.scheduler.submit(len, (), timeout=0.01)
+
+    def test_error(self):
+        future = self.scheduler.submit(int, 'x')
+        self.release.set()
+        with self.assertRaises(ValueError):
+            future.result()
+        self.assertEqual(self.scheduler.call(int, '3'), 3)
+
+
+class TestThreadedARX(unittest.TestCase):
+    """
+    Testcase for sharing one ARX between threads.
+    """
+
+    def run_threads(self, arx):
+        errors = []
+
+        def work(n):
+            try:
+                for i in range(20):
+                    arx.atten0 = n
+                    with arx.pipeline():
+                        arx.atten1 = n
+                        arx.filter = n % 3
+                    self.assertEqual(len(arx.power), 4)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(arx.check_error, 0)
+        self.assertEqual(arx.conn_failure, 0)
+
+    def test_locked(self):
+        self.run_threads(MockARX('/dev/usbtty0'))
+
+    def test_scheduled(self):
+        arx = MockARX('/dev/usbtty0', queue_depth=4)
+        self.run_threads(arx)
+        with arx.session():
+            arx.atten0 = 3
+            with arx.priority(TELEMETRY):
+                self.assertEqual(arx.atten0, 3)
+        self.assertEqual(arx.conn.serial.ready_count, 8 * 60 + 1)
+        arx.close()
+        self.assertFalse(arx.scheduler._thread.is_alive())
@@ -0,0 +1,59 @@
+import time
+
+import unittest2 as unittest
+
+from ARXControl import ARX
+from ARXControl.retry import RetryPolicy
+
+try:
+    from ARXControl.sim import VirtualACU, Faults
+    import pty
+except ImportError:
+    pty = None
+
+
+@unittest.skipIf(pty is None, "pseudo-terminals are not available")
+class TestVirtualACU(unittest.TestCase):
+    """
+    Testcase for the pty-backed virtual ACU, through the real serial path.
+    """
+
+    def test_roundtrip(self):
+        with VirtualACU() as acu:
+            arx = ARX(acu.port)
+            arx.power = [1,0,1,0]
+            arx.atten0 = 4
+            self.assertEqual(arx.power, [1,0,1,0])
+            self.assertEqual(arx.atten0, 4)
+            self.assertEqual(acu.firmware.state['ATTEN'], [4,15])
+            state = arx.read_all()
+            self.assertEqual(state.fee, (1,0,1,0))
+            arx.conn.serial.close()
+
+    def test_unknown_command(self):
+        with VirtualACU() as acu:
+            arx = ARX(acu.port)
+            with self.assertRaises(IOError):
+                arx._send(99)
+            arx.conn.serial.close()
+
+    def test_garbage(self):
+        with VirtualACU(faults=Faults(garbage=0.5, seed=1)) as acu:
+            arx = ARX(acu.port)
+            for i in range(16):
+                arx.atten1 = i
+                self.assertEqual(arx.atten1, i)
+            arx.conn.serial.close()
+
+    def test_slow(self):
+        faults = Faults(delay=0.2)
+        with VirtualACU(faults=faults) as acu:
+            arx = ARX(acu.port, retry_policy=RetryPolicy(timeout=0.05))
+            with self.assertRaises(Exception):
+                arx.filter
+            faults.delay = 0
+            # Let the late responses drain before reconnecting.
+            time.sleep(4 * 0.2)
+            arx.conn.reconnect()
+            self.assertEqual(arx.filter, 0)
+            arx.conn.serial.close()
@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+
+from .mocks import MockARX, MockConnection
+from ARXControl import const
+from ARXControl.decoder import parse
+from ARXControl.sim import ACUFirmware
+
+try:
+    from ARXControl import ARX
+    from ARXControl.sim import VirtualACU
+    import pty
+except ImportError:
+    pty = None
+
+
+class TestStateRead(unittest.TestCase):
+    """
+    Testcase for capability discovery and the STATE_READ command.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = os.path.join(self.tmp, 'capabilities.json')
+        MockConnection.capability_cache = self.cache
+        self.arx = MockARX('/dev/usbtty0')
+        self.acu = self.arx.conn.serial
+        self.acu.state.update(FEE=[1,0,0,1], ATTEN=[3,9], FILTER=2, EEPROM=4)
+
+    def tearDown(self):
+        MockConnection.capability_cache = None
+        shutil.rmtree(self.tmp)
+
+    def cached(self):
+        with open(self.cache) as f:
+            return list(json.load(f).values())
+
+    def reads(self):
+        return [cmd for cmd, args in self.acu.sent]
+
+    def test_firmware(self):
+        firmware = ACUFirmware()
+        firmware.state['ATTEN'] = [3, 9]
+        self.assertEqual(parse(firmware.handle(const.STATE_READ, None)),
+                         (const.kACK, [0,0,0,0,3,9,0,1]))
+        firmware.state_read = False
+        self.assertEqual(parse(firmware.handle(const.STATE_READ, None))[0],
+                         const.kCOMM_ERR)
+
+    def test_discover(self):
+        self.assertIsNone(self.arx.conn.capabilities)
+        self.arx.filter
+        self.assertEqual(self.arx.conn.capabilities,
+                         frozenset([const.STATE_READ]))
+        self.arx.filter
+        self.assertEqual(self.acu.count(const.STATE_READ), 1,
+                         "Probed once")
+        self.arx.conn.reconnect()
+        self.assertIsNone(self.arx.conn.capabilities)
+
+    def test_cache(self):
+        # Silent firmware, which ignores opcodes it does not know.
+        self.acu.responses[const.STATE_READ] = lambda args: ''
+        self.assertEqual(self.arx.filter, 2)
+        self.assertEqual(self.arx.conn.capabilities, frozenset())
+        self.assertEqual(self.cached(), [[]])
+        arx = MockARX('/dev/usbtty0')
+        arx.filter
+        self.assertEqual(arx.conn.capabilities, frozenset())
+        self.assertEqual(arx.conn.serial.count(const.STATE_READ), 0,
+                         "Capabilities taken from the cache")
+        arx.conn.discover(refresh=True)
+        self.assertEqual(arx.conn.serial.count(const.STATE_READ), 1)
+        self.assertEqual(self.cached(), [[const.STATE_READ]])
+
+    def test_stale_cache(self):
+        with open(self.cache, 'w') as f:
+            json.dump({os.path.realpath('/dev/usbtty0'): [const.STATE_READ]},
+                      f)
+        self.acu.state_read = False
+        state = self.arx.read_all()
+        self.assertEqual((state.atten0, state.atten1, state.filter,
+                          state.eeprom_offset), (3, 9, 2, 4))
+        # Probed again on the handshake before the fallback reads.
+        self.assertEqual(self.arx.conn.capabilities, frozenset())
+        self.assertEqual(self.cached(), [[]])
+
+    def test_read_all(self):
+        state = self.arx.read_all()
+        self.assertEqual(state.fee, (1,0,0,1))
+        self.assertEqual((state.atten0, state.atten1, state.filter,
+                          state.eeprom_offset), (3, 9, 2, 4))
+        del self.acu.sent[:]
+        self.assertEqual(self.arx.read_all().diff(state), ())
+        self.assertEqual(self.reads(), [const.ACU_READY, const.STATE_READ])
+
+    def test_fallback(self):
+        self.acu.state_read = False
+        state = self.arx.read_all()
+        self.assertEqual(self.arx.conn.capabilities, frozenset())
+        self.assertEqual(state.fee, (1,0,0,1))
+        self.assertEqual((state.atten0, state.atten1, state.filter,
+                          state.eeprom_offset), (3, 9, 2, 4))
+        del self.acu.sent[:]
+        self.arx.read_all()
+        self.assertEqual(self.reads()[1:],
+                         [cmd[0] for cmd in self.arx._READ_ALL])
+
+    def test_malformed(self):
+        with self.assertRaises(IOError):
+            self.arx._make_state([1, 0, 0])
+
+
+@unittest.skipIf(pty is None, "pseudo-terminals are not available")
+class TestVirtualStateRead(unittest.TestCase):
+    """
+    Testcase for STATE_READ through the virtual ACU.
+    """
+
+    def test_read_all(self):
+        for state_read in (True, False):
+            with VirtualACU(ACUFirmware(state_read)) as acu:
+                acu.firmware.state['ATTEN'] = [6, 2]
+                arx = ARX(acu.port)
+                state = arx.read_all()
+                self.assertEqual((state.atten0, state.atten1), (6, 2))
+                self.assertEqual(const.STATE_READ in arx.conn.capabilities,
+                                 state_read)
+                arx.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+
+from .mocks import MockARX
+from ARXControl.state import State
+from ARXControl.statelog import CHANGE, SAMPLE, StateLog, StateLogWriter
+
+
+class TestStateLog(unittest.TestCase):
+    """
+    Testcase for the on-disk state log.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'arx.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_query(self):
+        writer = StateLogWriter(self.path)
+        for i in range(2000):
+            writer.sample(State((1,0,0,0), (i // 100) % 16, 15, 1, 1,
+                                1000. + i))
+        writer.close()
+        with StateLog(self.path) as log:
+            self.assertEqual(len(log), 2000)
+            self.assertIsNone(log.at(999))
+            self.assertEqual(log.at(1000).atten0, 0)
+            self.assertEqual(log.at(1650.5).atten0, 6)
+            self.assertEqual(log.at(1e10).timestamp, 2999.)
+            changes = log.changes(1150, 1450)
+            self.assertEqual([(s.atten0, s.timestamp) for s in changes],
+                             [(2, 1200.), (3, 1300.), (4, 1400.)])
+            self.assertEqual(len(list(log.range(1510, 1519))), 10)
+
+    def test_arx(self):
+        arx = MockARX('/dev/usbtty0')
+        writer = StateLogWriter(self.path)
+        writer.attach(arx)
+        arx.atten0 = 3
+        with arx.pipeline():
+            arx.power = 1
+            arx.filter = 2
+        writer.flush()
+        with StateLog(self.path) as log:
+            self.assertEqual(len(log), 4)
+            self.assertEqual(log.record(0)[1], SAMPLE)
+            state, kind = log.record(3)
+            self.assertEqual(kind, CHANGE)
+            self.assertEqual(state.diff(arx.read_all()), ())
+            writer.sample(arx.read_all())
+            writer.close()
+            log.refresh()
+            self.assertEqual(len(log), 5)
+
+    def test_reopen(self):
+        writer = StateLogWriter(self.path)
+        writer.sample(State((0,0,0,0), 1, 2, 0, 1, 10.))
+        writer.close()
+        with open(self.path, 'ab') as f:
+            f.write(b'\x01\x02\x03')
+        writer = StateLogWriter(self.path)
+        writer.sample(State((0,0,0,0), 3, 2, 0, 1, 11.))
+        writer.close()
+        with StateLog(self.path) as log:
+            self.assertEqual([s.atten0 for s in log.changes(0, 20)], [1, 3])
+        with open(self.path, 'wb') as f:
+            f.write(b'not a log')
+        with self.assertRaises(IOError):
+            StateLog(self.path)
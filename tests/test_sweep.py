@@ -0,0 +1,49 @@
+import unittest2 as unittest
+
+from .mocks import MockARX
+from ARXControl.sweep import Sweep, snake
+
+
+class TestSweep(unittest.TestCase):
+    """
+    Testcase for the settings sweep engine.
+    """
+
+    def setUp(self):
+        self.arx = MockARX('/dev/usbtty0')
+
+    def test_snake(self):
+        points = list(snake(range(3), range(4), range(2)))
+        self.assertEqual(len(set(points)), 3 * 4 * 2)
+        for a, b in zip(points, points[1:]):
+            self.assertEqual(sum(x != y for x, y in zip(a, b)), 1)
+
+    def test_sweep(self):
+        seen = []
+        acu = self.arx.conn.serial
+
+        def hook(point):
+            seen.append((acu.state['FILTER'], list(acu.state['ATTEN'])))
+            return point['atten0'] * 16 + point['atten1']
+        results = self.arx.sweep([('filter', range(3)),
+                                  ('atten0', range(16)),
+                                  ('atten1', range(16))], hook)
+        self.assertEqual(len(results), 3 * 16 * 16)
+        for point, result in results[:40]:
+            self.assertEqual(result, point['atten0'] * 16 + point['atten1'])
+        self.assertEqual(seen[17], (0, [1, 14]), "Settled before the hook")
+        self.assertEqual(acu.ready_count, 1, "Single session")
+
+    def test_writes(self):
+        sweep = Sweep(self.arx, [('atten0', range(4)), ('atten1', [15, 0])])
+        sweep.run()
+        # atten1 already holds 15 at the start.
+        self.assertEqual(sweep.writes, 1 + 7)
+        self.assertEqual((self.arx.atten0, self.arx.atten1), (3, 15))
+
+    def test_validate(self):
+        with self.assertRaises(ValueError):
+            Sweep(self.arx, [('atten0', [1, 16])])
+        with self.assertRaises(ValueError):
+            Sweep(self.arx, [('roach', [0, 1])])
+        self.assertEqual(self.arx.conn.serial.ready_count, 0)
@@ -0,0 +1,89 @@
+import time
+
+import unittest2 as unittest
+
+from .mocks import MockARX
+from ARXControl import const
+from ARXControl.state import State
+from ARXControl.telemetry import StateHistory
+
+
+def wait_for(condition, timeout=1.):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def state(atten0, t):
+    return State((1,0,1,0), atten0, 3, 2, 16, t)
+
+
+class TestStateHistory(unittest.TestCase):
+    """
+    Testcase for the ring-buffered state history.
+    """
+
+    def test_pack(self):
+        s = State((1,0,1,1), 15, 7, 2, 1023, 12.5)
+        self.assertEqual(State.unpack(s.pack(), 12.5), s)
+
+    def test_at(self):
+        history = StateHistory(4)
+        self.assertIsNone(history.at(10))
+        for t in range(6):
+            history.record(state(t, 10. + t))
+        self.assertEqual(len(history), 4, "Oldest samples overwritten")
+        self.assertIsNone(history.at(11.5))
+        self.assertEqual(history.at(12).atten0, 2)
+        self.assertEqual(history.at(13.9).atten0, 3)
+        self.assertEqual(history.at(100).timestamp, 15.)
+        self.assertEqual(history.latest().atten0, 5)
+
+    def test_changes(self):
+        history = StateHistory(5)
+        for t, level in enumerate([1, 1, 2, 2, 2, 3, 3, 1]):
+            history.record(state(level, float(t)))
+        changes = history.changes(0, 100)
+        self.assertEqual([(s.atten0, s.timestamp) for s in changes],
+                         [(2, 3.), (3, 5.), (1, 7.)])
+        self.assertEqual([s.atten0 for s in history.changes(4, 6)], [3])
+        self.assertEqual(history.changes(5.5, 6.5), [])
+
+    def test_out_of_order(self):
+        history = StateHistory(3)
+        history.record(state(1, 10.))
+        history.record(state(2, 9.))
+        self.assertEqual(history.at(10).atten0, 2)
+
+
+class TestTelemetryPoller(unittest.TestCase):
+    """
+    Testcase for background polling.
+    """
+
+    def test_poller(self):
+        arx = MockARX('/dev/usbtty0', queue_depth=8)
+        samples = []
+        poller = arx.start_poller(interval=0.01, capacity=16,
+                                  callback=samples.append)
+        arx.atten0 = 4
+        time.sleep(0.2)
+        arx.close()
+        self.assertEqual(poller.errors, 0)
+        self.assertEqual(len(poller.history), 16)
+        self.assertGreaterEqual(len(samples), 16)
+        self.assertEqual(poller.history.latest().atten0, 4)
+
+    def test_malformed(self):
+        arx = MockARX('/dev/usbtty0')
+        acu = arx.conn.serial
+        acu.state_read = False
+        acu.responses[const.EEPROM_READ] = lambda args: '1,x;'
+        poller = arx.start_poller(interval=0.01)
+        self.assertTrue(wait_for(lambda: poller.errors >= 2))
+        self.assertIsInstance(poller.last_error, ValueError)
+        acu.responses[const.EEPROM_READ] = acu._eeprom_read
+        self.assertTrue(wait_for(lambda: len(poller.history) > 0),
+                        "Still sampling")
+        arx.close()
@@ -0,0 +1,101 @@
+import unittest2 as unittest
+
+from .mocks import MockARX
+from ARXControl import const
+
+
+class TestTransaction(unittest.TestCase):
+    """
+    Testcase for transactional multi-setting writes.
+    """
+
+    def setUp(self):
+        self.arx = MockARX('/dev/usbtty0', cache_ttl=60)
+        self.acu = self.arx.conn.serial
+
+    def test_commit(self):
+        with self.arx.transaction():
+            self.arx.power = [1,0,1,0]
+            self.arx.write_flash()
+            self.arx.atten0 = 5
+            self.arx.atten0 = 7
+            self.arx.atten1 = 15
+            self.arx.write_flash()
+            self.assertEqual(self.acu.sent, [],
+                             "Nothing sent inside the block")
+        self.assertEqual(self.acu.state['FEE'], [1,0,1,0])
+        self.assertEqual(self.acu.state['ATTEN'], [7, 15])
+        self.assertEqual(self.acu.count(const.ATTEN_WRITE), 1,
+                         "Redundant and unchanged writes dropped")
+        self.assertEqual(self.acu.count(const.FEE_WRITE), 2)
+        self.assertEqual(self.acu.count(const.FLASH_WRITE), 1)
+        self.assertEqual(self.acu.ready_count, 1)
+        self.assertEqual(self.arx.atten0, 7)
+
+    def test_no_changes(self):
+        with self.arx.transaction(flash=True):
+            self.arx.atten0 = 15
+            self.arx.power = 0
+        self.assertEqual(self.acu.count(const.FLASH_WRITE), 0)
+        self.assertEqual(self.acu.count(const.ATTEN_WRITE), 0)
+
+    def test_rollback(self):
+        self.acu.responses[const.FILTER_WRITE] = \
+            lambda args: self.acu._build_resp(const.kERR, const.FILTER_RANGE)
+        with self.assertRaises(IOError):
+            with self.arx.transaction():
+                self.arx.atten0 = 3
+                self.arx.filter = 2
+                self.arx.power = 1
+                self.arx.write_flash()
+        self.assertEqual(self.acu.state['ATTEN'], [15, 15])
+        self.assertEqual(self.acu.state['FEE'], [0,0,0,0])
+        self.assertEqual(self.acu.count(const.FLASH_WRITE), 0)
+        self.assertEqual(self.arx.atten0, 15)
+
+    def test_apply(self):
+        state = self.arx.read_all()._replace(fee=(1,1,1,1), atten0=4)
+        with self.assertRaises(KeyError):
+            with self.arx.transaction():
+                self.arx.apply(state)
+                raise KeyError()
+        self.assertEqual(self.acu.state['FEE'], [0,0,0,0])
+        self.assertEqual(self.acu.count(const.FEE_WRITE), 0)
+        with self.arx.transaction():
+            self.arx.apply(state)
+            self.assertEqual(self.acu.count(const.FEE_WRITE), 0)
+        self.assertEqual(self.acu.state['FEE'], [1,1,1,1])
+        self.assertEqual(self.acu.state['ATTEN'], [4, 15])
+        self.assertEqual(self.arx.power, [1,1,1,1])
+
+    def test_load_slot(self):
+        # Slot 2 holds other settings, loaded when the offset moves there.
+        self.acu.eeprom[2] = {'FEE':[1,1,1,1], 'ATTEN':[4,4], 'FILTER':1}
+        self.assertEqual(self.arx.atten1, 15)
+        with self.arx.transaction():
+            self.arx.eeprom_offset = 2
+            self.arx.atten0 = 15
+        self.assertEqual(self.acu.state['ATTEN'], [15, 4])
+        self.assertEqual(self.arx.atten1, 4, "Cache invalidated by the move")
+
+    def test_apply_slot(self):
+        target = self.arx.read_all()._replace(eeprom_offset=2)
+        self.acu.eeprom[2] = {'FEE':[1,1,1,1], 'ATTEN':[4,4], 'FILTER':1}
+        self.assertEqual(self.arx.apply(target),
+                         ('eeprom_offset', 'fee', 'atten0', 'atten1',
+                          'filter'))
+        self.assertEqual(self.arx.read_all().diff(target), ())
+        self.arx.eeprom_offset = 1
+        self.acu.state.update(FEE=[1,1,1,1], ATTEN=[4,4], FILTER=1)
+        with self.arx.transaction():
+            self.arx.apply(target)
+        self.assertEqual(self.arx.read_all().diff(target), ())
+
+    def test_abort(self):
+        with self.assertRaises(KeyError):
+            with self.arx.transaction():
+                self.arx.atten0 = 3
+                raise KeyError()
+        self.assertEqual(self.acu.sent, [])
+        self.arx.atten0 = 4
+        self.assertEqual(self.acu.state['ATTEN'][0], 4)